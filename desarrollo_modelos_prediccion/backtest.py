@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Backtest walk-forward del modelo LightGBM de PM2.5: simula el servicio diario sobre el
+histórico completo
+
+Cada REFIT_DAYS días se reentrena el modelo con los días anteriores (ventana creciente o
+de --ventana-entrenamiento días) y, hasta el siguiente reentrenamiento, cada día se
+predice como en producción: ventana de 28 días de daily_predictions.history_windows y
+pronóstico recursivo de daily_predictions.forecast_horizon (la predicción redondeada pasa
+a ser el lag1 del día siguiente). La matriz de variables y las ventanas se calculan una
+sola vez; cada reentrenamiento usa un prefijo de esa matriz y los reentrenamientos, que
+son independientes, se reparten en un pool de procesos.
+
+Uso:
+    python backtest.py                                  # desde 2021, reentreno cada 30 días
+    python backtest.py --desde 2023-01-01 --reentreno 7 --horizonte 3
+    python backtest.py --ventana-entrenamiento 730 --procesos 4 --salida backtest.csv
+"""
+
+from pathlib import Path
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "cron" / "modelos_prediccion"))
+import daily_predictions as dp  # noqa: E402
+from desarrollo_modelos import CSV_PATH, build_features, lgbm_params, load_series, split_threads  # noqa: E402
+
+# ------------------------------------------------------------------------#
+# 1. CONFIGURACIÓN
+# ------------------------------------------------------------------------#
+BASE_DIR = Path(__file__).resolve().parent
+BACKTEST_FROM = "2021-01-01"  # Primer día simulado: deja dos años para el primer entrenamiento
+REFIT_DAYS = 30               # Días entre reentrenamientos
+MONTHLY_OUT = BASE_DIR / "resultados_backtest.csv"
+
+# ------------------------------------------------------------------------#
+# 2. VENTANAS DE REENTRENAMIENTO
+# ------------------------------------------------------------------------#
+def refit_windows(dates, date_from, date_to=None, refit_days=REFIT_DAYS, train_days=None):
+    """
+    Reparto del periodo simulado en ventanas de reentrenamiento
+
+    Args:
+        dates (np.ndarray): Fechas (datetime64[D]) de las filas de la matriz de variables
+        date_from (str): Primer día simulado
+        date_to (str): Último día simulado (por defecto el último de la serie)
+        refit_days (int): Días servidos por cada modelo
+        train_days (int): Días de entrenamiento (None = todos los anteriores)
+
+    Returns:
+        list: (nº ventana, primera fila de entrenamiento, fin del entrenamiento, primer
+              día servido, fin de los días servidos) en índices de filas
+    """
+    start = int(np.searchsorted(dates, np.datetime64(date_from, 'D')))
+    end = len(dates) if date_to is None else int(np.searchsorted(dates, np.datetime64(date_to, 'D'), side="right"))
+    if start == 0:
+        raise ValueError(f"Sin días de entrenamiento antes de {date_from}")
+    if start >= end:
+        raise ValueError(f"Periodo simulado vacío: {date_from} → {date_to}")
+
+    windows = []
+    for i, serve_start in enumerate(range(start, end, refit_days)):
+        # El modelo del día r se entrena con los objetivos hasta r - 1, el último promedio
+        # diario disponible en producción a esa hora
+        train_start = 0 if train_days is None else max(0, serve_start - train_days)
+        windows.append((i, train_start, serve_start, serve_start, min(serve_start + refit_days, end)))
+    return windows
+
+# ------------------------------------------------------------------------#
+# 3. MOTOR: una ventana de reentrenamiento por tarea
+# ------------------------------------------------------------------------#
+# Matriz, objetivo y ventanas de servicio de cada proceso del pool: se reciben una vez
+# (initializer) en lugar de serializarlos con cada tarea
+_worker_data = {}
+
+def _init_worker(X, y, lag_windows, target_dates, params, horizon, n_threads):
+    _worker_data.update(X=X, y=y, lag_windows=lag_windows, target_dates=target_dates,
+                        params={**params, "n_jobs": n_threads}, horizon=horizon)
+
+def run_window(task):
+    """
+    Reentrena el modelo con las filas de la ventana y sirve sus días con el pronóstico
+    recursivo de producción
+
+    Args:
+        task (tuple): Ventana de refit_windows
+
+    Returns:
+        dict: Filas servidas, trayectorias (n, horizonte) y segundos de entrenamiento y predicción
+    """
+    window_id, train_start, train_end, serve_start, serve_end = task
+    # DataFrame con los nombres de FEATURE_NAMES, como el modelo de producción
+    X_train = pd.DataFrame(_worker_data["X"][train_start:train_end], columns=dp.FEATURE_NAMES)
+
+    started = time.perf_counter()
+    model = LGBMRegressor(**_worker_data["params"]).fit(X_train, _worker_data["y"][train_start:train_end])
+    fitted = time.perf_counter()
+    trajectories = dp.forecast_horizon(_worker_data["lag_windows"][serve_start:serve_end],
+                                       _worker_data["target_dates"][serve_start:serve_end],
+                                       dp.FastPredictor(model), _worker_data["horizon"])
+    return dict(ventana=window_id, filas=(serve_start, serve_end), trayectorias=trajectories,
+                n_entrenamiento=train_end - train_start,
+                segundos_entrenamiento=fitted - started,
+                segundos_prediccion=time.perf_counter() - fitted)
+
+def walk_forward(series, params=lgbm_params, date_from=BACKTEST_FROM, date_to=None,
+                 refit_days=REFIT_DAYS, train_days=None, horizon=dp.DEFAULT_HORIZON, n_processes=None):
+    """
+    Backtest walk-forward: predicciones de cada día simulado a `horizon` días vista
+
+    Args:
+        series (pd.DataFrame): Serie diaria con la columna pm25 (load_series)
+        params (dict): Hiperparámetros de LGBMRegressor
+        date_from, date_to (str): Primer y último día simulado
+        refit_days (int): Días entre reentrenamientos
+        train_days (int): Días de entrenamiento (None = ventana creciente)
+        horizon (int): Días del pronóstico recursivo
+        n_processes (int): Procesos del pool; por defecto uno por CPU
+
+    Returns:
+        tuple: (pd.DataFrame con una fila por predicción: fecha_origen, horizonte, fecha,
+               predicho, real, persistencia y ventana; pd.DataFrame con una fila por ventana)
+    """
+    X, y = build_features(series)
+    dates = dp.as_days(X.index.values)
+    # Estado inicial de cada día servido: las mismas ventanas que produce el cron
+    lag_windows, _ = dp.history_windows(dp.as_days(series.index.values), series["pm25"].to_numpy(dtype=float), dates)
+
+    tasks = refit_windows(dates, date_from, date_to, refit_days, train_days)
+    n_processes, n_threads = split_threads(len(tasks), n_processes)
+    init_args = (X.to_numpy(), y.to_numpy(), lag_windows, dates, params, horizon, n_threads)
+    if n_processes == 1:
+        _init_worker(*init_args)
+        results = [run_window(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_processes, initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(run_window, tasks))
+
+    # Valor real de cada día (NaN más allá del final de la serie)
+    actual = pd.Series(y.to_numpy(), index=dates)
+    frames = []
+    for result in results:
+        start, end = result["filas"]
+        origins = dates[start:end]
+        for step in range(horizon):
+            predicted_dates = origins + step
+            frames.append(pd.DataFrame(dict(
+                fecha_origen=origins, horizonte=step, fecha=predicted_dates,
+                predicho=result["trayectorias"][:, step],
+                real=actual.reindex(predicted_dates).to_numpy(),
+                persistencia=lag_windows[start:end, -1],  # último día observado
+                ventana=result["ventana"])))
+    predictions = pd.concat(frames, ignore_index=True).dropna(subset=["real"])
+    windows = pd.DataFrame([{k: v for k, v in result.items() if k not in ("filas", "trayectorias")}
+                            for result in results])
+    return predictions, windows
+
+# ------------------------------------------------------------------------#
+# 4. MÉTRICAS
+# ------------------------------------------------------------------------#
+def error_tables(predictions):
+    """
+    MAE por horizonte (con la persistencia como referencia) y por mes y horizonte
+
+    Returns:
+        tuple: (pd.DataFrame por horizonte, pd.DataFrame por mes con una columna de MAE por horizonte)
+    """
+    errors = predictions.assign(error=(predictions["predicho"] - predictions["real"]).abs(),
+                                error_persistencia=(predictions["persistencia"] - predictions["real"]).abs(),
+                                mes=predictions["fecha"].dt.strftime("%Y-%m"))
+    by_horizon = (errors.groupby("horizonte")
+                        .agg(n=("error", "size"), mae=("error", "mean"),
+                             sesgo=("predicho", "mean"), mae_persistencia=("error_persistencia", "mean")))
+    by_horizon["sesgo"] -= errors.groupby("horizonte")["real"].mean()
+    by_month = errors.pivot_table(index="mes", columns="horizonte", values="error", aggfunc="mean")
+    by_month.columns = [f"mae_h{step}" for step in by_month.columns]
+    by_month.insert(0, "n", errors[errors["horizonte"] == 0].groupby("mes").size())
+    return by_horizon, by_month
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest walk-forward del modelo LightGBM de PM2.5")
+    parser.add_argument("--desde", default=BACKTEST_FROM, help=f"Primer día simulado (por defecto {BACKTEST_FROM})")
+    parser.add_argument("--hasta", default=None, help="Último día simulado (por defecto el último de la serie)")
+    parser.add_argument("--reentreno", type=int, default=REFIT_DAYS,
+                        help=f"Días entre reentrenamientos (por defecto {REFIT_DAYS})")
+    parser.add_argument("--ventana-entrenamiento", type=int, default=None,
+                        help="Días de entrenamiento de cada modelo (por defecto todos los anteriores)")
+    parser.add_argument("--horizonte", type=int, default=dp.DEFAULT_HORIZON,
+                        help=f"Días del pronóstico recursivo (por defecto {dp.DEFAULT_HORIZON}, como el cron)")
+    parser.add_argument("--arboles", type=int, default=None,
+                        help=f"n_estimators de cada modelo (por defecto {lgbm_params['n_estimators']})")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos del pool (por defecto uno por CPU, hilos repartidos)")
+    parser.add_argument("--csv", default=str(CSV_PATH), help="CSV histórico de calidad del aire")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="Ingerir también los snapshots fechados del CSV (<nombre>_YYYYMMDD.csv)")
+    parser.add_argument("--tabla", default=str(MONTHLY_OUT), help="CSV con el MAE por mes y horizonte")
+    parser.add_argument("--salida", default=None, help="CSV con todas las predicciones simuladas")
+    args = parser.parse_args()
+    if args.reentreno < 1 or args.horizonte < 1:
+        parser.error("--reentreno y --horizonte deben ser al menos 1")
+    if args.ventana_entrenamiento is not None and args.ventana_entrenamiento < 1:
+        parser.error("--ventana-entrenamiento debe ser al menos 1")
+
+    started = time.perf_counter()
+    params = dict(lgbm_params)
+    if args.arboles:
+        params["n_estimators"] = args.arboles
+
+    series = load_series(args.csv, snapshots=args.snapshots)
+    predictions, windows = walk_forward(series, params, args.desde, args.hasta, args.reentreno,
+                                        args.ventana_entrenamiento, args.horizonte, args.procesos)
+    by_horizon, by_month = error_tables(predictions)
+
+    train = "creciente" if args.ventana_entrenamiento is None else f"{args.ventana_entrenamiento} días"
+    print(f"Backtest {predictions['fecha_origen'].min():%Y-%m-%d} → {predictions['fecha_origen'].max():%Y-%m-%d}: "
+          f"{len(windows)} reentrenamientos cada {args.reentreno} días (ventana {train}), "
+          f"{params['n_estimators']} árboles")
+    print(f"\nMAE por horizonte (µg/m³):")
+    print(by_horizon.round(3).to_string())
+    print(f"\nMAE por mes (últimos 12 de {len(by_month)}):")
+    print(by_month.tail(12).round(2).to_string())
+
+    by_month.to_csv(args.tabla)
+    print(f"\nTabla mensual: {args.tabla}")
+    if args.salida:
+        predictions.to_csv(args.salida, index=False)
+        print(f"Predicciones simuladas: {args.salida}")
+
+    print(f"\n⏱️ Entrenamiento {windows['segundos_entrenamiento'].sum():.1f} s y predicción "
+          f"{windows['segundos_prediccion'].sum():.2f} s de CPU; tiempo total: {time.perf_counter() - started:.1f} s")
+
+if __name__ == "__main__":
+    main()
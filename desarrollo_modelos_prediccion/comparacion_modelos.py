@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Comparación de modelos de PM2.5 con evaluación rolling-origin: órdenes SARIMAX candidatos,
+persistencia, ingenuo estacional (semanal) y LightGBM, en una sola tabla ordenada por MAE
+
+Todos los modelos se ajustan con los días anteriores a --desde (por defecto el inicio del
+hold-out de desarrollo_modelos.py) y predicen cada día posterior a `horizonte` días vista,
+conociendo solo los días anteriores a cada origen, como el cron:
+- SARIMAX (exógenas wd y month, como el ARIMA de desarrollo_modelos.py): los parámetros
+  ajustados se guardan en .cache/comparacion/ indexados por el hash de los datos de
+  entrenamiento, y el resultado se reconstruye filtrando con ellos, sin reajustar. Los
+  días de evaluación se añaden con un único results.extend y los pronósticos de todos
+  los orígenes salen de sus estados predichos en bloque (rolling_forecasts)
+- LightGBM: lgbm_params y el pronóstico recursivo de daily_predictions.forecast_horizon
+- Persistencia (último día observado) e ingenuo estacional (mismo día de la semana anterior)
+
+Los SARIMAX y LightGBM se reparten en un pool de procesos, un candidato por tarea.
+
+Uso:
+    python comparacion_modelos.py                    # órdenes de SARIMAX_CANDIDATES, 2 días vista
+    python comparacion_modelos.py --desde 2024-06-01 --horizonte 3 --procesos 4
+    python comparacion_modelos.py --sin-cache        # reajustar todos los SARIMAX
+"""
+
+from pathlib import Path
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+import warnings
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "cron" / "modelos_prediccion"))
+import daily_predictions as dp  # noqa: E402
+from features import calendar_features  # noqa: E402
+from desarrollo_modelos import (ARIMA_ORDER, CSV_PATH, TEST_FRAC, build_features, lgbm_params,  # noqa: E402
+                                load_series, split_threads)
+
+warnings.filterwarnings("ignore")
+
+# ------------------------------------------------------------------------#
+# 1. CONFIGURACIÓN
+# ------------------------------------------------------------------------#
+BASE_DIR = Path(__file__).resolve().parent
+RESULTS_OUT = BASE_DIR / "resultados_comparacion.csv"
+CACHE_DIR = Path(os.getenv("COMPARISON_CACHE_DIR", BASE_DIR / ".cache" / "comparacion"))
+CACHE_VERSION = 1
+
+# Órdenes SARIMAX candidatos: ((p, d, q), (P, D, Q, s))
+SARIMAX_CANDIDATES = (
+    (ARIMA_ORDER, (0, 0, 0, 0)),   # El ARIMA de desarrollo_modelos.py
+    ((0, 1, 1), (0, 0, 0, 0)),
+    ((2, 1, 2), (0, 0, 0, 0)),
+    ((1, 0, 1), (0, 0, 0, 0)),
+    ((1, 1, 1), (1, 0, 1, 7)),     # Estacionalidad semanal
+)
+
+# ------------------------------------------------------------------------#
+# 2. SARIMAX: ajuste con caché y pronóstico rolling-origin
+# ------------------------------------------------------------------------#
+def calendar_exog(dates):
+    """Exógenas del SARIMAX (wd y month) de cada fecha, las mismas columnas que X[["wd", "month"]]"""
+    _, weekday, month = calendar_features(dates)
+    return np.column_stack([weekday, month]).astype(float)
+
+def sarimax_name(order, seasonal_order):
+    """Nombre del candidato en la tabla: SARIMAX(1,1,1) o SARIMAX(1,1,1)(1,0,1,7)"""
+    name = "SARIMAX({},{},{})".format(*order)
+    return name + ("({},{},{},{})".format(*seasonal_order) if seasonal_order[3] else "")
+
+def _cache_path(order, seasonal_order, y_train, exog_train):
+    """Fichero de parámetros de un candidato para unos datos de entrenamiento concretos"""
+    from statsmodels import __version__ as statsmodels_version
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_VERSION, statsmodels_version, order, seasonal_order]).encode())
+    digest.update(np.ascontiguousarray(y_train, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(exog_train, dtype=np.float64).tobytes())
+    return CACHE_DIR / f"{digest.hexdigest()}.npz"
+
+def fit_sarimax(order, seasonal_order, y_train, exog_train, use_cache=True):
+    """
+    SARIMAX ajustado con los días de entrenamiento. Con la caché, el ajuste (máxima
+    verosimilitud) solo se hace la primera vez: después se filtra con los parámetros
+    guardados, que da el mismo resultado
+
+    Returns:
+        tuple: (resultados de statsmodels, True si los parámetros venían de la caché)
+    """
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    model = SARIMAX(y_train, exog=exog_train, order=order, seasonal_order=seasonal_order,
+                    enforce_stationarity=False, enforce_invertibility=False)
+    path = _cache_path(order, seasonal_order, y_train, exog_train)
+    if use_cache:
+        try:
+            with np.load(path) as data:
+                return model.filter(data["params"]), True
+        except (OSError, KeyError, ValueError):
+            pass
+
+    results = model.fit(disp=False)
+    if use_cache:
+        # Fichero temporal publicado con os.replace (atómico), como la caché de csv_ingest
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.tmp{os.getpid()}.npz")
+        np.savez(tmp_path, params=results.params)
+        os.replace(tmp_path, path)
+    return results, False
+
+def rolling_forecasts(results, y_test, exog_test, horizon):
+    """
+    Pronósticos a `horizon` pasos desde cada día de evaluación (origen i: datos hasta
+    i - 1) con una sola pasada del filtro de Kalman
+
+    results.extend filtra los días nuevos partiendo del estado final del ajuste, sin
+    reajustar. Su estado predicho en i es el del origen i, y el pronóstico k pasos después
+    es design @ transition^k @ estado + intercepto de observación en i + k (exógenas).
+    Es igual (salvo redondeo, ~1e-14) a llamar a forecast en cada origen y extender día a día.
+
+    Returns:
+        np.ndarray: (n_test, horizon); NaN donde el día pronosticado cae fuera de y_test
+    """
+    extended = results.extend(y_test, exog=exog_test)
+    model = extended.model
+    n_test = len(y_test)
+    design, transition = model["design"], model["transition"]
+    obs_intercept = np.broadcast_to(model["obs_intercept"], (1, n_test))[0]
+    state_intercept = np.broadcast_to(np.asarray(model["state_intercept"]).reshape(len(transition), -1),
+                                      (len(transition), n_test))
+
+    states = extended.filter_results.predicted_state[:, :n_test]
+    forecasts = np.full((n_test, horizon), np.nan)
+    for step in range(min(horizon, n_test)):
+        valid = n_test - step
+        forecasts[:valid, step] = (design @ states)[0, :valid] + obs_intercept[step:]
+        # Estado un día más adelante, con el intercepto del día al que llega cada origen
+        times = np.minimum(np.arange(n_test) + step, n_test - 1)
+        states = transition @ states + state_intercept[:, times]
+    return forecasts
+
+# ------------------------------------------------------------------------#
+# 3. REFERENCIAS SIMPLES
+# ------------------------------------------------------------------------#
+def baseline_forecasts(y, cut, horizon):
+    """
+    Persistencia (último día observado para todos los pasos) e ingenuo estacional (el
+    mismo día de la semana anterior, o de la anterior a esa si aún no se conoce)
+
+    Returns:
+        dict: {nombre: (n_test, horizon)}
+    """
+    origins = np.arange(cut, len(y))
+    persistence = np.repeat(y[origins - 1][:, None], horizon, axis=1)
+    seasonal = np.column_stack([y[origins + step - 7 * (step // 7 + 1)] for step in range(horizon)])
+    return {"Persistencia": persistence, "Ingenuo estacional (7 días)": seasonal}
+
+# ------------------------------------------------------------------------#
+# 4. MOTOR: un candidato por tarea
+# ------------------------------------------------------------------------#
+# Serie, exógenas, matriz de variables y ventanas de cada proceso del pool: se reciben
+# una vez (initializer) en lugar de serializarlas con cada tarea
+_worker_data = {}
+
+def _init_worker(y, exog, X, lag_windows, dates, cut, horizon, use_cache, n_threads):
+    _worker_data.update(y=y, exog=exog, X=X, lag_windows=lag_windows, dates=dates, cut=cut,
+                        horizon=horizon, use_cache=use_cache, n_threads=n_threads)
+
+def evaluate_candidate(task):
+    """
+    Ajusta un candidato con los días anteriores al corte y pronostica todos los orígenes
+
+    Args:
+        task (tuple): ("sarimax", orden, orden estacional) o ("lightgbm", params)
+
+    Returns:
+        dict: Nombre, pronósticos (n_test, horizonte), segundos y si venía de la caché
+    """
+    data = _worker_data
+    cut, horizon = data["cut"], data["horizon"]
+    started = time.perf_counter()
+    if task[0] == "sarimax":
+        _, order, seasonal_order = task
+        results, cached = fit_sarimax(order, seasonal_order, data["y"][:cut], data["exog"][:cut],
+                                      data["use_cache"])
+        forecasts = rolling_forecasts(results, data["y"][cut:], data["exog"][cut:], horizon)
+        name = sarimax_name(order, seasonal_order)
+    else:
+        # DataFrame con los nombres de FEATURE_NAMES, como el modelo de producción
+        params = {**task[1], "n_jobs": data["n_threads"]}
+        model = LGBMRegressor(**params).fit(pd.DataFrame(data["X"][:cut], columns=dp.FEATURE_NAMES),
+                                            data["y"][:cut])
+        forecasts = dp.forecast_horizon(data["lag_windows"][cut:], data["dates"][cut:],
+                                        dp.FastPredictor(model), horizon)
+        name, cached = "LightGBM", False
+    return dict(modelo=name, pronosticos=forecasts, segundos=time.perf_counter() - started, cache=cached)
+
+def compare_models(series, date_from=None, horizon=dp.DEFAULT_HORIZON, candidates=SARIMAX_CANDIDATES,
+                   params=lgbm_params, n_processes=None, use_cache=True):
+    """
+    Evaluación rolling-origin de todos los modelos sobre los mismos orígenes
+
+    Args:
+        series (pd.DataFrame): Serie diaria con la columna pm25 (load_series)
+        date_from (str): Primer origen evaluado (por defecto el inicio del hold-out)
+        horizon (int): Días pronosticados desde cada origen
+        candidates (tuple): Órdenes SARIMAX ((p, d, q), (P, D, Q, s))
+        params (dict): Hiperparámetros de LightGBM
+        n_processes (int): Procesos del pool; por defecto uno por CPU
+        use_cache (bool): Reutilizar los parámetros SARIMAX ya ajustados
+
+    Returns:
+        pd.DataFrame: Una fila por modelo con el MAE de cada horizonte, el medio y los
+                      segundos, ordenada por MAE medio (columna 'puesto')
+    """
+    X, y = build_features(series)
+    dates = dp.as_days(X.index.values)
+    cut = int(len(X) * (1 - TEST_FRAC)) if date_from is None else int(np.searchsorted(dates, np.datetime64(date_from, 'D')))
+    if not 0 < cut < len(X):
+        raise ValueError(f"Sin días de entrenamiento o de evaluación con el corte en {date_from}")
+    y_values = y.to_numpy()
+    lag_windows, _ = dp.history_windows(dp.as_days(series.index.values), series["pm25"].to_numpy(dtype=float), dates)
+
+    tasks = [("sarimax", order, seasonal_order) for order, seasonal_order in candidates] + [("lightgbm", params)]
+    n_processes, n_threads = split_threads(len(tasks), n_processes)
+    init_args = (y_values, calendar_exog(dates), X.to_numpy(), lag_windows, dates, cut, horizon, use_cache, n_threads)
+    if n_processes == 1:
+        _init_worker(*init_args)
+        results = [evaluate_candidate(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_processes, initializer=_init_worker, initargs=init_args) as pool:
+            results = list(pool.map(evaluate_candidate, tasks))
+
+    started = time.perf_counter()
+    baselines = baseline_forecasts(y_values, cut, horizon)
+    seconds = (time.perf_counter() - started) / len(baselines)
+    results += [dict(modelo=name, pronosticos=forecasts, segundos=seconds, cache=False)
+                for name, forecasts in baselines.items()]
+
+    # Valor real de cada origen y paso (NaN más allá del final de la serie)
+    actual = np.full((len(X) - cut, horizon), np.nan)
+    for step in range(horizon):
+        actual[:len(actual) - step, step] = y_values[cut + step:]
+    rows = []
+    for result in results:
+        errors = np.abs(result["pronosticos"] - actual)
+        rows.append(dict(modelo=result["modelo"],
+                         **{f"mae_h{step}": np.nanmean(errors[:, step]) for step in range(horizon)},
+                         mae_medio=np.nanmean(errors), segundos=result["segundos"], cache=result["cache"]))
+    table = pd.DataFrame(rows).sort_values("mae_medio", ignore_index=True)
+    table.insert(0, "puesto", np.arange(1, len(table) + 1))
+    table.attrs.update(desde=str(dates[cut]), hasta=str(dates[-1]), origenes=len(X) - cut)
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparación rolling-origin de SARIMAX, LightGBM y referencias")
+    parser.add_argument("--desde", default=None,
+                        help=f"Primer origen evaluado (por defecto el hold-out: último {TEST_FRAC:.0%})")
+    parser.add_argument("--horizonte", type=int, default=dp.DEFAULT_HORIZON,
+                        help=f"Días pronosticados desde cada origen (por defecto {dp.DEFAULT_HORIZON}, como el cron)")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos del pool (por defecto uno por CPU, hilos repartidos)")
+    parser.add_argument("--sin-cache", action="store_true",
+                        help="Reajustar los SARIMAX sin leer ni escribir la caché de parámetros")
+    parser.add_argument("--csv", default=str(CSV_PATH), help="CSV histórico de calidad del aire")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="Ingerir también los snapshots fechados del CSV (<nombre>_YYYYMMDD.csv)")
+    parser.add_argument("--tabla", default=str(RESULTS_OUT), help="CSV con la tabla comparativa")
+    args = parser.parse_args()
+    if args.horizonte < 1:
+        parser.error("--horizonte debe ser al menos 1")
+
+    started = time.perf_counter()
+    series = load_series(args.csv, snapshots=args.snapshots)
+    table = compare_models(series, args.desde, args.horizonte, n_processes=args.procesos,
+                           use_cache=not args.sin_cache)
+
+    print(f"Evaluación rolling-origin {table.attrs['desde']} → {table.attrs['hasta']}: "
+          f"{table.attrs['origenes']} orígenes, {args.horizonte} días vista (MAE en µg/m³)\n")
+    print(table.round(3).to_string(index=False))
+    table.to_csv(args.tabla, index=False)
+    print(f"\nTabla comparativa: {args.tabla}")
+    print(f"\n⏱️ Tiempo total: {time.perf_counter() - started:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Ingesta de los CSV históricos de calidad del aire (constitucion_asturias_air_quality*.csv)
+
+- Tipos, separador decimal y formato de fecha declarados de antemano: las columnas de
+  contaminantes se leen directamente como float64, sin pasar por cadenas
+- Lectura por bloques (chunksize), de modo que un export grande no se materializa entero
+- La serie diaria limpia (asfreq("D") + interpolación) se guarda en un .npz columnar en
+  .cache/ingesta/, invalidado por el sha256 del CSV de origen
+- Los snapshots fechados (<nombre>_YYYYMMDD.csv) se ingieren de forma incremental: de cada
+  uno solo se leen las filas a partir de unos días antes del final de la caché
+
+Uso:
+    python csv_ingest.py [CSV] [--snapshots] [--sin-cache]
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+CSV_PATH = BASE_DIR / "constitucion_asturias_air_quality.csv"
+CACHE_DIR = Path(os.getenv("INGEST_CACHE_DIR", BASE_DIR / ".cache" / "ingesta"))
+CACHE_VERSION = 1
+
+DATE_COLUMN = "date"
+DATE_FORMAT = "%Y/%m/%d"  # 2025/6/1: el formato de los exports
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", 100_000))
+# Los últimos días de un export son provisionales y el snapshot siguiente los corrige
+# (p.ej. 2025/6/3 y 2025/6/4 entre el CSV base y el de 20250611): se releen estos días
+SNAPSHOT_OVERLAP_DAYS = 14
+SNAPSHOT_SUFFIX = re.compile(r"_(\d{8})$")
+
+def file_sha256(path):
+    """Hash sha256 del contenido de un fichero"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def snapshot_files(csv_path=CSV_PATH):
+    """Snapshots fechados de un CSV (<nombre>_YYYYMMDD.csv), del más antiguo al más reciente"""
+    csv_path = Path(csv_path)
+    snapshots = []
+    for path in csv_path.parent.glob(f"{csv_path.stem}_*{csv_path.suffix}"):
+        match = SNAPSHOT_SUFFIX.search(path.stem)
+        if match and path.stem[:match.start()] == csv_path.stem:
+            snapshots.append((match.group(1), path))
+    return [path for _, path in sorted(snapshots)]
+
+def read_header(csv_path):
+    """
+    Nombres de columna normalizados (sin espacios, en minúsculas) y separador del CSV.
+    Los exports con ';' usan coma decimal; los de ',' usan punto.
+    """
+    with open(csv_path, encoding="utf-8-sig") as f:
+        header = f.readline()
+    sep = ";" if header.count(";") > header.count(",") else ","
+    names = [name.strip().lower() for name in header.rstrip("\r\n").split(sep)]
+    if DATE_COLUMN not in names:
+        raise ValueError(f"{csv_path}: falta la columna '{DATE_COLUMN}' (cabecera: {names})")
+    return names, sep
+
+def _parse_dates(raw_dates):
+    """Fechas con DATE_FORMAT; las que no encajan se intentan con el parser genérico"""
+    dates = pd.to_datetime(raw_dates, format=DATE_FORMAT, errors="coerce")
+    failed = dates.isna() & raw_dates.notna()
+    if failed.any():
+        retry = failed & (raw_dates.str.strip() != "")
+        dates[retry] = pd.to_datetime(raw_dates[retry], errors="coerce", format="mixed")
+    return dates.to_numpy(dtype="datetime64[D]")
+
+def _read_chunks(csv_path, names, sep, columns, chunk_rows, typed):
+    """
+    Bloques (fechas, matriz de valores) del CSV. Con typed=True las columnas se leen
+    como float64; con typed=False se leen como texto y se reparan (coma decimal entre
+    comillas, espacios), el camino lento para ficheros irregulares.
+    """
+    decimal = "," if sep == ";" else "."
+    dtype = {DATE_COLUMN: str, **{c: ("float64" if typed else str) for c in columns}}
+    reader = pd.read_csv(csv_path, sep=sep, header=0, names=names, usecols=[DATE_COLUMN, *columns],
+                         dtype=dtype, decimal=decimal, skipinitialspace=True, encoding="utf-8-sig",
+                         chunksize=chunk_rows)
+    for chunk in reader:
+        if not typed:
+            for column in columns:
+                chunk[column] = pd.to_numeric(chunk[column].str.replace(",", ".", regex=False).str.strip(),
+                                              errors="coerce")
+        yield _parse_dates(chunk[DATE_COLUMN]), chunk[columns].to_numpy(dtype=float)
+
+def read_rows(csv_path, columns=None, since=None, chunk_rows=CHUNK_ROWS):
+    """
+    Lee las filas de un CSV por bloques
+
+    Args:
+        csv_path (Path): CSV de calidad del aire
+        columns (list): Columnas a leer (por defecto todas salvo la fecha)
+        since (np.datetime64): Solo las filas con fecha >= since (ingesta incremental)
+        chunk_rows (int): Filas por bloque
+
+    Returns:
+        tuple: (fechas datetime64[D] únicas y ordenadas, matriz (n, columnas), columnas).
+               Si una fecha se repite vale la última aparición.
+    """
+    names, sep = read_header(csv_path)
+    columns = [c for c in names if c != DATE_COLUMN] if columns is None else list(columns)
+    missing = [c for c in columns if c not in names]
+    if missing:
+        raise ValueError(f"{csv_path}: columnas inexistentes {missing}")
+
+    def collect(typed):
+        date_blocks, value_blocks = [], []
+        for dates, values in _read_chunks(csv_path, names, sep, columns, chunk_rows, typed):
+            keep = ~np.isnat(dates)
+            if since is not None:
+                keep &= dates >= since
+            date_blocks.append(dates[keep])
+            value_blocks.append(values[keep])
+        return date_blocks, value_blocks
+
+    try:
+        date_blocks, value_blocks = collect(typed=True)
+    except ValueError:
+        date_blocks, value_blocks = collect(typed=False)
+
+    dates = np.concatenate(date_blocks) if date_blocks else np.array([], dtype="datetime64[D]")
+    values = np.concatenate(value_blocks) if value_blocks else np.empty((0, len(columns)))
+    # Orden estable por fecha y última aparición de cada fecha
+    order = np.argsort(dates, kind="stable")
+    dates, values = dates[order], values[order]
+    last = np.append(dates[1:] != dates[:-1], True) if len(dates) else np.array([], dtype=bool)
+    return dates[last], values[last], columns
+
+def interpolate_columns(raw):
+    """
+    Interpolación lineal de los huecos de cada columna, con los extremos rellenados con el
+    primer/último valor (pandas interpolate(limit_direction="both"))
+    """
+    filled = np.full_like(raw, np.nan)
+    positions = np.arange(raw.shape[0])
+    for j in range(raw.shape[1]):
+        valid = ~np.isnan(raw[:, j])
+        if valid.any():
+            filled[:, j] = np.interp(positions, positions[valid], raw[valid, j])
+    return filled
+
+def merge_daily(fechas, raw, dates, values):
+    """
+    Escribe filas (fechas, valores) sobre la serie diaria densa (fechas, raw),
+    ampliando el rango de días si hace falta. Las filas nuevas sustituyen a las existentes.
+    """
+    if len(dates) == 0:
+        return fechas, raw
+    start = min(fechas[0], dates[0]) if len(fechas) else dates[0]
+    end = max(fechas[-1], dates[-1]) if len(fechas) else dates[-1]
+    all_days = np.arange(start, end + np.timedelta64(1, "D"), dtype="datetime64[D]")
+    merged = np.full((len(all_days), values.shape[1]), np.nan)
+    if len(fechas):
+        merged[(fechas - start).astype(np.int64)] = raw
+    merged[(dates - start).astype(np.int64)] = values
+    return all_days, merged
+
+def _cache_path(csv_path):
+    return CACHE_DIR / f"{Path(csv_path).stem}.npz"
+
+def _read_cache(csv_path, source_hash):
+    """Caché de un CSV si existe y corresponde a su contenido actual, o None"""
+    try:
+        with np.load(_cache_path(csv_path)) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != CACHE_VERSION or meta.get("sha256") != source_hash:
+                return None
+            return meta, data["fechas"], data["bruto"], data["valores"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _write_cache(csv_path, meta, fechas, raw, values):
+    """Escribe la caché en un fichero temporal y lo publica con os.replace (atómico)"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _cache_path(csv_path)
+    tmp_path = path.with_name(f"{path.stem}.tmp{os.getpid()}.npz")
+    np.savez(tmp_path, fechas=fechas, bruto=raw, valores=values, meta=np.array(json.dumps(meta)))
+    os.replace(tmp_path, path)
+
+def load_daily_table(csv_path=CSV_PATH, snapshots=(), use_cache=True):
+    """
+    Serie diaria limpia de todas las columnas de un CSV (y de sus snapshots)
+
+    Args:
+        csv_path (Path): CSV base
+        snapshots (list): Snapshots fechados a ingerir encima, del más antiguo al más reciente
+        use_cache (bool): Leer y escribir la caché .npz
+
+    Returns:
+        pd.DataFrame: Índice diario 'date' (asfreq("D")), una columna por contaminante,
+                      huecos interpolados
+    """
+    csv_path = Path(csv_path)
+    snapshots = [Path(p) for p in snapshots]
+    source_hash = file_sha256(csv_path)
+    wanted = [{"nombre": p.name, "sha256": file_sha256(p)} for p in snapshots]
+
+    cached = _read_cache(csv_path, source_hash) if use_cache else None
+    # La caché sirve si los snapshots ya ingeridos son el principio de los pedidos
+    if cached is not None and cached[0]["snapshots"] == wanted[:len(cached[0]["snapshots"])]:
+        meta, fechas, raw, values = cached
+        pending = list(zip(snapshots, wanted))[len(meta["snapshots"]):]
+        if not pending:
+            return _to_frame(fechas, values, meta["columnas"])
+    else:
+        dates, rows, columns = read_rows(csv_path)
+        fechas, raw = merge_daily(np.array([], dtype="datetime64[D]"), np.empty((0, len(columns))), dates, rows)
+        meta = {"version": CACHE_VERSION, "sha256": source_hash, "origen": csv_path.name,
+                "columnas": columns, "snapshots": []}
+        pending = list(zip(snapshots, wanted))
+
+    # Snapshots nuevos: solo la cola, desde SNAPSHOT_OVERLAP_DAYS antes del último día
+    for path, entry in pending:
+        since = fechas[-1] - np.timedelta64(SNAPSHOT_OVERLAP_DAYS, "D") if len(fechas) else None
+        dates, rows, _ = read_rows(path, columns=meta["columnas"], since=since)
+        fechas, raw = merge_daily(fechas, raw, dates, rows)
+        meta["snapshots"].append(entry)
+
+    values = interpolate_columns(raw)
+    meta["dias"] = int(len(fechas))
+    if use_cache:
+        _write_cache(csv_path, meta, fechas, raw, values)
+    return _to_frame(fechas, values, meta["columnas"])
+
+def _to_frame(fechas, values, columns):
+    index = pd.DatetimeIndex(fechas.astype("datetime64[ns]"), name=DATE_COLUMN, freq="D")
+    return pd.DataFrame(values, index=index, columns=columns)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta de los CSV históricos de calidad del aire")
+    parser.add_argument("csv", nargs="?", default=str(CSV_PATH), help="CSV base")
+    parser.add_argument("--snapshots", action="store_true", help="Ingerir también los snapshots fechados")
+    parser.add_argument("--sin-cache", action="store_true", help="Leer siempre el CSV, sin caché")
+    args = parser.parse_args()
+
+    snapshots = snapshot_files(args.csv) if args.snapshots else []
+    started = time.perf_counter()
+    table = load_daily_table(args.csv, snapshots, use_cache=not args.sin_cache)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"✅ {Path(args.csv).name}{f' + {len(snapshots)} snapshots' if snapshots else ''}: "
+          f"{len(table)} días ({table.index[0]:%Y-%m-%d} → {table.index[-1]:%Y-%m-%d}), "
+          f"{len(table.columns)} columnas en {elapsed:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,53 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-PM2.5 – LightGBM (lags filtrados)  +  ARIMA (con variables exógenas)
+PM2.5 – LightGBM (lags filtrados)  +  cuantiles LightGBM  +  ARIMA (con variables exógenas)
+
+Uso:
+    python desarrollo_modelos.py                          # CV + hold-out + modelo + cuantiles + ARIMA
+    python desarrollo_modelos.py --busqueda random --n-candidatos 20
+    python desarrollo_modelos.py --busqueda halving --procesos 4 --no-guardar
+    python desarrollo_modelos.py --cuantiles 0.05 0.5 0.95 --sin-arima
 """
 
 from pathlib import Path
+import os
+import sys
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
-from sklearn.metrics import mean_absolute_error, make_scorer
+from sklearn.metrics import mean_absolute_error, mean_pinball_loss
 from sklearn.model_selection import TimeSeriesSplit
-from lightgbm import LGBMRegressor
-from statsmodels.tsa.statespace.sarimax import SARIMAX
+from lightgbm import LGBMRegressor, early_stopping
 import joblib, warnings
 
+# Variables del modelo: el mismo módulo que usa producción (daily_predictions.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "cron" / "modelos_prediccion"))
+from features import FEATURE_NAMES, TREND_ORIGIN, training_matrix  # noqa: E402
+from csv_ingest import load_daily_table, snapshot_files  # noqa: E402
+
 warnings.filterwarnings("ignore")
 
 # ------------------------------------------------------------------------#
 # 1. CONFIGURACIÓN
 # ------------------------------------------------------------------------#
-CSV_PATH  = Path("constitucion_asturias_air_quality.csv")
-MIN_DATE  = "2019-01-01"
+BASE_DIR  = Path(__file__).resolve().parent
+CSV_PATH  = BASE_DIR / "constitucion_asturias_air_quality.csv"
+MIN_DATE  = str(TREND_ORIGIN)  # 'trend' cuenta los días desde aquí, también en producción
 TEST_FRAC = 0.10
-MODEL_OUT = Path("modelo_lgbm_pm25.joblib")
+N_SPLITS  = 5
+MODEL_OUT = BASE_DIR / "modelo_lgbm_pm25.joblib"
+RESULTS_OUT = BASE_DIR / "resultados_busqueda.csv"
+
+# Rondas sin mejora antes de parar (0 = sin early stopping). La parada se decide sobre la
+# cola final (EARLY_STOPPING_FRAC) del entrenamiento de cada fold, no sobre su validación,
+# para que el MAE del fold no mida el mismo tramo que eligió el número de árboles
+EARLY_STOPPING_ROUNDS = 100
+EARLY_STOPPING_FRAC = 0.15
 
 # LightGBM – hiperparámetros fijos (mejores anteriores)
 lgbm_params = dict(
@@ -39,99 +65,405 @@ lgbm_params = dict(
     verbosity          = -1
 )
 
+# Espacio de búsqueda sobre lgbm_params (grid: producto completo; random/halving: muestras).
+# subsample no está: sin subsample_freq LightGBM no hace bagging y no tendría efecto
+PARAM_GRID = dict(
+    learning_rate      = [0.01, 0.03, 0.06],
+    max_depth          = [4, 6, 8],
+    num_leaves         = [15, 31, 63],
+    min_child_samples  = [20, 40, 80],
+    colsample_bytree   = [0.7, 0.9],
+    reg_lambda         = [0, 1, 5],
+)
+
+# Successive halving: cada ronda se queda con 1/HALVING_FACTOR de los candidatos y
+# multiplica por HALVING_FACTOR el máximo de árboles, hasta n_estimators
+HALVING_FACTOR = 3
+HALVING_MIN_ESTIMATORS = 100
+
+# Modelos de cuantiles (intervalos de predicción): lgbm_params con objetivo 'quantile'.
+# Se guardan junto al modelo como modelo_lgbm_pm25_pNN.joblib, que es donde los busca
+# producción (model_store.quantile_model_paths)
+QUANTILES = (0.1, 0.5, 0.9)
+
 # ARIMA órdenes básicos (p,d,q); ajusta si quieres afinar
 ARIMA_ORDER = (1, 1, 1)
 
 # ------------------------------------------------------------------------#
 # 2. CARGA Y LIMPIEZA
 # ------------------------------------------------------------------------#
-df = pd.read_csv(CSV_PATH)
-df.columns = df.columns.str.strip().str.lower()
-
-df = df[["date", "pm25"]].copy()
-df["date"] = pd.to_datetime(df["date"], errors="coerce")
-df["pm25"] = (df["pm25"]
-              .astype(str)
-              .str.replace(",", ".", regex=False)
-              .str.strip())
-df["pm25"] = pd.to_numeric(df["pm25"], errors="coerce")
+def load_series(csv_path=CSV_PATH, min_date=MIN_DATE, snapshots=False):
+    """
+    Serie diaria de PM2.5 del CSV (frecuencia diaria, huecos interpolados)
 
-df = (df.dropna(subset=["date"])
-        .set_index("date").sort_index()
-        .asfreq("D"))
-df["pm25"] = df["pm25"].interpolate(limit_direction="both")
+    La lectura y la limpieza las hace csv_ingest.load_daily_table, que reutiliza la caché
+    .npz mientras el CSV no cambie. Con snapshots=True se ingieren también los
+    snapshots fechados del CSV (<nombre>_YYYYMMDD.csv).
+    """
+    extra = snapshot_files(csv_path) if snapshots else ()
+    df = load_daily_table(csv_path, extra)[["pm25"]]
 
-if MIN_DATE:
-    df = df[df.index >= pd.Timestamp(MIN_DATE)]
+    if min_date:
+        df = df[df.index >= pd.Timestamp(min_date)]
+    return df
 
 # ------------------------------------------------------------------------#
 # 3. FEATURE ENGINEERING
 # ------------------------------------------------------------------------#
-feat = pd.DataFrame(index=df.index)
+def build_features(df):
+    """
+    Las 33 variables del modelo y el objetivo: (X, y)
+
+    features.training_matrix: lags 1-14 + 21 + 28, diferencias absolutas entre lags 1-14,
+    trend (días desde TREND_ORIGIN) + trend7 (pendiente ~últimos 7 días), día de la
+    semana y mes, para cada día con 28 días anteriores
+    """
+    matrix, target, dates = training_matrix(df["pm25"].to_numpy(), df.index.values)
+    X = pd.DataFrame(matrix, index=pd.DatetimeIndex(dates, name=df.index.name), columns=FEATURE_NAMES)
+    y = pd.Series(target, index=X.index, name="pm25")
+
+    valid = X.notna().all(axis=1) & y.notna()
+    return X[valid], y[valid]
+
+# ------------------------------------------------------------------------#
+# 4. MOTOR DE ENTRENAMIENTO: folds en paralelo
+# ------------------------------------------------------------------------#
+# Datos de entrenamiento de cada proceso del pool: se reciben una vez (initializer)
+# en lugar de serializarlos con cada tarea
+_worker_data = {}
+
+def _init_worker(X, y, n_threads):
+    _worker_data.update(X=X, y=y, n_threads=n_threads)
+
+def split_threads(n_tasks, n_processes=None):
+    """
+    Reparto de CPUs: procesos del pool e hilos de LightGBM por proceso, sin
+    sobresuscribir la máquina (procesos × hilos <= CPUs)
+    """
+    n_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    n_processes = max(1, min(n_processes or n_cpus, n_tasks, n_cpus))
+    return n_processes, max(1, n_cpus // n_processes)
+
+def fit_fold(task):
+    """
+    Entrena un candidato en un fold con early stopping sobre la cola del entrenamiento
+    del fold (EARLY_STOPPING_FRAC) y lo puntúa en la validación, que no ha visto
+
+    Args:
+        task (tuple): (id candidato, params, índices de entrenamiento, índices de validación)
 
-# Lags 1-14 + 21 + 28
-for k in list(range(1, 15)) + [21, 28]:
-    feat[f"lag{k}"] = df["pm25"].shift(k)
+    Returns:
+        dict: MAE de validación, mejor iteración y segundos del fold
+    """
+    candidate_id, params, train_idx, val_idx = task
+    X, y = _worker_data["X"], _worker_data["y"]
+    params = {**params, "n_jobs": _worker_data["n_threads"]}
+    rounds = params.pop("early_stopping_rounds", 0)
 
-# Diferencias absolutas solo entre lags 1-14
-for k in range(1, 14):
-    feat[f"diff_abs{k}"] = feat[f"lag{k}"] - feat[f"lag{k+1}"]
+    started = time.perf_counter()
+    model = LGBMRegressor(**params)
+    if rounds:
+        n_stop = max(1, int(len(train_idx) * EARLY_STOPPING_FRAC))
+        fit_idx, stop_idx = train_idx[:-n_stop], train_idx[-n_stop:]
+        model.fit(X[fit_idx], y[fit_idx], eval_set=[(X[stop_idx], y[stop_idx])],
+                  eval_metric="l1", callbacks=[early_stopping(rounds, verbose=False)])
+        best_iteration = model.best_iteration_ or params["n_estimators"]
+    else:
+        model.fit(X[train_idx], y[train_idx])
+        best_iteration = params["n_estimators"]
+    pred = model.predict(X[val_idx], num_iteration=best_iteration)
 
-# Tendencia lineal + tendencia semanal aproximada
-feat["trend"]  = (feat.index - feat.index[0]).days
-feat["trend7"] = (feat["lag1"] - feat["lag7"]) / 6   # pendiente ~últimos 7 días
+    return dict(candidato=candidate_id,
+                mae=mean_absolute_error(y[val_idx], pred),
+                mejor_iteracion=best_iteration,
+                segundos=time.perf_counter() - started)
 
-# Calendario
-feat["wd"]    = feat.index.dayofweek
-feat["month"] = feat.index.month
+def evaluate_candidates(X, y, candidates, n_splits=N_SPLITS, n_processes=None,
+                        early_stopping_rounds=EARLY_STOPPING_ROUNDS):
+    """
+    Validación cruzada temporal (TimeSeriesSplit) de varios candidatos: todas las
+    combinaciones candidato × fold se reparten en un pool de procesos
 
-data = feat.join(df["pm25"]).dropna().astype(float)
-X, y = data.drop(columns=["pm25"]), data["pm25"]
+    Args:
+        X (pd.DataFrame), y (pd.Series): Dataset de entrenamiento
+        candidates (list): Diccionarios de hiperparámetros completos
+        n_splits (int): Folds de TimeSeriesSplit
+        n_processes (int): Procesos del pool; por defecto uno por CPU
+        early_stopping_rounds (int): Paciencia del early stopping (0 = desactivado)
 
-print(f"Dataset listo: {len(X):,} filas • {X.shape[1]} variables")
-mae_persist = mean_absolute_error(y[1:], y.shift(1)[1:])
-print(f"MAE persistencia (lag1): {mae_persist:.2f} µg/m³")
+    Returns:
+        pd.DataFrame: Una fila por candidato con MAE medio/desviación, mejor iteración
+                      (mediana de los folds) y segundos de CPU, ordenada por MAE
+    """
+    folds = list(TimeSeriesSplit(n_splits=n_splits).split(X))
+    tasks = [(i, {**params, "early_stopping_rounds": early_stopping_rounds}, train_idx, val_idx)
+             for i, params in enumerate(candidates)
+             for train_idx, val_idx in folds]
+    n_processes, n_threads = split_threads(len(tasks), n_processes)
+
+    X_values, y_values = X.to_numpy(), y.to_numpy()
+    if n_processes == 1:
+        _init_worker(X_values, y_values, n_threads)
+        fold_results = [fit_fold(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_processes, initializer=_init_worker,
+                                 initargs=(X_values, y_values, n_threads)) as pool:
+            fold_results = list(pool.map(fit_fold, tasks))
+
+    folds_df = pd.DataFrame(fold_results)
+    table = (folds_df.groupby("candidato")
+                     .agg(mae_cv=("mae", "mean"), mae_std=("mae", lambda s: np.std(s)),
+                          mejor_iteracion=("mejor_iteracion", "median"), segundos=("segundos", "sum")))
+    table["mejor_iteracion"] = table["mejor_iteracion"].round().astype(int)
+    params_df = pd.DataFrame([{k: params[k] for k in PARAM_GRID if k in params} for params in candidates])
+    params_df["n_estimators"] = [params["n_estimators"] for params in candidates]
+    return params_df.join(table).sort_values("mae_cv")
 
 # ------------------------------------------------------------------------#
-# 4. LIGHTGBM  (TimeSeries CV 5 folds)
+# 5. BÚSQUEDA DE HIPERPARÁMETROS
 # ------------------------------------------------------------------------#
-tscv = TimeSeriesSplit(n_splits=5)
-mae_scores = []
-for train_idx, val_idx in tscv.split(X):
-    model = LGBMRegressor(**lgbm_params)
-    model.fit(X.iloc[train_idx], y.iloc[train_idx])
-    pred = model.predict(X.iloc[val_idx])
-    mae_scores.append(mean_absolute_error(y.iloc[val_idx], pred))
+def grid_candidates(grid=PARAM_GRID, base=lgbm_params):
+    """Producto completo de la rejilla sobre los parámetros base"""
+    keys = list(grid)
+    return [{**base, **dict(zip(keys, values))} for values in itertools.product(*grid.values())]
+
+def random_candidates(n_candidates, grid=PARAM_GRID, base=lgbm_params, seed=42):
+    """n_candidates combinaciones distintas de la rejilla, al azar (reproducible)"""
+    all_candidates = grid_candidates(grid, base)
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(all_candidates), size=min(n_candidates, len(all_candidates)), replace=False)
+    return [all_candidates[i] for i in chosen]
+
+def successive_halving(X, y, candidates, n_processes=None, factor=HALVING_FACTOR,
+                       min_estimators=HALVING_MIN_ESTIMATORS, max_estimators=None,
+                       early_stopping_rounds=EARLY_STOPPING_ROUNDS):
+    """
+    Successive halving con el número de árboles como recurso: todos los candidatos
+    empiezan con min_estimators y en cada ronda solo el mejor 1/factor sigue, con
+    factor veces más árboles
+
+    Returns:
+        pd.DataFrame: Resultados de todas las rondas (columna 'ronda')
+    """
+    max_estimators = max_estimators or lgbm_params["n_estimators"]
+    n_estimators, rung, rounds = min_estimators, 0, []
+    while True:
+        n_estimators = min(n_estimators, max_estimators)
+        rung_candidates = [{**params, "n_estimators": n_estimators} for params in candidates]
+        table = evaluate_candidates(X, y, rung_candidates, n_processes=n_processes,
+                                    early_stopping_rounds=early_stopping_rounds)
+        table["ronda"] = rung
+        rounds.append(table)
+        print(f"  Ronda {rung}: {len(candidates)} candidatos × {n_estimators} árboles → "
+              f"mejor MAE {table['mae_cv'].iloc[0]:.3f}")
+
+        keep = max(1, len(candidates) // factor)
+        if keep == 1 or n_estimators >= max_estimators:
+            break
+        candidates = [candidates[i] for i in table.index[:keep]]
+        n_estimators, rung = n_estimators * factor, rung + 1
 
-print(f"\nLightGBM MAE CV (5 folds): {np.mean(mae_scores):.3f} ± {np.std(mae_scores):.3f}")
+    return pd.concat(rounds).sort_values(["ronda", "mae_cv"], ascending=[False, True])
 
-# Hold-out
-cut = int(len(X) * (1 - TEST_FRAC))
-X_train, X_test = X.iloc[:cut], X.iloc[cut:]
-y_train, y_test = y.iloc[:cut], y.iloc[cut:]
+def search(X, y, mode, n_candidates=20, n_processes=None, early_stopping_rounds=EARLY_STOPPING_ROUNDS):
+    """
+    Búsqueda de hiperparámetros (grid, random o halving) sobre lgbm_params
 
-lgbm_final = LGBMRegressor(**lgbm_params).fit(X_train, y_train)
-mae_lgbm_test = mean_absolute_error(y_test, lgbm_final.predict(X_test))
-print(f"LightGBM MAE hold-out: {mae_lgbm_test:.2f} µg/m³")
+    Returns:
+        tuple: (tabla de resultados, mejores parámetros con n_estimators ajustado)
+    """
+    if mode == "grid":
+        candidates = grid_candidates()
+    else:
+        candidates = random_candidates(n_candidates)
+    print(f"\n🔎 Búsqueda {mode}: {len(candidates)} candidatos × {N_SPLITS} folds")
 
-joblib.dump(lgbm_final, MODEL_OUT)
-print(f"Modelo LightGBM guardado: {MODEL_OUT.resolve()}")
+    if mode == "halving":
+        table = successive_halving(X, y, candidates, n_processes=n_processes,
+                                   early_stopping_rounds=early_stopping_rounds)
+    else:
+        table = evaluate_candidates(X, y, candidates, n_processes=n_processes,
+                                    early_stopping_rounds=early_stopping_rounds)
 
-imp = (pd.Series(lgbm_final.feature_importances_, index=X.columns)
-         .sort_values(ascending=False))
-print("\nTop-10 features (LightGBM):")
-print(imp.head(10).round(2))
+    best = table.iloc[0]
+    # La fila de la tabla mezcla tipos (pandas la pasa a float): volver al tipo de lgbm_params
+    best_params = {**lgbm_params, **{k: type(lgbm_params[k])(best[k]) for k in PARAM_GRID}}
+    best_params["n_estimators"] = int(best["mejor_iteracion"])
+    return table, best_params
 
 # ------------------------------------------------------------------------#
-# 5. ARIMA (SARIMAX) con variables exógenas wd y month
+# 6. MODELO FINAL, CUANTILES Y ARIMA
 # ------------------------------------------------------------------------#
-exo = X[["wd", "month"]]   # exogenous regressors
-exo_train, exo_test = exo.iloc[:cut], exo.iloc[cut:]
+def train_final(X, y, params, test_frac=TEST_FRAC):
+    """Entrena con el 90% inicial y evalúa en el hold-out final"""
+    cut = int(len(X) * (1 - test_frac))
+    model = LGBMRegressor(**params).fit(X.iloc[:cut], y.iloc[:cut])
+    mae_test = mean_absolute_error(y.iloc[cut:], model.predict(X.iloc[cut:]))
+    return model, mae_test
+
+def quantile_model_path(alpha, base=MODEL_OUT):
+    """Ruta del modelo de un cuantil: <modelo>_pNN.joblib (p10 para 0.1)"""
+    return base.with_name(f"{base.stem}_p{round(alpha * 100):02d}.joblib")
+
+def fit_quantile(task):
+    """
+    Entrena el modelo de un cuantil con las filas de entrenamiento de train_final
+
+    Args:
+        task (tuple): (nivel, params, filas de entrenamiento)
+
+    Returns:
+        tuple: (nivel, modelo, segundos)
+    """
+    alpha, params, cut = task
+    # DataFrame con los nombres de FEATURE_NAMES, como el modelo puntual
+    X = pd.DataFrame(_worker_data["X"][:cut], columns=FEATURE_NAMES)
+    params = {**params, "objective": "quantile", "alpha": alpha, "n_jobs": _worker_data["n_threads"]}
+
+    started = time.perf_counter()
+    model = LGBMRegressor(**params).fit(X, _worker_data["y"][:cut])
+    return alpha, model, time.perf_counter() - started
+
+def train_quantiles(X, y, params, quantiles=QUANTILES, test_frac=TEST_FRAC, n_processes=None):
+    """
+    Modelos de cuantiles con los hiperparámetros y las filas de train_final, un cuantil
+    por tarea del pool de procesos
+
+    Returns:
+        tuple: ({nivel: modelo}, pd.DataFrame con pérdida pinball y fracción de
+               observaciones bajo cada cuantil en el hold-out, cobertura del intervalo
+               entre el cuantil menor y el mayor)
+    """
+    cut = int(len(X) * (1 - test_frac))
+    tasks = [(alpha, params, cut) for alpha in sorted(quantiles)]
+    n_processes, n_threads = split_threads(len(tasks), n_processes)
+
+    X_values, y_values = X.to_numpy(), y.to_numpy()
+    if n_processes == 1:
+        _init_worker(X_values, y_values, n_threads)
+        fitted = [fit_quantile(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(n_processes, initializer=_init_worker,
+                                 initargs=(X_values, y_values, n_threads)) as pool:
+            fitted = list(pool.map(fit_quantile, tasks))
+
+    y_test = y_values[cut:]
+    predictions = {alpha: model.predict(X.iloc[cut:]) for alpha, model, _ in fitted}
+    table = pd.DataFrame([
+        dict(cuantil=quantile_model_path(alpha).stem.rsplit("_", 1)[1],
+             pinball=mean_pinball_loss(y_test, predictions[alpha], alpha=alpha),
+             bajo_cuantil=np.mean(y_test <= predictions[alpha]),
+             segundos=seconds)
+        for alpha, _, seconds in fitted
+    ])
+    # Los cuantiles se entrenan por separado: producción los ordena antes de usarlos
+    bounds = np.sort(np.column_stack(list(predictions.values())), axis=1)
+    coverage = np.mean((y_test >= bounds[:, 0]) & (y_test <= bounds[:, -1]))
+    return {alpha: model for alpha, model, _ in fitted}, table, coverage
+
+def evaluate_arima(X, y, test_frac=TEST_FRAC, order=ARIMA_ORDER):
+    """
+    ARIMA (SARIMAX) con variables exógenas wd y month: MAE en el hold-out
+
+    Pronostica todo el hold-out de una vez, sin incorporar los días observados; la
+    evaluación día a día (rolling-origin) y otros órdenes están en comparacion_modelos.py
+    """
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    cut = int(len(X) * (1 - test_frac))
+    exo = X[["wd", "month"]]   # exogenous regressors
+    exo_train, exo_test = exo.iloc[:cut], exo.iloc[cut:]
+    y_train, y_test = y.iloc[:cut], y.iloc[cut:]
+
+    sarima = SARIMAX(y_train, exog=exo_train, order=order, enforce_stationarity=False,
+                     enforce_invertibility=False).fit(disp=False)
+
+    pred_arima = sarima.predict(start=y_test.index[0], end=y_test.index[-1], exog=exo_test)
+    return mean_absolute_error(y_test, pred_arima)
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo LightGBM de PM2.5")
+    parser.add_argument("--busqueda", choices=["grid", "random", "halving"],
+                        help="Buscar hiperparámetros sobre PARAM_GRID en lugar de usar lgbm_params")
+    parser.add_argument("--n-candidatos", type=int, default=20,
+                        help="Candidatos al azar para random/halving (por defecto 20)")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos del pool (por defecto uno por CPU, hilos repartidos)")
+    parser.add_argument("--early-stopping", type=int, default=EARLY_STOPPING_ROUNDS,
+                        help=f"Paciencia del early stopping por fold, 0 para desactivar "
+                             f"(por defecto {EARLY_STOPPING_ROUNDS})")
+    parser.add_argument("--tabla", default=str(RESULTS_OUT), help="CSV con la tabla comparativa")
+    parser.add_argument("--csv", default=str(CSV_PATH), help="CSV histórico de calidad del aire")
+    parser.add_argument("--snapshots", action="store_true",
+                        help="Ingerir también los snapshots fechados del CSV (<nombre>_YYYYMMDD.csv)")
+    parser.add_argument("--no-guardar", action="store_true", help="No sobrescribir el .joblib")
+    parser.add_argument("--sin-arima", action="store_true", help="Omitir la comparación con ARIMA")
+    parser.add_argument("--cuantiles", type=float, nargs="+", default=list(QUANTILES),
+                        help=f"Niveles de los modelos de cuantiles (por defecto {' '.join(map(str, QUANTILES))})")
+    parser.add_argument("--sin-cuantiles", action="store_true", help="No entrenar los modelos de cuantiles")
+    args = parser.parse_args()
+    # El nivel va en el nombre del fichero con dos cifras (p10): centésimas entre 0.01 y 0.99
+    if any(not 0.01 <= q <= 0.99 or abs(q * 100 - round(q * 100)) > 1e-9 for q in args.cuantiles):
+        parser.error("--cuantiles: niveles entre 0.01 y 0.99 con dos decimales como máximo")
+
+    started = time.perf_counter()
+    X, y = build_features(load_series(args.csv, snapshots=args.snapshots))
+
+    print(f"Dataset listo: {len(X):,} filas • {X.shape[1]} variables")
+    mae_persist = mean_absolute_error(y[1:], y.shift(1)[1:])
+    print(f"MAE persistencia (lag1): {mae_persist:.2f} µg/m³")
+
+    # LightGBM (TimeSeries CV 5 folds), con o sin búsqueda
+    if args.busqueda:
+        table, final_params = search(X, y, args.busqueda, args.n_candidatos, args.procesos, args.early_stopping)
+    else:
+        table = evaluate_candidates(X, y, [lgbm_params], n_processes=args.procesos,
+                                    early_stopping_rounds=args.early_stopping)
+        # Sin búsqueda el modelo final se entrena con lgbm_params tal cual: el early stopping
+        # solo acorta la CV
+        final_params = dict(lgbm_params)
+
+    table.to_csv(args.tabla, index=False)
+    best = table.iloc[0]
+    print(f"\nLightGBM MAE CV ({N_SPLITS} folds): {best['mae_cv']:.3f} ± {best['mae_std']:.3f} "
+          f"(mejor iteración {int(best['mejor_iteracion'])})")
+    print(f"Tabla comparativa ({len(table)} filas): {args.tabla}")
+    print(table.head(10).round(3).to_string(index=False))
+
+    # Hold-out
+    lgbm_final, mae_lgbm_test = train_final(X, y, final_params)
+    print(f"\nLightGBM MAE hold-out: {mae_lgbm_test:.2f} µg/m³ ({final_params['n_estimators']} árboles)")
+
+    if not args.no_guardar:
+        joblib.dump(lgbm_final, MODEL_OUT)
+        print(f"Modelo LightGBM guardado: {MODEL_OUT.resolve()}")
+
+    # Cuantiles: intervalos de predicción y probabilidad de cada banda OMS en producción
+    if not args.sin_cuantiles:
+        quantile_models, quantile_table, coverage = train_quantiles(X, y, final_params, args.cuantiles,
+                                                                    n_processes=args.procesos)
+        levels = sorted(quantile_models)
+        print(f"\nCuantiles hold-out (bajo_cuantil debería acercarse a cada nivel):")
+        print(quantile_table.round(3).to_string(index=False))
+        print(f"Cobertura [p{round(levels[0] * 100):02d}, p{round(levels[-1] * 100):02d}]: {coverage:.1%} "
+              f"(nominal {levels[-1] - levels[0]:.0%})")
+        if not args.no_guardar:
+            for alpha, model in quantile_models.items():
+                joblib.dump(model, quantile_model_path(alpha))
+            print(f"Modelos de cuantiles guardados junto a {MODEL_OUT.name}: "
+                  f"{', '.join(quantile_model_path(alpha).name for alpha in levels)}")
+
+    imp = (pd.Series(lgbm_final.feature_importances_, index=X.columns)
+             .sort_values(ascending=False))
+    print("\nTop-10 features (LightGBM):")
+    print(imp.head(10).round(2))
 
-sarima = SARIMAX(y_train, exog=exo_train, order=ARIMA_ORDER, enforce_stationarity=False,
-                 enforce_invertibility=False).fit(disp=False)
+    # ARIMA (SARIMAX) con variables exógenas wd y month
+    if not args.sin_arima:
+        mae_arima = evaluate_arima(X, y)
+        print(f"\nARIMA{ARIMA_ORDER} + exógenas MAE hold-out: {mae_arima:.2f} µg/m³")
 
-pred_arima = sarima.predict(start=y_test.index[0], end=y_test.index[-1], exog=exo_test)
-mae_arima  = mean_absolute_error(y_test, pred_arima)
+    print(f"\n⏱️ Tiempo total: {time.perf_counter() - started:.1f} s")
 
-print(f"\nARIMA{ARIMA_ORDER} + exógenas MAE hold-out: {mae_arima:.2f} µg/m³")
+if __name__ == "__main__":
+    main()
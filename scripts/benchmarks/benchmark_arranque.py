@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Presupuesto de arranque del modo de una fecha de daily_predictions.py
+
+El cron de Node lanza un proceso nuevo por predicción, así que las importaciones se pagan
+en cada llamada. Este script:
+  - mide `import daily_predictions` con `python -X importtime` en procesos nuevos (mediana
+    de --repeticiones) y lista los módulos que más tardan
+  - comprueba que importar el módulo no carga ninguna librería pesada (HEAVY_MODULES)
+  - con --dsn o DATABASE_URL, lanza el CLI como el cron (FECHA --local --sin-cache) con
+    cada motor y las librerías que ese motor no necesita bloqueadas (sys.modules[nombre] =
+    None hace fallar su import): si predice, la ruta solo necesita numpy, psycopg2 y, con
+    'booster', lightgbm y scipy. Escribe en la BD lo mismo que el cron (el promedio de ayer
+    si falta)
+
+Sale con código 1 si la importación supera --presupuesto-ms o si alguna comprobación falla.
+
+Uso:
+    python3 scripts/benchmarks/benchmark_arranque.py [--presupuesto-ms 400] [--repeticiones 7]
+    DATABASE_URL=postgresql://... python3 scripts/benchmarks/benchmark_arranque.py --fecha 2025-06-11
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from statistics import median
+
+ROOT = Path(__file__).resolve().parents[2]
+PREDICTION_DIR = ROOT / "scripts" / "cron" / "modelos_prediccion"
+
+# Librerías que el modo de una fecha no debe importar. lightgbm (con scipy, dependencia
+# suya) solo lo necesita el motor 'booster'; al importarse carga además pandas y sklearn
+# si están instalados, pero funciona sin ellos
+HEAVY_MODULES = ("pandas", "asyncio", "sklearn", "scipy", "joblib", "statsmodels", "lightgbm")
+ENGINE_MODULES = {"arboles": (), "booster": ("lightgbm", "scipy")}
+
+# Ejecuta el CLI con las librerías de argv[1] bloqueadas
+BLOCKED_RUN = """
+import sys, json, runpy
+for name in json.loads(sys.argv[1]):
+    sys.modules[name] = None
+sys.argv = ["daily_predictions.py", *sys.argv[2:]]
+runpy.run_path("daily_predictions.py", run_name="__main__")
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+def measure_import():
+    """
+    `import daily_predictions` en un proceso nuevo con -X importtime
+
+    Returns:
+        tuple: (ms acumulados de daily_predictions, {módulo importado: ms acumulados})
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import daily_predictions"],
+                            cwd=PREDICTION_DIR, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2)) / 1000
+    return modules["daily_predictions"], modules
+
+def run_blocked(target_date, engine, blocked):
+    """
+    CLI del cron con un motor y librerías bloqueadas
+
+    Returns:
+        tuple: (código de salida, ms de reloj del proceso, última línea de stderr)
+    """
+    env = dict(os.environ, MODEL_ENGINE=engine)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", BLOCKED_RUN, json.dumps(blocked), target_date,
+                             "--local", "--sin-cache"],
+                            cwd=PREDICTION_DIR, capture_output=True, text=True, env=env)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    last_error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+    return result.returncode, elapsed_ms, last_error
+
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de arranque del modo de una fecha")
+    parser.add_argument("--presupuesto-ms", type=float, default=400,
+                        help="Máximo de `import daily_predictions` (mediana), en ms")
+    parser.add_argument("--repeticiones", type=int, default=7, help="Procesos nuevos para la mediana")
+    parser.add_argument("--top", type=int, default=10, help="Módulos más lentos que se listan")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"),
+                        help="BD para lanzar el CLI con las librerías bloqueadas (por defecto DATABASE_URL)")
+    parser.add_argument("--fecha", default=time.strftime("%Y-%m-%d"),
+                        help="Fecha objetivo del CLI (por defecto hoy, como el cron)")
+    args = parser.parse_args()
+
+    failures = []
+    runs = [measure_import() for _ in range(args.repeticiones)]
+    import_ms = median(total for total, _ in runs)
+    modules = runs[-1][1]
+
+    print(f"⏱️ import daily_predictions: {import_ms:.1f} ms (mediana de {args.repeticiones}, "
+          f"presupuesto {args.presupuesto_ms:.0f} ms)")
+    direct = {name: ms for name, ms in modules.items() if name != "daily_predictions" and "." not in name}
+    for name, ms in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"   {ms:8.1f} ms  {name}")
+    if import_ms > args.presupuesto_ms:
+        failures.append(f"importación {import_ms:.1f} ms > {args.presupuesto_ms:.0f} ms")
+
+    loaded = [name for name in HEAVY_MODULES if name in modules]
+    if loaded:
+        failures.append(f"importar el módulo carga {', '.join(loaded)}")
+    else:
+        print(f"✅ Sin librerías pesadas al importar ({', '.join(HEAVY_MODULES)})")
+
+    if args.dsn:
+        os.environ["DATABASE_URL"] = args.dsn
+        for engine, allowed in ENGINE_MODULES.items():
+            # Con 'booster' también se bloquean pandas y sklearn: lightgbm no los necesita
+            blocked = [name for name in HEAVY_MODULES if name not in allowed]
+            returncode, elapsed_ms, last_error = run_blocked(args.fecha, engine, blocked)
+            if returncode == 0:
+                print(f"✅ CLI {args.fecha} motor {engine}: {elapsed_ms:.0f} ms sin {', '.join(blocked)}")
+            else:
+                failures.append(f"CLI motor {engine} con {', '.join(blocked)} bloqueados: {last_error}")
+    else:
+        print("ℹ️ Sin --dsn ni DATABASE_URL: se omite la ejecución del CLI")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
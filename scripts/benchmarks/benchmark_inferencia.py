@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inferencia del modelo LightGBM de PM2.5
+
+Compara la latencia por llamada del camino original (diccionario → pd.DataFrame →
+LGBMRegressor.predict) con FastPredictor (array float64 reservado) sobre los dos motores
+del almacén de modelos (booster nativo y evaluador NumPy), y comprueba que todos dan
+exactamente las mismas predicciones. Si hay modelos de cuantiles junto al del cron,
+comprueba también que la pasada apilada da lo mismo que cada .joblib por separado.
+
+Uso:
+    python3 scripts/benchmarks/benchmark_inferencia.py [--fechas 200] [--repeticiones 2000]
+"""
+
+import io
+import sys
+import time
+import argparse
+from pathlib import Path
+from contextlib import redirect_stdout
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "scripts" / "cron" / "modelos_prediccion"))
+
+import daily_predictions as dp  # noqa: E402
+
+CSV_PATH = ROOT / "desarrollo_modelos_prediccion" / "constitucion_asturias_air_quality.csv"
+
+def load_history(csv_path):
+    """Serie diaria de PM2.5 desde el CSV histórico, con la misma limpieza que el entrenamiento"""
+    df = pd.read_csv(csv_path)
+    df.columns = df.columns.str.strip().str.lower()
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["pm25"] = pd.to_numeric(df["pm25"].astype(str).str.replace(",", ".", regex=False).str.strip(),
+                               errors="coerce")
+    df = df.dropna(subset=["date", "pm25"]).set_index("date").sort_index()
+    return df[["pm25"]]
+
+def build_feature_rows(history, n_dates):
+    """Diccionarios de variables (generate_features) para las últimas n_dates fechas"""
+    target_dates = history.index[-n_dates:]
+    rows = []
+    with redirect_stdout(io.StringIO()):
+        for target in target_dates:
+            window = history[history.index < target]
+            rows.append(dp.generate_features(window, target.strftime('%Y-%m-%d')))
+    return rows
+
+def legacy_predict(model, features_dict):
+    """Camino original de make_predictions"""
+    return model.predict(pd.DataFrame([features_dict]))[0]
+
+def time_per_call(func, rows, repetitions):
+    """Latencias por llamada (µs) recorriendo las filas en bucle"""
+    for row in rows[:10]:
+        func(row)
+    latencies = np.empty(repetitions)
+    n_rows = len(rows)
+    for i in range(repetitions):
+        row = rows[i % n_rows]
+        started = time.perf_counter()
+        func(row)
+        latencies[i] = (time.perf_counter() - started) * 1e6
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de inferencia LightGBM PM2.5")
+    parser.add_argument("--fechas", type=int, default=200, help="Número de fechas de prueba")
+    parser.add_argument("--repeticiones", type=int, default=2000, help="Llamadas cronometradas por camino")
+    parser.add_argument("--csv", default=str(CSV_PATH), help="CSV histórico de calidad del aire")
+    args = parser.parse_args()
+
+    model = joblib.load(dp.MODEL_PATH)
+    with redirect_stdout(io.StringIO()):
+        predictors = {engine: dp.FastPredictor(dp.load_model(engine)) for engine in ("booster", "arboles")}
+
+    history = load_history(args.csv)
+    rows = build_feature_rows(history, args.fechas)
+    print(f"📊 {len(rows)} filas de variables desde {Path(args.csv).name}")
+
+    # 1. Paridad: mismas predicciones fila a fila y en bloque
+    legacy = np.array([legacy_predict(model, row) for row in rows])
+    matrix = pd.DataFrame(rows)[dp.FEATURE_NAMES].to_numpy(dtype=float)
+    for engine, predictor in predictors.items():
+        fast = np.array([predictor.predict_features(row) for row in rows])
+        batch = predictor.predict_matrix(matrix)
+        mismatches = int(np.sum(legacy != fast) + np.sum(legacy != batch))
+        if mismatches:
+            print(f"❌ Motor {engine}: {mismatches} predicciones distintas "
+                  f"(máx. dif. {np.max(np.abs(legacy - fast)):.3e})")
+            sys.exit(1)
+        print(f"✅ Motor {engine}: paridad exacta en {len(rows)} filas (fila a fila y en bloque)")
+
+    quantile_paths = dp.model_store.quantile_model_paths(dp.MODEL_PATH)
+    if quantile_paths:
+        frame = pd.DataFrame(matrix, columns=dp.FEATURE_NAMES)
+        expected = np.column_stack([legacy] + [joblib.load(path).predict(frame)
+                                               for path in quantile_paths.values()])
+        for engine, predictor in predictors.items():
+            mismatches = int(np.sum(predictor.predict_matrix_stacked(matrix) != expected))
+            if mismatches:
+                print(f"❌ Motor {engine}: {mismatches} predicciones de cuantiles distintas")
+                sys.exit(1)
+            print(f"✅ Motor {engine}: cuantiles {predictor.quantile_levels} apilados idénticos a cada modelo")
+
+    # 2. Latencia por llamada
+    results = {"DataFrame + LGBMRegressor.predict": time_per_call(lambda r: legacy_predict(model, r), rows,
+                                                                  args.repeticiones)}
+    for engine, predictor in predictors.items():
+        results[f"FastPredictor ({engine})"] = time_per_call(predictor.predict_features, rows, args.repeticiones)
+    baseline = np.median(results["DataFrame + LGBMRegressor.predict"])
+    print(f"\n{'Camino':<36}{'p50 µs':>10}{'p95 µs':>10}{'x':>8}")
+    for name, latencies in results.items():
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{name:<36}{p50:>10.1f}{p95:>10.1f}{baseline / p50:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los pipelines de predicción (daily_predictions.py) y entrenamiento
+(desarrollo_modelos.py) sobre una BD PostgreSQL desechable
+
+Crea un esquema propio (por defecto benchmark_air_gijon) con las tablas mediciones_api y
+promedios_diarios de db.js, lo llena con datos sintéticos a la escala pedida (años de
+histórico, estaciones, tasa de horas sin medición) y cronometra:
+  - calculate_daily_average_from_hourly, load_historical_data (modos acotado, cache y
+    completo), generate_features y make_predictions, en este proceso
+  - main() de daily_predictions.py como lo lanza el cron (proceso nuevo, importaciones incluidas)
+  - build_features y la validación cruzada (evaluate_candidates) de desarrollo_modelos.py
+    sobre la serie diaria sintética
+
+Cada ejecución se añade como una línea JSON al historial y se compara con la línea base
+(mediana de cada prueba); --fijar-base guarda la ejecución actual como nueva base. Las
+conexiones usan el esquema mediante PGOPTIONS, así que el resto de la BD no se toca; aun
+así, conviene apuntar a una BD de pruebas (BENCHMARK_DATABASE_URL o --dsn), nunca a la
+de producción.
+
+Uso:
+    BENCHMARK_DATABASE_URL=postgresql://... python3 scripts/benchmarks/benchmark_pipeline.py \\
+        [--anios 3] [--estaciones 2] [--huecos 0.05] [--repeticiones 20] [--fijar-base]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+ROOT = Path(__file__).resolve().parents[2]
+PREDICTION_DIR = ROOT / "scripts" / "cron" / "modelos_prediccion"
+sys.path.insert(0, str(PREDICTION_DIR))
+sys.path.insert(0, str(ROOT / "desarrollo_modelos_prediccion"))
+
+RESULTS_DIR = Path(__file__).parent / "resultados"
+HISTORY_PATH = RESULTS_DIR / "pipeline_historial.jsonl"
+BASELINE_PATH = RESULTS_DIR / "pipeline_base.json"
+SCHEMA = "benchmark_air_gijon"
+END_DATE = pd.Timestamp("2025-06-30")  # Último día sintético: fechas comparables entre ejecuciones
+REGRESSION_THRESHOLD = 0.20  # Más de un 20% sobre la base...
+NOISE_FLOOR_MS = 1.0         # ...y más de 1 ms de diferencia
+
+# Tablas de src/database/db.js. Sin la restricción UNIQUE (fecha) de mediciones_api,
+# incompatible con varias estaciones y contaminantes por instante
+SCHEMA_SQL = """
+CREATE TABLE mediciones_api (
+    id SERIAL PRIMARY KEY,
+    fecha TIMESTAMP WITH TIME ZONE NOT NULL,
+    pm25 REAL,
+    pm10 REAL,
+    estacion_id VARCHAR(50),
+    parametro VARCHAR(20),
+    valor REAL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE promedios_diarios (
+    id SERIAL PRIMARY KEY,
+    fecha DATE NOT NULL,
+    parametro VARCHAR(20) NOT NULL,
+    valor REAL,
+    estado TEXT,
+    source TEXT DEFAULT 'calculated' NOT NULL,
+    detalles TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(fecha, parametro, source)
+);
+CREATE INDEX idx_mediciones_api_fecha ON mediciones_api(fecha DESC);
+CREATE INDEX idx_mediciones_api_estacion_fecha ON mediciones_api(estacion_id, fecha DESC);
+CREATE INDEX idx_mediciones_api_parametro_fecha ON mediciones_api(parametro, fecha DESC);
+CREATE INDEX idx_mediciones_api_estacion_parametro_fecha ON mediciones_api(estacion_id, parametro, fecha) INCLUDE (valor);
+CREATE INDEX idx_promedios_fecha_parametro ON promedios_diarios(fecha DESC, parametro);
+"""
+
+# ------------------------------------------------------------------------#
+# 1. DATOS SINTÉTICOS
+# ------------------------------------------------------------------------#
+def synthetic_hourly(days, station_index, missing_rate, rng):
+    """
+    Serie horaria de PM2.5 de una estación: nivel diario AR(1) en escala logarítmica con
+    estacionalidad anual, ciclo diario y ruido; cada hora falta con probabilidad missing_rate
+
+    Returns:
+        tuple: (instantes datetime64[ns], valores PM2.5)
+    """
+    n_days = len(days)
+    season = 0.35 * np.cos(2 * np.pi * (days.dayofyear.to_numpy() - 15) / 365.25)
+    level = np.empty(n_days)
+    level[0] = 0.0
+    shocks = rng.normal(0, 0.25, n_days)
+    for i in range(1, n_days):
+        level[i] = 0.7 * level[i - 1] + shocks[i]
+    daily = np.exp(np.log(10 + 2 * station_index) + season + level)
+
+    hours = np.arange(24)
+    diurnal = 1 + 0.25 * np.sin(2 * np.pi * (hours - 8) / 24)
+    values = (daily[:, None] * diurnal[None, :] * rng.lognormal(0, 0.15, (n_days, 24))).ravel()
+    instants = (days.values[:, None] + hours[None, :] * np.timedelta64(1, 'h')).ravel()
+    keep = rng.random(len(values)) >= missing_rate
+    return instants[keep], np.round(values[keep], 1)
+
+def seed_dataset(conn, years, n_stations, missing_rate, seed=0):
+    """
+    Recrea el esquema y carga mediciones_api con COPY: PM2.5 y PM10 (1.8 veces PM2.5)
+    de n_stations estaciones; la primera es dp.DEFAULT_STATION
+
+    Returns:
+        tuple: (primer día, último día, filas cargadas)
+    """
+    import daily_predictions as dp
+
+    days = pd.date_range(end=END_DATE, periods=int(round(365.25 * years)), freq="D")
+    stations = [dp.DEFAULT_STATION] + [str(90000 + i) for i in range(1, n_stations)]
+    rng = np.random.default_rng(seed)
+
+    cursor = conn.cursor()
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path TO {SCHEMA}")
+    cursor.execute(SCHEMA_SQL)
+    n_rows = 0
+    for i, station in enumerate(stations):
+        instants, pm25 = synthetic_hourly(days, i, missing_rate, rng)
+        frame = pd.DataFrame({"fecha": pd.DatetimeIndex(instants).strftime("%Y-%m-%d %H:%M:%S+00")})
+        for parametro, values in (("pm25", pm25), ("pm10", np.round(pm25 * 1.8, 1))):
+            frame["estacion_id"], frame["parametro"], frame["valor"] = station, parametro, values
+            buffer = io.StringIO()
+            frame.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert("COPY mediciones_api (fecha, estacion_id, parametro, valor) FROM STDIN WITH CSV",
+                               buffer)
+            n_rows += len(frame)
+    cursor.execute("ANALYZE mediciones_api")
+    conn.commit()
+    cursor.close()
+    return days[0].strftime('%Y-%m-%d'), days[-1].strftime('%Y-%m-%d'), n_rows
+
+# ------------------------------------------------------------------------#
+# 2. MEDICIÓN
+# ------------------------------------------------------------------------#
+def measure(func, repetitions, args_list=None):
+    """
+    Tiempos (ms) de func, sin su salida por consola
+
+    Args:
+        func: Función a cronometrar
+        repetitions (int): Llamadas
+        args_list (list): Argumentos de cada llamada (se recorren en bucle); por defecto ninguno
+    """
+    args_list = args_list or [()]
+    times = []
+    with redirect_stdout(io.StringIO()):
+        for i in range(repetitions):
+            args = args_list[i % len(args_list)]
+            started = time.perf_counter()
+            func(*args)
+            times.append((time.perf_counter() - started) * 1000)
+    return times
+
+def summarize(times):
+    return {"n": len(times), "min_ms": round(min(times), 3), "p50_ms": round(float(np.median(times)), 3),
+            "p95_ms": round(float(np.percentile(times, 95)), 3)}
+
+def run_main(target_date, env, repetitions):
+    """main() de daily_predictions.py en un proceso nuevo, como lo lanza cron_predictions.js"""
+    command = [sys.executable, str(PREDICTION_DIR / "daily_predictions.py"), target_date, "--local", "--sin-cache"]
+    times = []
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        times.append((time.perf_counter() - started) * 1000)
+        if completed.returncode != 0:
+            raise RuntimeError(f"daily_predictions.py falló: {completed.stderr.strip()[-300:]}")
+    return times
+
+def benchmark_prediction(date_from, date_to, args, cache_dir):
+    """Pruebas de daily_predictions.py sobre el esquema sintético"""
+    import daily_predictions as dp
+    dp.HISTORY_CACHE_DIR = Path(cache_dir)
+
+    rng = np.random.default_rng(1)
+    days = pd.date_range(date_from, date_to, freq="D")[dp.WINDOW_DAYS + 1:]
+    picked = rng.choice(len(days), size=min(args.repeticiones, len(days)), replace=False)
+    targets = list(days[picked].strftime('%Y-%m-%d'))
+    results = {}
+
+    with dp.connection_scope() as conn:
+        results["calculate_daily_average_from_hourly"] = measure(
+            lambda d: dp.calculate_daily_average_from_hourly(d, conn=conn), args.repeticiones,
+            [(t,) for t in targets])
+        for mode in ("acotado", "cache", "completo"):
+            results[f"load_historical_data[{mode}]"] = measure(
+                lambda d: dp.load_historical_data(d, conn=conn, mode=mode), args.repeticiones,
+                [(t,) for t in targets])
+
+        with redirect_stdout(io.StringIO()):
+            histories = [(dp.load_historical_data(t, conn=conn), t) for t in targets]
+            model = dp.load_model()
+        results["generate_features"] = measure(dp.generate_features, args.repeticiones, histories)
+        results["make_predictions"] = measure(lambda df, t: dp.make_predictions(df, model, t),
+                                              args.repeticiones, histories)
+    dp.close_connection_pool()
+
+    env = {**os.environ, "HISTORY_CACHE_DIR": str(cache_dir), "PREDICTION_CACHE": "0"}
+    results["main"] = run_main(targets[0], env, args.repeticiones_main)
+    return results
+
+def load_synthetic_daily(conn):
+    """Serie diaria de PM2.5 (promedios_diarios sintético) con el formato de dm.load_series"""
+    df = pd.read_sql_query("SELECT fecha, valor AS pm25 FROM promedios_diarios WHERE parametro = 'pm25' "
+                           "ORDER BY fecha", conn, parse_dates=["fecha"])
+    return df.set_index("fecha").asfreq("D").interpolate()
+
+def benchmark_training(daily, args):
+    """Fases de variables y validación cruzada de desarrollo_modelos.py"""
+    import desarrollo_modelos as dm
+    results = {"build_features": measure(dm.build_features, args.repeticiones, [(daily,)])}
+    X, y = dm.build_features(daily)
+    results["evaluate_candidates"] = measure(
+        lambda: dm.evaluate_candidates(X, y, [dm.lgbm_params], n_processes=args.procesos),
+        args.repeticiones_cv)
+    return results
+
+# ------------------------------------------------------------------------#
+# 3. HISTORIAL Y LÍNEA BASE
+# ------------------------------------------------------------------------#
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_with_baseline(run, baseline):
+    """
+    Tabla de medianas contra la línea base
+
+    Returns:
+        list: Pruebas con regresión (más de REGRESSION_THRESHOLD y de NOISE_FLOOR_MS)
+    """
+    if baseline is None:
+        print("\nℹ️ Sin línea base: usa --fijar-base para guardar esta ejecución como referencia")
+        return []
+    if baseline["escala"] != run["escala"]:
+        print(f"\n⚠️ La línea base es de otra escala ({baseline['escala']}); no se compara")
+        return []
+
+    regressions = []
+    print(f"\nComparación con la base ({baseline['commit']}, {baseline['fecha']}):")
+    print(f"{'Prueba':<40}{'p50 ms':>12}{'base ms':>12}{'x':>8}")
+    for name, stats in run["resultados"].items():
+        base = baseline["resultados"].get(name)
+        if base is None:
+            print(f"{name:<40}{stats['p50_ms']:>12.2f}{'-':>12}{'-':>8}  nueva")
+            continue
+        ratio = stats["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("inf")
+        regression = (ratio > 1 + REGRESSION_THRESHOLD
+                      and stats["p50_ms"] - base["p50_ms"] > NOISE_FLOOR_MS)
+        if regression:
+            regressions.append(name)
+        mark = "⚠️ regresión" if regression else ("✅ mejora" if ratio < 1 - REGRESSION_THRESHOLD else "")
+        print(f"{name:<40}{stats['p50_ms']:>12.2f}{base['p50_ms']:>12.2f}{ratio:>8.2f}  {mark}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los pipelines de predicción y entrenamiento")
+    parser.add_argument("--dsn", default=os.getenv("BENCHMARK_DATABASE_URL"),
+                        help="BD PostgreSQL de pruebas (por defecto $BENCHMARK_DATABASE_URL)")
+    parser.add_argument("--anios", type=float, default=3, help="Años de histórico sintético")
+    parser.add_argument("--estaciones", type=int, default=2, help="Estaciones sintéticas (PM2.5 y PM10)")
+    parser.add_argument("--huecos", type=float, default=0.05, help="Probabilidad de que falte cada hora")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Llamadas por prueba en proceso")
+    parser.add_argument("--repeticiones-main", type=int, default=3, help="Ejecuciones de main() en proceso nuevo")
+    parser.add_argument("--repeticiones-cv", type=int, default=1, help="Ejecuciones de la validación cruzada")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos del pool de la validación cruzada")
+    parser.add_argument("--sin-entrenamiento", action="store_true", help="Omitir las fases de desarrollo_modelos.py")
+    parser.add_argument("--historial", default=str(HISTORY_PATH), help="JSON-lines con todas las ejecuciones")
+    parser.add_argument("--base", default=str(BASELINE_PATH), help="JSON de la línea base")
+    parser.add_argument("--fijar-base", action="store_true", help="Guardar esta ejecución como línea base")
+    parser.add_argument("--estricto", action="store_true", help="Salir con código 1 si hay regresiones")
+    parser.add_argument("--conservar", action="store_true", help="No borrar el esquema sintético al terminar")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("indica la BD de pruebas con --dsn o BENCHMARK_DATABASE_URL")
+
+    # Todas las conexiones (este proceso, el pool de daily_predictions y los subprocesos)
+    # trabajan en el esquema sintético
+    os.environ["DATABASE_URL"] = args.dsn
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    scale = {"anios": args.anios, "estaciones": args.estaciones, "huecos": args.huecos}
+
+    import daily_predictions as dp
+    conn = psycopg2.connect(args.dsn)
+    setup = {}
+    try:
+        started = time.perf_counter()
+        date_from, date_to, n_rows = seed_dataset(conn, args.anios, args.estaciones, args.huecos)
+        setup["carga_mediciones_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"🌱 {n_rows:,} mediciones sintéticas {date_from} → {date_to} "
+              f"({args.estaciones} estaciones, {args.huecos:.0%} de horas sin dato)")
+
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            counts = dp.rebuild_daily_averages(date_from, date_to, conn=conn)
+        # Como si cada promedio se hubiese escrito al día siguiente (marca de agua de la caché)
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE promedios_diarios SET updated_at = fecha + INTERVAL '1 day 1 hour'")
+        conn.commit()
+        setup["rebuild_daily_averages_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"📅 {counts['insertados']} promedios diarios en {setup['rebuild_daily_averages_ms']:.0f} ms")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            results = benchmark_prediction(date_from, date_to, args, cache_dir)
+        if not args.sin_entrenamiento:
+            results.update(benchmark_training(load_synthetic_daily(conn), args))
+    finally:
+        if not args.conservar:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+
+    run = {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+           "python": platform.python_version(), "cpus": os.cpu_count(), "escala": scale,
+           "preparacion": setup, "resultados": {name: summarize(times) for name, times in results.items()}}
+
+    print(f"\n{'Prueba':<40}{'n':>5}{'min ms':>12}{'p50 ms':>12}{'p95 ms':>12}")
+    for name, stats in run["resultados"].items():
+        print(f"{name:<40}{stats['n']:>5}{stats['min_ms']:>12.2f}{stats['p50_ms']:>12.2f}{stats['p95_ms']:>12.2f}")
+
+    history_path, baseline_path = Path(args.historial), Path(args.base)
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"\n📝 Ejecución añadida a {history_path}")
+
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+    regressions = compare_with_baseline(run, baseline)
+    if args.fijar_base:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(run, indent=2))
+        print(f"📌 Línea base actualizada: {baseline_path}")
+
+    if regressions:
+        print(f"\n⚠️ {len(regressions)} regresiones: {', '.join(regressions)}")
+        if args.estricto:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
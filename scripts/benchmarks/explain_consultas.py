@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Comprobación con EXPLAIN de los planes de las consultas de mediciones_api y promedios_diarios
+
+Siembra el esquema sintético de benchmark_pipeline.py (mismas tablas y datos), le pone los
+índices de src/database/db.js leídos del propio fichero (la comprobación sigue a db.js),
+hace VACUUM ANALYZE y ejecuta EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) sobre las consultas
+del acceso a datos de Python:
+  - DAILY_AGGREGATION_SQL y HOURLY_ROWS_SQL (daily_predictions.py) para 1 y 30 días
+  - SEED_SQL y REPAIR_SQL (daily_aggregator.py)
+  - BOUNDED_HISTORY_SQL (histórico acotado de promedios_diarios)
+
+Sale con código 1 si alguna recorre mediciones_api o promedios_diarios entera (Seq Scan)
+o si las que filtran por serie y día no usan INDEX_NAME (REPAIR_SQL filtra por estación y
+rango de fechas: le vale también idx_mediciones_api_fecha). Apunta siempre a una BD de
+pruebas (BENCHMARK_DATABASE_URL o --dsn): el esquema se crea y se borra al terminar.
+
+Uso:
+    BENCHMARK_DATABASE_URL=postgresql://... python3 scripts/benchmarks/explain_consultas.py \\
+        [--anios 3] [--estaciones 2] [--conservar]
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+from datetime import date, timedelta
+from contextlib import redirect_stdout
+
+import psycopg2
+
+from benchmark_pipeline import PREDICTION_DIR, ROOT, SCHEMA, seed_dataset
+
+DB_JS_PATH = ROOT / "src" / "database" / "db.js"
+INDEX_NAME = "idx_mediciones_api_estacion_parametro_fecha"
+TABLES = ("mediciones_api", "promedios_diarios")
+
+def db_js_indexes(path=DB_JS_PATH):
+    """Sentencias CREATE INDEX de db.js para mediciones_api y promedios_diarios"""
+    pattern = re.compile(r"CREATE INDEX IF NOT EXISTS \w+ ON (?:%s)\s*\([^;]*;" % "|".join(TABLES))
+    return pattern.findall(Path(path).read_text())
+
+def apply_db_js_indexes(conn):
+    """Sustituye los índices del esquema sintético por los de db.js"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = %s AND indexname LIKE 'idx\\_%%'",
+                   (SCHEMA,))
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"DROP INDEX {SCHEMA}.{name}")
+    statements = db_js_indexes()
+    for statement in statements:
+        cursor.execute(statement)
+    conn.commit()
+    cursor.close()
+    return statements
+
+def plan_nodes(plan):
+    """Recorre en profundidad los nodos de un plan JSON"""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+def explain(conn, query, params):
+    """
+    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) de una consulta
+
+    Returns:
+        dict: Nodo raíz del plan más 'Execution Time'
+    """
+    cursor = conn.cursor()
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+    result = cursor.fetchone()[0]
+    cursor.close()
+    conn.rollback()  # EXPLAIN ANALYZE ejecuta la consulta: no dejar nada abierto
+    result = json.loads(result) if isinstance(result, str) else result
+    return {**result[0]["Plan"], "Execution Time": result[0]["Execution Time"]}
+
+def check_plan(plan, needs_index):
+    """
+    Problemas del plan: Seq Scan sobre TABLES o INDEX_NAME sin usar
+
+    Returns:
+        tuple: (lista de problemas, accesos 'tabla: nodo [índice]')
+    """
+    problems, accesses = [], []
+    used_index = False
+    for node in plan_nodes(plan):
+        relation, index = node.get("Relation Name"), node.get("Index Name")
+        used_index = used_index or index == INDEX_NAME
+        if relation not in TABLES:
+            if index:  # Bitmap Index Scan: la tabla está en el Bitmap Heap Scan padre
+                accesses.append(f"{node['Node Type']} [{index}]")
+            continue
+        accesses.append(f"{relation}: {node['Node Type']}" + (f" [{index}]" if index else ""))
+        if node["Node Type"] == "Seq Scan":
+            problems.append(f"Seq Scan sobre {relation}")
+    if needs_index and not used_index:
+        problems.append(f"no usa {INDEX_NAME}")
+    return problems, accesses
+
+def query_cases(date_to):
+    """(nombre, consulta, parámetros, debe usar INDEX_NAME) de las consultas comprobadas"""
+    import daily_predictions as dp
+    import daily_aggregator as agg
+
+    last_day = date.fromisoformat(date_to)
+    month = [(last_day - timedelta(days=k)).isoformat() for k in range(30, 0, -1)]
+    station = dp.DEFAULT_STATION
+    one_series = dp._series_params([(station, "pm25")])
+    both_series = dp._series_params([(station, "pm25"), (station, "pm10")])
+    aggregation = {"valor_defecto": dp.DEFAULT_HOURLY_VALUE}
+    seed_keys = [(station, parametro, day) for parametro in ("pm25", "pm10") for day in month[-2:]]
+
+    return [
+        ("DAILY_AGGREGATION_SQL 1 día", dp.DAILY_AGGREGATION_SQL,
+         {**dp._date_params(month[-1:]), **aggregation, **one_series}, True),
+        ("DAILY_AGGREGATION_SQL 30 días x 2 series", dp.DAILY_AGGREGATION_SQL,
+         {**dp._date_params(month), **aggregation, **both_series}, True),
+        ("HOURLY_ROWS_SQL 1 día", dp.HOURLY_ROWS_SQL, {**dp._date_params(month[-1:]), **one_series}, True),
+        ("HOURLY_ROWS_SQL 30 días x 2 series", dp.HOURLY_ROWS_SQL,
+         {**dp._date_params(month), **both_series}, True),
+        ("SEED_SQL 2 días x 2 series", agg.SEED_SQL,
+         {"estaciones": [k[0] for k in seed_keys], "parametros": [k[1] for k in seed_keys],
+          **dp._date_params(month[-2:]), "dias": [k[2] for k in seed_keys], "hasta_id": 2 ** 31 - 1}, True),
+        ("REPAIR_SQL 30 días", agg.REPAIR_SQL,
+         {"estacion": station, "parametros": ["pm25", "pm10"], "desde": month[0], "hasta": None}, False),
+        ("BOUNDED_HISTORY_SQL", dp.BOUNDED_HISTORY_SQL,
+         {"parametro": "pm25", "target": date_to, "desde": dp.window_start(date_to)}, False),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprobación con EXPLAIN de los planes de las consultas")
+    parser.add_argument("--dsn", default=os.getenv("BENCHMARK_DATABASE_URL"),
+                        help="BD PostgreSQL de pruebas (por defecto $BENCHMARK_DATABASE_URL)")
+    parser.add_argument("--anios", type=float, default=3, help="Años de histórico sintético")
+    parser.add_argument("--estaciones", type=int, default=2, help="Estaciones sintéticas (PM2.5 y PM10)")
+    parser.add_argument("--conservar", action="store_true", help="No borrar el esquema sintético al terminar")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("indica la BD de pruebas con --dsn o BENCHMARK_DATABASE_URL")
+    if args.anios < 1:
+        # Con menos de un año promedios_diarios cabe en un par de páginas y el Seq Scan es el buen plan
+        parser.error("--anios debe ser al menos 1")
+
+    os.environ["DATABASE_URL"] = args.dsn
+    os.environ["PGOPTIONS"] = f"-c search_path={SCHEMA}"
+    sys.path.insert(0, str(PREDICTION_DIR))
+    import daily_predictions as dp
+
+    conn = psycopg2.connect(args.dsn)
+    failures = []
+    try:
+        date_from, date_to, n_rows = seed_dataset(conn, args.anios, args.estaciones, missing_rate=0.05)
+        with redirect_stdout(io.StringIO()):
+            dp.rebuild_daily_averages(date_from, date_to, conn=conn)
+        statements = apply_db_js_indexes(conn)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("VACUUM (ANALYZE) mediciones_api, promedios_diarios")
+        conn.autocommit = False
+        print(f"🌱 {n_rows:,} mediciones sintéticas {date_from} → {date_to}, "
+              f"{len(statements)} índices de db.js")
+
+        print(f"\n{'Consulta':<42}{'ms':>9}{'bloques':>9}  Accesos")
+        for name, query, params, needs_index in query_cases(date_to):
+            plan = explain(conn, query, params)
+            problems, accesses = check_plan(plan, needs_index)
+            blocks = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+            mark = "❌" if problems else "✅"
+            print(f"{mark} {name:<40}{plan['Execution Time']:>9.2f}{blocks:>9}  {'; '.join(dict.fromkeys(accesses))}")
+            failures.extend(f"{name}: {problem}" for problem in problems)
+    finally:
+        if not args.conservar:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"\n✅ Ningún Seq Scan sobre {' ni '.join(TABLES)}")
+
+if __name__ == "__main__":
+    main()
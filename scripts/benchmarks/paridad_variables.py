@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Paridad y tiempos del módulo compartido de variables (features.py)
+
+Compara features.py con las dos implementaciones anteriores, copiadas aquí como referencia:
+  1. Entrenamiento (desarrollo_modelos.py): columnas con pandas shift. Debe coincidir bit a bit.
+  2. Producción (generate_features): indexado escalar sobre el histórico. Deben coincidir
+     las 33 variables salvo 'trend', que ahora se cuenta desde TREND_ORIGIN hasta la fecha
+     objetivo (antes: desde la primera fila del histórico hasta el día anterior).
+Además mide cuánto tarda construir las variables de 10 años de datos diarios.
+
+Uso:
+    python3 scripts/benchmarks/paridad_variables.py [--fechas 300] [--anios 10]
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / "scripts" / "cron" / "modelos_prediccion"))
+sys.path.insert(0, str(ROOT / "desarrollo_modelos_prediccion"))
+
+import features  # noqa: E402
+import desarrollo_modelos as dm  # noqa: E402
+
+def reference_training_features(df):
+    """build_features de desarrollo_modelos.py antes de features.py"""
+    feat = pd.DataFrame(index=df.index)
+    for k in features.LAG_LIST:
+        feat[f"lag{k}"] = df["pm25"].shift(k)
+    for k in range(1, 14):
+        feat[f"diff_abs{k}"] = feat[f"lag{k}"] - feat[f"lag{k+1}"]
+    feat["trend"] = (feat.index - feat.index[0]).days
+    feat["trend7"] = (feat["lag1"] - feat["lag7"]) / 6
+    feat["wd"] = feat.index.dayofweek
+    feat["month"] = feat.index.month
+    data = feat.join(df["pm25"]).dropna().astype(float)
+    return data.drop(columns=["pm25"]), data["pm25"]
+
+def reference_serving_features(df, target_date):
+    """generate_features de daily_predictions.py antes de features.py (sin mensajes)"""
+    values = df["pm25"].values
+    row = {f"lag{k}": values[-k] for k in features.LAG_LIST}
+    for k in range(1, 14):
+        row[f"diff_abs{k}"] = row[f"lag{k}"] - row[f"lag{k+1}"]
+    row["trend"] = (df.index[-1] - df.index[0]).days
+    row["trend7"] = (row["lag1"] - row["lag7"]) / 6
+    target_dt = pd.to_datetime(target_date)
+    row["wd"] = target_dt.dayofweek
+    row["month"] = target_dt.month
+    return row
+
+def best_time(func, repetitions):
+    """Mejor tiempo (ms) de varias ejecuciones"""
+    times = []
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y tiempos de features.py")
+    parser.add_argument("--fechas", type=int, default=300, help="Fechas de producción a comparar")
+    parser.add_argument("--anios", type=int, default=10, help="Años de la serie sintética para los tiempos")
+    args = parser.parse_args()
+
+    df = dm.load_series()
+    failures = 0
+
+    # 1. Entrenamiento: bit a bit
+    X_ref, y_ref = reference_training_features(df)
+    X_new, y_new = dm.build_features(df)
+    same = (list(X_ref.columns) == list(X_new.columns) and X_ref.index.equals(X_new.index)
+            and np.array_equal(X_ref.to_numpy(), X_new.to_numpy()) and np.array_equal(y_ref, y_new))
+    failures += not same
+    print(f"{'✅' if same else '❌'} Entrenamiento: {X_new.shape[0]} filas × {X_new.shape[1]} variables, "
+          f"{'idénticas' if same else 'distintas'} a la versión con shift")
+
+    # 2. Producción: todas las variables salvo trend; trend desde TREND_ORIGIN
+    trend_col = features.FEATURE_NAMES.index("trend")
+    targets = df.index[-args.fechas:]
+    mismatches, trend_shift = 0, []
+    for target in targets:
+        history = df[df.index < target]
+        reference = reference_serving_features(history, target)
+        row = features.features_from_windows(history["pm25"].to_numpy()[None, -features.WINDOW_DAYS:], [target])[0]
+        expected = np.array([reference[name] for name in features.FEATURE_NAMES], dtype=float)
+        other = np.arange(features.N_FEATURES) != trend_col
+        mismatches += int(np.sum(row[other] != expected[other]))
+        mismatches += int(row[trend_col] != (target - pd.Timestamp(features.TREND_ORIGIN)).days)
+        trend_shift.append(row[trend_col] - reference["trend"])
+    failures += mismatches > 0
+    shifts = ", ".join(f"{int(v):+d} ({n})" for v, n in zip(*np.unique(trend_shift, return_counts=True)))
+    print(f"{'✅' if not mismatches else '❌'} Producción: {len(targets)} fechas, {mismatches} variables distintas "
+          f"(sin contar trend); trend nuevo - trend anterior: {shifts}")
+
+    # 3. Tiempos: serie sintética de N años
+    dates = pd.date_range("2015-01-01", periods=365 * args.anios, freq="D")
+    rng = np.random.default_rng(0)
+    synthetic = pd.DataFrame({"pm25": rng.gamma(4, 3, len(dates))}, index=dates)
+    values, days = synthetic["pm25"].to_numpy(), synthetic.index.values
+    ms_reference = best_time(lambda: reference_training_features(synthetic), 5)
+    ms_matrix = best_time(lambda: features.training_matrix(values, days), 20)
+    print(f"\n⏱️ {len(dates)} días ({args.anios} años): shift de pandas {ms_reference:.1f} ms, "
+          f"features.training_matrix {ms_matrix:.2f} ms ({ms_reference / ms_matrix:.0f}x)")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
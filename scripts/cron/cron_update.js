@@ -65,6 +65,15 @@ async function main() {
     // Almacenar datos
     console.log('\n💾 Almacenando datos...');
     await storeAirQualityData(data);
+
+    // Avisar al agregador de promedios diarios (daily_aggregator.py --escuchar), si está en marcha.
+    // Los datos ya están guardados: si el aviso falla, el agregador recoge las filas en su
+    // siguiente sondeo (marca de agua de POLL_SQL), así que no se interrumpe la ingesta
+    try {
+      await pool.query("SELECT pg_notify('mediciones_api', $1)", [STATION_ID]);
+    } catch (notifyError) {
+      console.warn(`⚠️ No se pudo avisar al agregador de promedios diarios: ${notifyError.message}`);
+    }
     
     // Estadísticas finales
     console.log('\n📊 Estadísticas finales:');
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Mantenimiento incremental de promedios_diarios a partir de mediciones_api
+
+Las predicciones solo calculaban el promedio de "ayer" y bajo demanda
+(ensure_daily_data_updated); si un cron no se ejecutaba, los días anteriores se
+quedaban sin promedio. Este agregador lo hace fuera del camino de la predicción:
+- Sigue mediciones_api con una marca de agua sobre `id` y guarda, por serie y día, la
+  última lectura de cada instante: de ahí salen la rejilla horaria, el relleno de
+  huecos y el número de registros, igual que en aggregate_daily_series
+- Al cerrarse un día (fecha < CURRENT_DATE) escribe su promedio en bloque
+- Una consulta por rango detecta los días sin promedio o con mediciones posteriores a
+  él (Node reescribe una hora borrando e insertando) y los repara en un solo lote
+
+Uso:
+    python daily_aggregator.py                       # una pasada: nuevas filas + reparación
+    python daily_aggregator.py --desde 2025-01-01    # reparar un rango concreto
+    python daily_aggregator.py --escuchar            # proceso continuo (LISTEN + sondeo)
+"""
+
+import os
+import sys
+import json
+import time
+import select
+import signal
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from daily_predictions import (
+    DEFAULT_STATION, HISTORY_CACHE_DIR, _date_params, _series_params, aggregate_daily_series,
+    close_connection_pool, connection_scope, db_stats_summary, get_air_quality_state,
+    get_db_connection, hourly_grid_means, load_model_registry, write_daily_averages
+)
+
+# Estado del agregador (marca de agua y días abiertos); se puede borrar sin perder nada:
+# la siguiente pasada arranca en el último id y la reparación cubre lo anterior
+STATE_PATH = Path(os.getenv('AGGREGATOR_STATE', HISTORY_CACHE_DIR / 'agregador_diario.json'))
+STATE_VERSION = 1
+POLL_BATCH_ROWS = int(os.getenv('AGGREGATOR_BATCH', 5000))
+STATE_DAYS = 2  # Días cerrados que se conservan en memoria por si llegan lecturas tardías
+REPAIR_DAYS = int(os.getenv('REPAIR_DAYS', 30))  # Rango por defecto de la reparación
+NOTIFY_CHANNEL = 'mediciones_api'  # cron_update.js hace pg_notify tras guardar mediciones
+LISTEN_INTERVAL = 60  # segundos sin aviso tras los que se sondea igualmente
+REPAIR_INTERVAL = 3600  # segundos entre reparaciones en modo --escuchar
+
+# Filas nuevas de las series seguidas, por orden de llegada
+POLL_SQL = """
+SELECT m.id, m.estacion_id, m.parametro, DATE(m.fecha) AS dia, EXTRACT(HOUR FROM m.fecha)::int AS hora,
+       m.fecha, m.valor::text::float8
+FROM mediciones_api m
+JOIN unnest(%(series_estaciones)s::varchar[], %(series_parametros)s::varchar[]) AS s(estacion_id, parametro)
+    ON s.estacion_id = m.estacion_id AND s.parametro = m.parametro
+WHERE m.id > %(id)s AND m.valor IS NOT NULL
+ORDER BY m.id
+LIMIT %(limite)s
+"""
+
+# Todas las filas de días que el agregador aún no tiene en memoria (hasta el último id leído);
+# cada día como rango semiabierto para usar el índice (estacion_id, parametro, fecha), con la
+# misma cota constante [primer_dia, ultimo_dia + 1) que DAILY_AGGREGATION_SQL
+SEED_SQL = """
+SELECT m.id, m.estacion_id, m.parametro, k.dia, EXTRACT(HOUR FROM m.fecha)::int AS hora,
+       m.fecha, m.valor::text::float8
+FROM mediciones_api m
+JOIN unnest(%(estaciones)s::varchar[], %(parametros)s::varchar[], %(dias)s::date[]) AS k(estacion_id, parametro, dia)
+    ON k.estacion_id = m.estacion_id AND k.parametro = m.parametro
+    AND m.fecha >= k.dia AND m.fecha < k.dia + 1
+WHERE m.id <= %(hasta_id)s AND m.valor IS NOT NULL
+    AND m.fecha >= %(primer_dia)s::date AND m.fecha < %(ultimo_dia)s::date + 1
+ORDER BY m.id
+"""
+
+# Días cerrados con mediciones y sin promedio, o con mediciones creadas después de su
+# promedio. promedios_diarios puede tener una fila por fuente: vale la más antigua.
+REPAIR_SQL = """
+SELECT m.parametro, m.dia
+FROM (
+    SELECT parametro, DATE(fecha) AS dia, MAX(GREATEST(created_at, updated_at)) AS ultima_medicion
+    FROM mediciones_api
+    WHERE estacion_id = %(estacion)s AND parametro = ANY(%(parametros)s::varchar[])
+      AND valor IS NOT NULL
+      AND fecha >= %(desde)s::date
+      AND fecha < LEAST(COALESCE(%(hasta)s::date + 1, CURRENT_DATE), CURRENT_DATE)
+    GROUP BY parametro, DATE(fecha)
+) m
+LEFT JOIN LATERAL (
+    SELECT MIN(p.updated_at) AS actualizado
+    FROM promedios_diarios p
+    WHERE p.fecha = m.dia AND p.parametro = m.parametro
+) p ON TRUE
+WHERE p.actualizado IS NULL OR p.actualizado < m.ultima_medicion
+ORDER BY m.parametro, m.dia
+"""
+
+def default_parameters():
+    """Contaminantes de DEFAULT_STATION en el registro de modelos (los de promedios_diarios)"""
+    parametros = [e['parametro'] for e in load_model_registry() if e['estacion_id'] == DEFAULT_STATION]
+    return list(dict.fromkeys(parametros))
+
+def _day_key(estacion_id, parametro, dia):
+    return f"{estacion_id}|{parametro}|{dia}"
+
+class DailyAggregator:
+    """
+    Estado incremental de los promedios diarios de DEFAULT_STATION (la única estación
+    de promedios_diarios) para varios contaminantes
+
+    Por cada día abierto guarda {instante ISO: [id, hora, valor]}: una lectura reescrita
+    por Node (DELETE + INSERT) llega con un id mayor y sustituye a la anterior, así que
+    el estado coincide con la tabla. De ahí salen el número de registros y la rejilla
+    de 24 horas (primera lectura de cada hora) que rellena hourly_grid_means.
+    """
+
+    def __init__(self, parametros, state_path=STATE_PATH):
+        self.series = [(DEFAULT_STATION, str(parametro)) for parametro in dict.fromkeys(parametros)]
+        self.state_path = Path(state_path)
+        self.last_id = None
+        self.days = {}
+        self.dirty = set()
+        self.load()
+
+    def load(self):
+        """Lee el estado guardado si corresponde a la misma versión y series"""
+        if not self.state_path.exists():
+            return
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION or state.get('series') != [list(s) for s in self.series]:
+            print("⚠️ Estado del agregador de otra versión o series: se descarta")
+            return
+        self.last_id = state['id']
+        self.days = state['dias']
+        self.dirty = set(state['pendientes'])
+
+    def save(self):
+        """Escribe el estado en un temporal y lo publica con os.replace (atómico)"""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': STATE_VERSION, 'series': [list(s) for s in self.series], 'id': self.last_id,
+                       'dias': self.days, 'pendientes': sorted(self.dirty)}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _apply(self, rows, keys=None):
+        """Incorpora filas (id, estación, parámetro, día, hora, fecha, valor) al estado"""
+        for row_id, estacion_id, parametro, dia, hora, fecha, valor in rows:
+            key = _day_key(estacion_id, parametro, dia)
+            if keys is not None and key not in keys:
+                continue
+            readings = self.days.setdefault(key, {})
+            instant = fecha.isoformat()
+            if instant not in readings or readings[instant][0] < row_id:
+                readings[instant] = [row_id, hora, valor]
+            self.dirty.add(key)
+
+    def poll(self, conn):
+        """
+        Lee las filas de mediciones_api posteriores a la marca de agua. Los días que no
+        estaban en memoria se cargan enteros (SEED_SQL) para no promediar solo la cola.
+        La primera vez solo fija la marca en el último id: lo anterior lo cubre repair.
+
+        Returns:
+            int: Filas nuevas leídas
+        """
+        cursor = conn.cursor()
+        if self.last_id is None:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM mediciones_api")
+            self.last_id = cursor.fetchone()[0]
+            cursor.close()
+            print(f"📍 Primera ejecución: marca de agua en id {self.last_id}")
+            return 0
+
+        n_rows = 0
+        while True:
+            cursor.execute(POLL_SQL, {'id': self.last_id, 'limite': POLL_BATCH_ROWS,
+                                      **_series_params(self.series)})
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            new_keys = sorted({_day_key(r[1], r[2], r[3]) for r in rows} - set(self.days))
+            if new_keys:
+                parts = [key.split('|') for key in new_keys]
+                dates = _date_params([p[2] for p in parts])
+                cursor.execute(SEED_SQL, {
+                    'estaciones': [p[0] for p in parts], 'parametros': [p[1] for p in parts],
+                    'dias': dates['fechas'], 'primer_dia': dates['primer_dia'],
+                    'ultimo_dia': dates['ultimo_dia'], 'hasta_id': rows[-1][0]
+                })
+                self._apply(cursor.fetchall(), keys=set(new_keys))
+            self._apply(rows, keys={_day_key(r[1], r[2], r[3]) for r in rows} - set(new_keys))
+            n_rows += len(rows)
+            self.last_id = rows[-1][0]
+            if len(rows) < POLL_BATCH_ROWS:
+                break
+        cursor.close()
+        return n_rows
+
+    def daily_averages(self, keys):
+        """
+        Promedio, horas interpoladas, registros y estado de días del estado
+
+        Returns:
+            dict: {clave: {'valor', 'horas_interpoladas', 'registros', 'estado'}}
+        """
+        keys = [key for key in keys if self.days.get(key)]
+        hourly_values = np.full((len(keys), 24), np.nan)
+        for i, key in enumerate(keys):
+            # Primera lectura de cada hora, como DISTINCT ON (..., hora) ORDER BY fecha
+            for instant in sorted(self.days[key], key=datetime.fromisoformat, reverse=True):
+                hourly_values[i, self.days[key][instant][1]] = self.days[key][instant][2]
+        means, interpolated = hourly_grid_means(hourly_values)
+
+        averages = {}
+        for i, key in enumerate(keys):
+            parametro = key.split('|')[1]
+            valor = round(float(means[i]), 2)
+            averages[key] = {'valor': valor, 'horas_interpoladas': int(interpolated[i]),
+                             'registros': len(self.days[key]), 'estado': get_air_quality_state(parametro, valor)}
+        return averages
+
+    def flush(self, conn):
+        """
+        Escribe en bloque los promedios de los días cerrados que han cambiado y olvida
+        los días cerrados hace más de STATE_DAYS
+
+        Returns:
+            int: Días escritos
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT CURRENT_DATE")
+        today = cursor.fetchone()[0]
+        cursor.close()
+        today_str = today.strftime('%Y-%m-%d')
+
+        closed = sorted(key for key in self.dirty if key.split('|')[2] < today_str)
+        averages = self.daily_averages(closed)
+        for _, parametro in self.series:
+            rows = [(key.split('|')[2], d['valor'], d['estado'])
+                    for key, d in averages.items() if key.split('|')[1] == parametro]
+            if rows:
+                write_daily_averages(rows, conn=conn, parametro=parametro)
+        self.dirty -= set(closed)
+
+        oldest = (today - timedelta(days=STATE_DAYS)).strftime('%Y-%m-%d')
+        for key in [key for key in self.days if key.split('|')[2] < oldest and key not in self.dirty]:
+            del self.days[key]
+        return len(averages)
+
+    def repair(self, conn, date_from=None, date_to=None):
+        """
+        Detecta con una consulta los días cerrados sin promedio o con mediciones más
+        recientes que su promedio, y los recalcula y escribe en un solo lote
+
+        Args:
+            conn: Conexión a BD abierta
+            date_from (str): Primer día (YYYY-MM-DD); por defecto hace REPAIR_DAYS días
+            date_to (str): Último día (YYYY-MM-DD), incluido; por defecto ayer
+
+        Returns:
+            int: Días reparados
+        """
+        date_from = date_from or (datetime.now() - timedelta(days=REPAIR_DAYS)).strftime('%Y-%m-%d')
+        cursor = conn.cursor()
+        cursor.execute(REPAIR_SQL, {'estacion': DEFAULT_STATION, 'parametros': [p for _, p in self.series],
+                                    'desde': date_from, 'hasta': date_to})
+        stale = cursor.fetchall()
+        cursor.close()
+        if not stale:
+            return 0
+
+        days = sorted({dia.strftime('%Y-%m-%d') for _, dia in stale})
+        series = sorted({(DEFAULT_STATION, parametro) for parametro, _ in stale})
+        daily = aggregate_daily_series(series, days, conn=conn)
+        wanted = {(parametro, dia.strftime('%Y-%m-%d')) for parametro, dia in stale}
+        for (_, parametro), by_day in daily.items():
+            rows = [(dia, d['valor'], d['estado']) for dia, d in by_day.items() if (parametro, dia) in wanted]
+            write_daily_averages(rows, conn=conn, parametro=parametro)
+        # El estado de esos días puede estar desfasado: se recargará si llegan más filas
+        for parametro, dia in wanted:
+            key = _day_key(DEFAULT_STATION, parametro, dia)
+            self.days.pop(key, None)
+            self.dirty.discard(key)
+        return len(wanted)
+
+    def run_once(self, date_from=None, date_to=None, do_repair=True):
+        """Una pasada completa en una transacción; el estado se guarda tras el commit"""
+        with connection_scope() as conn:
+            n_rows = self.poll(conn)
+            n_written = self.flush(conn)
+            n_repaired = self.repair(conn, date_from, date_to) if do_repair else 0
+        self.save()
+        print(f"📊 {n_rows} mediciones nuevas (id ≤ {self.last_id}), {n_written} promedios escritos, "
+              f"{n_repaired} días reparados, {len(self.dirty)} días abiertos")
+        return {'mediciones': n_rows, 'escritos': n_written, 'reparados': n_repaired}
+
+    def listen(self, interval=LISTEN_INTERVAL):
+        """
+        Proceso continuo: espera avisos en NOTIFY_CHANNEL (o `interval` segundos) y hace
+        una pasada; repara cada REPAIR_INTERVAL segundos
+        """
+        listener = get_db_connection()
+        listener.autocommit = True
+        listener.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+        print(f"👂 Escuchando '{NOTIFY_CHANNEL}' (sondeo cada {interval} s)")
+        last_repair = None
+        try:
+            while True:
+                do_repair = last_repair is None or time.monotonic() - last_repair >= REPAIR_INTERVAL
+                self.run_once(do_repair=do_repair)
+                if do_repair:
+                    last_repair = time.monotonic()
+                if select.select([listener], [], [], interval) != ([], [], []):
+                    listener.poll()
+                    listener.notifies.clear()
+        except KeyboardInterrupt:
+            print("🛑 Agregador detenido")
+        finally:
+            listener.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento incremental de promedios_diarios")
+    parser.add_argument("--parametros", nargs="+", default=None,
+                        help="Contaminantes (por defecto los de la estación principal en el registro)")
+    parser.add_argument("--desde", help=f"Reparar desde este día (por defecto hace {REPAIR_DAYS} días)")
+    parser.add_argument("--hasta", help="Reparar hasta este día, incluido (por defecto ayer)")
+    parser.add_argument("--escuchar", action="store_true", help="Proceso continuo con LISTEN/NOTIFY y sondeo")
+    parser.add_argument("--intervalo", type=int, default=LISTEN_INTERVAL, help="Segundos entre sondeos")
+    args = parser.parse_args()
+
+    for date_str in (args.desde, args.hasta):
+        if date_str:
+            datetime.strptime(date_str, '%Y-%m-%d')
+
+    # Render/systemd paran el proceso con SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    aggregator = DailyAggregator(args.parametros or default_parameters())
+    print(f"🚀 AGREGADOR DIARIO - series {', '.join(f'{e}/{p}' for e, p in aggregator.series)}")
+    try:
+        if args.escuchar:
+            aggregator.listen(args.intervalo)
+        else:
+            aggregator.run_once(args.desde, args.hasta)
+        print(db_stats_summary())
+    except Exception as e:
+        print(f"❌ Error en el agregador: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        close_connection_pool()
+
+if __name__ == "__main__":
+    main()
@@ -10,213 +10,666 @@ Salida: JSON con predicciones día actual y día siguiente
 import sys
 import json
 import os
+import time
+import fcntl
+import hashlib
+import socket
+import signal
+import argparse
+import socketserver
+from contextlib import contextmanager, nullcontext, redirect_stdout
 from pathlib import Path
-import pandas as pd
 import numpy as np
-import joblib
 import psycopg2
+import psycopg2.pool
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
 import warnings
 
+import model_store
+import instrumentation
+from instrumentation import stage
+from features import FEATURE_NAMES, WINDOW_DAYS, as_days, daily_windows, features_from_windows
+
 warnings.filterwarnings("ignore")
 
 # Configuración
 MODEL_PATH = Path(__file__).parent / "modelo_lgbm_pm25.joblib"
+# Registro (estación, contaminante) -> modelo para el modo --todas
+MODEL_REGISTRY_PATH = Path(os.getenv('MODEL_REGISTRY', Path(__file__).parent / "modelos_registro.json"))
+# Estación cuyos promedios guarda promedios_diarios (Avenida Constitución); la tabla no
+# tiene columna de estación, así que las demás se agregan al vuelo desde mediciones_api
+DEFAULT_STATION = '6699'
+DEFAULT_PARAMETER = 'pm25'
+# Motor del modo de una fecha: 'arboles' (evaluador NumPy del almacén, sin importar lightgbm)
+# o 'booster' (LightGBM nativo). Servidor y backfill usan siempre 'booster', más rápido por fila
+MODEL_ENGINE = os.getenv('MODEL_ENGINE', 'arboles')
 MIN_REQUIRED_DAYS = 28  # Reducido temporalmente para que funcione con datos limitados
+# Días de la ventana de 28 que pueden faltar (y rellenarse interpolando) antes de rechazar la fecha
+MAX_FILLED_DAYS = int(os.getenv('MAX_FILLED_DAYS', 14))
+DEFAULT_HORIZON = 2  # Día actual y siguiente: lo que consume cron_predictions.js
+# Cargar los modelos de cuantiles (<modelo>_pNN.joblib) si existen: intervalos y
+# probabilidades de banda OMS en la salida
+QUANTILE_MODELS = os.getenv('QUANTILE_MODELS', '1') != '0'
+# Socket del servidor de predicciones (modo --serve); el CLI lo usa si existe
+SOCKET_PATH = os.getenv('PREDICTION_SOCKET', '/tmp/air_gijon_predicciones.sock')
+CLIENT_TIMEOUT = 60  # segundos, igual que el timeout del cron en Node
+
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '4'))
+# Conexiones físicas abiertas y tiempo invertido en abrirlas (handshake TLS incluido)
+DB_STATS = {"conexiones": 0, "tiempo_conexion_ms": 0.0}
+_connection_pool = None
+
+def _connection_params():
+    """Argumentos de psycopg2.connect según el entorno"""
+    # Cursores que cuentan consultas, filas y bytes (instrumentation)
+    options = {'cursor_factory': instrumentation.InstrumentedCursor}
+    # En producción (Render) usa DATABASE_URL
+    database_url = os.getenv('DATABASE_URL')
+    if database_url:
+        return (database_url,), options
+    # En desarrollo local, construir la conexión
+    return (), {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'database': os.getenv('DB_NAME', 'air_gijon'),
+        'user': os.getenv('DB_USER', 'sergio'),
+        'password': os.getenv('DB_PASSWORD', 'air'),
+        **options
+    }
+
+def _record_connection(started):
+    DB_STATS["conexiones"] += 1
+    DB_STATS["tiempo_conexion_ms"] += (time.perf_counter() - started) * 1000
 
 def get_db_connection():
     """Obtiene conexión a PostgreSQL usando variables de entorno"""
     try:
-        # En producción (Render) usa DATABASE_URL
-        database_url = os.getenv('DATABASE_URL')
-        if database_url:
-            conn = psycopg2.connect(database_url)
-        else:
-            # En desarrollo local, construir la conexión
-            conn = psycopg2.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                database=os.getenv('DB_NAME', 'air_gijon'),
-                user=os.getenv('DB_USER', 'sergio'),
-                password=os.getenv('DB_PASSWORD', 'air')
-            )
+        args, kwargs = _connection_params()
+        started = time.perf_counter()
+        with stage('connect'):
+            conn = psycopg2.connect(*args, **kwargs)
+        _record_connection(started)
         return conn
     except Exception as e:
         print(f"❌ Error conectando a BD: {e}", file=sys.stderr)
         raise
 
-def calculate_daily_average_from_hourly(target_date):
+class _CountingConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """Pool de psycopg2 que contabiliza las conexiones físicas que abre"""
+
+    def _connect(self, key=None):
+        started = time.perf_counter()
+        conn = super()._connect(key)
+        _record_connection(started)
+        return conn
+
+def get_connection_pool():
+    """Pool de conexiones del módulo, creado la primera vez que se necesita"""
+    global _connection_pool
+    if _connection_pool is None:
+        try:
+            args, kwargs = _connection_params()
+            _connection_pool = _CountingConnectionPool(1, DB_POOL_MAX, *args, **kwargs)
+        except Exception as e:
+            print(f"❌ Error conectando a BD: {e}", file=sys.stderr)
+            raise
+    return _connection_pool
+
+def close_connection_pool():
+    """Cierra todas las conexiones del pool (fin del proceso o del servidor)"""
+    global _connection_pool
+    if _connection_pool is not None:
+        _connection_pool.closeall()
+        _connection_pool = None
+
+def db_stats_summary():
+    """Línea de resumen de conexiones y consultas para los logs"""
+    counters = instrumentation.DB_COUNTERS
+    return (f"🔌 Conexiones BD: {DB_STATS['conexiones']} ({DB_STATS['tiempo_conexion_ms']:.1f} ms conectando), "
+            f"{counters['consultas']} consultas, {counters['filas']} filas recibidas")
+
+@contextmanager
+def connection_scope(conn=None):
+    """
+    Proveedor de conexiones. Si se recibe una conexión, se reutiliza y la transacción
+    queda en manos de quien la abrió. Si no, se toma una del pool y todo el bloque va
+    en una única transacción: commit al salir, rollback si hay error.
+
+    Args:
+        conn: Conexión psycopg2 ya abierta o None
+    """
+    if conn is not None:
+        yield conn
+        return
+
+    with stage('connect'):
+        pool = get_connection_pool()
+        conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        # Las conexiones caídas no vuelven al pool
+        pool.putconn(conn, close=bool(conn.closed))
+
+def get_pm25_state(value):
+    """Estado de calidad del aire para un promedio diario de PM2.5"""
+    if value <= 12: return 'Buena'
+    if value <= 35: return 'Regular'
+    if value <= 55: return 'Insalubre para grupos sensibles'
+    if value <= 150: return 'Insalubre'
+    if value <= 250: return 'Muy insalubre'
+    return 'Peligrosa'
+
+def get_pm10_state(value):
+    """Estado de calidad del aire para un promedio diario de PM10 (mismos umbrales que utils.js)"""
+    if value <= 40: return 'Buena'
+    if value <= 50: return 'Moderada'
+    if value <= 100: return 'Regular'
+    return 'Mala'
+
+STATE_FUNCTIONS = {'pm25': get_pm25_state, 'pm10': get_pm10_state}
+
+# Bandas OMS (rangos_pm25_oms.csv, getEstadoOMS de cron_predictions.js): etiqueta y límite
+# superior incluido; la última banda no tiene límite. Es la única definición de banda del
+# módulo: el acierto de banda de prediction_evaluator y las probabilidades de los
+# intervalos la leen a través de oms_bands
+OMS_BANDS = {'pm25': (('AQG', 15), ('IT-4', 25), ('IT-3', 37.5), ('IT-2', 50), ('IT-1', 75), ('>IT-1', np.inf))}
+
+def oms_bands(parametro):
+    """
+    Etiquetas y límites superiores (incluidos) de las bandas OMS de un contaminante
+
+    Returns:
+        tuple: (etiquetas, límites); el último límite es np.inf
+    """
+    labels, limits = zip(*OMS_BANDS[parametro])
+    return labels, np.asarray(limits, dtype=float)
+
+def air_quality_bands(parametro, values):
+    """
+    Banda OMS de cada valor (0 = 'AQG', 1 = 'IT-4'...) con los límites de OMS_BANDS
+
+    Args:
+        parametro (str): Contaminante con bandas en OMS_BANDS
+        values (array): Promedios diarios
+
+    Returns:
+        np.ndarray: Índice de banda por valor (-1 si es NaN)
+    """
+    values = np.asarray(values, dtype=float)
+    _, limits = oms_bands(parametro)
+    # side='left': un valor igual al límite cae en la banda inferior (límite incluido)
+    bands = np.searchsorted(limits[:-1], values, side='left')
+    return np.where(np.isnan(values), -1, bands)
+
+def band_probabilities(quantiles, levels, parametro=DEFAULT_PARAMETER):
+    """
+    Probabilidad de cada banda OMS (las mismas de air_quality_bands) a partir de unos
+    pocos cuantiles: distribución lineal a trozos que pasa por (cuantil, nivel) y sigue
+    en las colas con la pendiente del tramo vecino hasta llegar a 0 y a 1. La función de
+    distribución se evalúa en cada límite: P(valor <= límite), límite incluido
+
+    Args:
+        quantiles (np.ndarray): (n, k) cuantiles de cada predicción, crecientes, k >= 2
+        levels (sequence): Los k niveles (0.1, 0.5, 0.9...)
+        parametro (str): Contaminante con bandas en OMS_BANDS
+
+    Returns:
+        np.ndarray: (n, n_bandas) probabilidades en el orden de OMS_BANDS; cada fila suma 1
+    """
+    quantiles = np.asarray(quantiles, dtype=float)
+    levels = np.asarray(levels, dtype=float)
+    lower_slope = (quantiles[:, 1] - quantiles[:, 0]) / (levels[1] - levels[0])
+    upper_slope = (quantiles[:, -1] - quantiles[:, -2]) / (levels[-1] - levels[-2])
+    knots = np.column_stack([quantiles[:, 0] - levels[0] * lower_slope, quantiles,
+                             quantiles[:, -1] + (1 - levels[-1]) * upper_slope])
+    knot_levels = np.concatenate([[0.0], levels, [1.0]])
+    finite = oms_bands(parametro)[1][:-1]
+    cdf = np.array([np.interp(finite, row, knot_levels) for row in knots]).reshape(len(knots), len(finite))
+    return np.diff(np.hstack([np.zeros((len(knots), 1)), cdf, np.ones((len(knots), 1))]), axis=1)
+
+def interval_fields(quantiles, levels, parametro=DEFAULT_PARAMETER):
+    """
+    Campos de intervalo de cada día pronosticado: los cuantiles ('intervalo') y, si el
+    contaminante tiene OMS_BANDS, la probabilidad de cada banda ('probabilidades_oms')
+
+    Args:
+        quantiles (np.ndarray): (n, horizonte, k) predicciones de los modelos de cuantiles
+        levels (sequence): Niveles de esos modelos
+        parametro (str): Contaminante
+
+    Returns:
+        list: Por fecha, una lista (una entrada por horizonte) de dicts para build_prediction_result
+    """
+    n_dates, horizon, n_levels = quantiles.shape
+    # Los modelos se entrenan por separado y sus cuantiles pueden cruzarse: se reordenan
+    rows = np.sort(quantiles.reshape(-1, n_levels), axis=1)
+    names = [f"p{round(level * 100):02d}" for level in levels]
+    fields = [{"intervalo": {name: round(float(value), 2) for name, value in zip(names, row)}} for row in rows]
+    if parametro in OMS_BANDS and n_levels >= 2:
+        labels, _ = oms_bands(parametro)
+        for field, probabilities in zip(fields, band_probabilities(rows, levels, parametro)):
+            field["probabilidades_oms"] = {label: round(float(p), 3) for label, p in zip(labels, probabilities)}
+    return [fields[i * horizon:(i + 1) * horizon] for i in range(n_dates)]
+
+def get_air_quality_state(parametro, value):
+    """Estado para el contaminante, o None si no hay umbrales definidos para él"""
+    state_function = STATE_FUNCTIONS.get(parametro)
+    return state_function(value) if state_function else None
+
+# Agregación diaria en una sola consulta para cualquier número de fechas y de series
+# (estación, contaminante); las series se pasan como dos arrays paralelos.
+# Regla de relleno (la misma que el bucle horario original): una hora faltante vale la
+# media entre la hora anterior (ya rellenada) y el siguiente valor real; en los bordes se
+# propaga el valor más cercano y, sin ningún dato, 25.0. Dentro de un hueco esa recurrencia
+# equivale a: siguiente + (anterior_real - siguiente) * 0.5^(horas desde el anterior real).
+# valor::text::float8 reproduce el float que recibe Python al leer la columna REAL.
+# Cada día se lee como rango semiabierto [día, día + 1) y no con DATE(fecha) = día: así
+# Postgres recorre el índice (estacion_id, parametro, fecha) en lugar de toda la tabla.
+# Ambas formas usan la zona horaria de la sesión y seleccionan las mismas filas. La cota
+# [primer_dia, ultimo_dia + 1) es redundante, pero es constante: el planificador estima
+# con ella las filas por el histograma de fecha y no elige un Seq Scan en tablas pequeñas.
+DAILY_AGGREGATION_SQL = """
+WITH series (estacion_id, parametro) AS (
+    SELECT * FROM unnest(%(series_estaciones)s::varchar[], %(series_parametros)s::varchar[])
+),
+horarias AS (
+    SELECT DISTINCT ON (m.estacion_id, m.parametro, d.dia, EXTRACT(HOUR FROM m.fecha))
+        m.estacion_id,
+        m.parametro,
+        d.dia,
+        EXTRACT(HOUR FROM m.fecha)::int AS hora,
+        m.valor::text::float8 AS valor,
+        COUNT(*) OVER (PARTITION BY m.estacion_id, m.parametro, d.dia) AS registros
+    FROM series s
+    CROSS JOIN unnest(%(fechas)s::date[]) AS d(dia)
+    JOIN mediciones_api m ON m.estacion_id = s.estacion_id AND m.parametro = s.parametro
+        AND m.fecha >= d.dia AND m.fecha < d.dia + 1
+    WHERE m.valor IS NOT NULL
+        AND m.fecha >= %(primer_dia)s::date AND m.fecha < %(ultimo_dia)s::date + 1
+    ORDER BY m.estacion_id, m.parametro, d.dia, EXTRACT(HOUR FROM m.fecha), m.fecha ASC
+),
+rejilla AS (
+    SELECT d.estacion_id, d.parametro, d.dia, d.registros, h.hora, x.valor
+    FROM (SELECT DISTINCT estacion_id, parametro, dia, registros FROM horarias) d
+    CROSS JOIN generate_series(0, 23) AS h(hora)
+    LEFT JOIN horarias x
+        ON x.estacion_id = d.estacion_id AND x.parametro = d.parametro AND x.dia = d.dia AND x.hora = h.hora
+),
+vecinos AS (
+    SELECT
+        estacion_id, parametro, dia, registros, hora, valor,
+        MAX(CASE WHEN valor IS NOT NULL THEN hora END) OVER (
+            PARTITION BY estacion_id, parametro, dia ORDER BY hora
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) AS hora_anterior,
+        MIN(CASE WHEN valor IS NOT NULL THEN hora END) OVER (
+            PARTITION BY estacion_id, parametro, dia ORDER BY hora
+            ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+        ) AS hora_siguiente
+    FROM rejilla
+),
+rellenas AS (
+    SELECT
+        v.estacion_id, v.parametro, v.dia, v.registros,
+        v.valor IS NULL AS interpolada,
+        CASE
+            WHEN v.valor IS NOT NULL THEN v.valor
+            WHEN a.valor IS NOT NULL AND s.valor IS NOT NULL
+                THEN s.valor + (a.valor - s.valor) * power(0.5, v.hora - v.hora_anterior)
+            WHEN a.valor IS NOT NULL THEN a.valor
+            WHEN s.valor IS NOT NULL THEN s.valor
+            ELSE %(valor_defecto)s
+        END AS valor
+    FROM vecinos v
+    LEFT JOIN horarias a ON a.estacion_id = v.estacion_id AND a.parametro = v.parametro
+        AND a.dia = v.dia AND a.hora = v.hora_anterior
+    LEFT JOIN horarias s ON s.estacion_id = v.estacion_id AND s.parametro = v.parametro
+        AND s.dia = v.dia AND s.hora = v.hora_siguiente
+)
+SELECT
+    estacion_id,
+    parametro,
+    dia,
+    AVG(valor) AS promedio,
+    COUNT(*) FILTER (WHERE interpolada) AS horas_interpoladas,
+    MAX(registros) AS registros
+FROM rellenas
+GROUP BY estacion_id, parametro, dia
+ORDER BY estacion_id, parametro, dia
+"""
+
+# Filas horarias en bruto para el motor NumPy (misma selección que la consulta anterior)
+HOURLY_ROWS_SQL = """
+SELECT m.estacion_id, m.parametro, d.dia, EXTRACT(HOUR FROM m.fecha)::int AS hora, m.valor
+FROM unnest(%(series_estaciones)s::varchar[], %(series_parametros)s::varchar[]) AS s(estacion_id, parametro)
+CROSS JOIN unnest(%(fechas)s::date[]) AS d(dia)
+JOIN mediciones_api m ON m.estacion_id = s.estacion_id AND m.parametro = s.parametro
+    AND m.fecha >= d.dia AND m.fecha < d.dia + 1
+WHERE m.valor IS NOT NULL
+    AND m.fecha >= %(primer_dia)s::date AND m.fecha < %(ultimo_dia)s::date + 1
+ORDER BY m.estacion_id, m.parametro, m.fecha ASC
+"""
+
+DEFAULT_HOURLY_VALUE = 25.0  # Valor por defecto si no hay ninguna hora de referencia
+AGGREGATION_ENGINE = os.getenv('AGGREGATION_ENGINE', 'sql')  # 'sql' o 'numpy'
+
+def fill_hourly_gaps(hourly_values):
+    """
+    Rellena las horas faltantes de muchos días a la vez (motor NumPy).
+    Recorre las 24 horas una vez, vectorizando sobre los días, con la misma
+    recurrencia que el bucle original: media entre la hora anterior ya rellenada y
+    el siguiente valor real; en los bordes, el valor más cercano; si no, 25.0.
+
+    Args:
+        hourly_values (np.ndarray): Matriz (n_dias, 24) con NaN en las horas sin dato
+
+    Returns:
+        tuple: (matriz rellenada, máscara booleana de horas interpoladas)
+    """
+    n_days = hourly_values.shape[0]
+    missing = np.isnan(hourly_values)
+
+    # Siguiente hora con valor real (24 = ninguna) y su valor
+    hour_index = np.where(missing, 24, np.arange(24))
+    next_index = np.minimum.accumulate(hour_index[:, ::-1], axis=1)[:, ::-1]
+    padded = np.concatenate([hourly_values, np.full((n_days, 1), np.nan)], axis=1)
+    next_values = np.take_along_axis(padded, next_index, axis=1)
+
+    filled = hourly_values.copy()
+    prev_values = np.full(n_days, np.nan)
+    for hour in range(24):
+        prev_ok = ~np.isnan(prev_values)
+        next_ok = ~np.isnan(next_values[:, hour])
+        interpolated = np.select(
+            [prev_ok & next_ok, prev_ok, next_ok],
+            [(prev_values + next_values[:, hour]) / 2, prev_values, next_values[:, hour]],
+            default=DEFAULT_HOURLY_VALUE
+        )
+        filled[:, hour] = np.where(missing[:, hour], interpolated, hourly_values[:, hour])
+        prev_values = filled[:, hour]
+
+    return filled, missing
+
+def hourly_grid_means(hourly_values):
+    """
+    Promedio diario de una rejilla (días, 24) con NaN en las horas sin dato, con el
+    mismo relleno y el mismo orden de suma que DAILY_AGGREGATION_SQL
+
+    Returns:
+        tuple: (promedios (días,), horas interpoladas de cada día (días,))
+    """
+    filled, interpolated = fill_hourly_gaps(hourly_values)
+    # Suma hora a hora, en el mismo orden que el cálculo original
+    total = np.zeros(len(filled))
+    for hour in range(24):
+        total = total + filled[:, hour]
+    return total / 24, interpolated.sum(axis=1)
+
+def _series_params(series):
+    """Parámetros SQL de una lista de series (estacion_id, parametro)"""
+    return {
+        'series_estaciones': [str(estacion_id) for estacion_id, _ in series],
+        'series_parametros': [str(parametro) for _, parametro in series],
+    }
+
+def _date_params(dates):
+    """Parámetros SQL de una lista de días YYYY-MM-DD: los días y su primer y último día"""
+    dates = [str(day) for day in dates]
+    return {'fechas': dates, 'primer_dia': min(dates, default=None), 'ultimo_dia': max(dates, default=None)}
+
+def _aggregate_daily_numpy(cursor, dates, series):
+    """Motor NumPy: una consulta de filas horarias y relleno vectorizado"""
+    cursor.execute(HOURLY_ROWS_SQL, {**_date_params(dates), **_series_params(series)})
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+
+    # Las filas vienen ordenadas por serie: cada serie es un bloque contiguo
+    keys = [(row[0], row[1]) for row in rows]
+    boundaries = [0] + [i for i in range(1, len(keys)) if keys[i] != keys[i - 1]] + [len(keys)]
+
+    result = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        block = rows[start:end]
+        days = np.array([row[2] for row in block], dtype='datetime64[D]')
+        hours = np.array([row[3] for row in block], dtype=int)
+        values = np.array([row[4] for row in block], dtype=float)
+
+        unique_days, day_index, registros = np.unique(days, return_inverse=True, return_counts=True)
+        # Primer registro de cada hora (las filas vienen ordenadas por fecha)
+        _, first_rows = np.unique(day_index * 24 + hours, return_index=True)
+
+        hourly_values = np.full((len(unique_days), 24), np.nan)
+        hourly_values[day_index[first_rows], hours[first_rows]] = values[first_rows]
+
+        means, interpolated = hourly_grid_means(hourly_values)
+
+        estacion_id, parametro = keys[start]
+        result.extend(
+            (estacion_id, parametro, day.astype(object), float(means[i]),
+             int(interpolated[i]), int(registros[i]))
+            for i, day in enumerate(unique_days)
+        )
+    return result
+
+def aggregate_daily_series(series, dates, conn=None, engine=None):
+    """
+    Motor de agregación diaria: promedio, horas interpoladas y estado de muchas
+    fechas y muchas series (estación, contaminante) con una sola consulta a mediciones_api
+
+    Args:
+        series (iterable): Tuplas (estacion_id, parametro)
+        dates (iterable): Fechas en formato YYYY-MM-DD
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        engine (str): 'sql' (Postgres) o 'numpy'; por defecto AGGREGATION_ENGINE
+
+    Returns:
+        dict: {(estacion_id, parametro): {'YYYY-MM-DD': {'valor', 'horas_interpoladas',
+              'registros', 'estado'}}}. Las fechas sin ningún dato horario no aparecen.
+    """
+    series = list(dict.fromkeys((str(e), str(p)) for e, p in series))
+    dates = sorted({str(day) for day in as_days(list(dates))})
+    averages = {key: {} for key in series}
+    if not dates or not series:
+        return averages
+
+    engine = engine or AGGREGATION_ENGINE
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        if engine == 'numpy':
+            rows = _aggregate_daily_numpy(cursor, dates, series)
+        elif engine == 'sql':
+            cursor.execute(DAILY_AGGREGATION_SQL, {**_date_params(dates), 'valor_defecto': DEFAULT_HOURLY_VALUE,
+                                                   **_series_params(series)})
+            rows = cursor.fetchall()
+        else:
+            raise ValueError(f"Motor de agregación desconocido: {engine}")
+        cursor.close()
+
+    for estacion_id, parametro, day, promedio, horas_interpoladas, registros in rows:
+        valor = round(float(promedio), 2)
+        averages[(estacion_id, parametro)][day.strftime('%Y-%m-%d')] = {
+            'valor': valor,
+            'horas_interpoladas': int(horas_interpoladas),
+            'registros': int(registros),
+            'estado': get_air_quality_state(parametro, valor)
+        }
+    return averages
+
+def aggregate_daily_averages(dates, conn=None, engine=None,
+                             estacion_id=DEFAULT_STATION, parametro=DEFAULT_PARAMETER):
+    """
+    aggregate_daily_series para una sola serie
+
+    Returns:
+        dict: {'YYYY-MM-DD': {'valor', 'horas_interpoladas', 'registros', 'estado'}}
+    """
+    series = (str(estacion_id), str(parametro))
+    return aggregate_daily_series([series], dates, conn=conn, engine=engine)[series]
+
+def calculate_daily_average_from_hourly(target_date, conn=None,
+                                        estacion_id=DEFAULT_STATION, parametro=DEFAULT_PARAMETER):
     """
     Calcula el promedio diario de PM2.5 desde datos horarios en mediciones_api
     
     Args:
         target_date (str): Fecha en formato YYYY-MM-DD
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        estacion_id (str): Estación de mediciones_api
+        parametro (str): Contaminante
         
     Returns:
         float: Promedio diario de PM2.5 o None si no hay datos
     """
-    conn = get_db_connection()
-    try:
-        print(f"🔄 Calculando promedio diario para {target_date} desde mediciones_api...")
-        
-        # Obtener datos horarios del día
-        query = """
-        SELECT 
-            EXTRACT(HOUR FROM fecha) as hora,
-            valor
-        FROM mediciones_api 
-        WHERE DATE(fecha) = %s 
-          AND estacion_id = '6699'
-          AND parametro = 'pm25'
-          AND valor IS NOT NULL
-        ORDER BY fecha ASC
-        """
-        
-        result = pd.read_sql_query(query, conn, params=[target_date])
-        
-        if len(result) == 0:
-            print(f"⚠️ No hay datos horarios para {target_date}")
-            return None
-        
-        print(f"📊 Encontrados {len(result)} registros horarios")
-        
-        # Si faltan horas, interpolar
-        hourly_data = []
-        for hour in range(24):
-            hour_data = result[result['hora'] == hour]
-            if len(hour_data) > 0:
-                hourly_data.append({
-                    'hora': hour,
-                    'valor': float(hour_data.iloc[0]['valor']),
-                    'interpolated': False
-                })
-        
-        # Interpolar horas faltantes
-        if len(hourly_data) < 24:
-            print(f"🔧 Interpolando {24 - len(hourly_data)} horas faltantes...")
-            
-            for hour in range(24):
-                if not any(h['hora'] == hour for h in hourly_data):
-                    # Buscar valores anterior y siguiente para interpolar
-                    prev_val = None
-                    next_val = None
-                    
-                    # Valor anterior
-                    for h in reversed(range(hour)):
-                        prev_data = [d for d in hourly_data if d['hora'] == h]
-                        if prev_data:
-                            prev_val = prev_data[0]['valor']
-                            break
-                    
-                    # Valor siguiente
-                    for h in range(hour + 1, 24):
-                        next_data = [d for d in hourly_data if d['hora'] == h]
-                        if next_data:
-                            next_val = next_data[0]['valor']
-                            break
-                    
-                    # Interpolar
-                    if prev_val is not None and next_val is not None:
-                        interpolated_val = (prev_val + next_val) / 2
-                    elif prev_val is not None:
-                        interpolated_val = prev_val
-                    elif next_val is not None:
-                        interpolated_val = next_val
-                    else:
-                        interpolated_val = 25.0  # Valor por defecto
-                    
-                    hourly_data.append({
-                        'hora': hour,
-                        'valor': interpolated_val,
-                        'interpolated': True
-                    })
-        
-        # Ordenar por hora
-        hourly_data.sort(key=lambda x: x['hora'])
-        
-        # Calcular promedio
-        total_valor = sum(d['valor'] for d in hourly_data)
-        promedio = total_valor / len(hourly_data)
-        
-        interpolated_count = sum(1 for d in hourly_data if d.get('interpolated', False))
-        print(f"📈 Promedio calculado: {promedio:.2f} µg/m³ ({interpolated_count} horas interpoladas)")
-        
-        return round(promedio, 2)
-        
-    finally:
-        conn.close()
+    print(f"🔄 Calculando promedio diario para {target_date} desde mediciones_api...")
+
+    daily = aggregate_daily_averages([target_date], conn=conn, estacion_id=estacion_id,
+                                     parametro=parametro).get(target_date)
+    if daily is None:
+        print(f"⚠️ No hay datos horarios para {target_date}")
+        return None
+
+    print(f"📊 Encontrados {daily['registros']} registros horarios")
+    if daily['horas_interpoladas']:
+        print(f"🔧 Interpolando {daily['horas_interpoladas']} horas faltantes...")
+    print(f"📈 Promedio calculado: {daily['valor']:.2f} µg/m³ ({daily['horas_interpoladas']} horas interpoladas)")
+
+    return daily['valor']
+
+# Escritura en bloque de promedios diarios con una sola sentencia por lote.
+# La clave única de la tabla es (fecha, parametro, source): igual que el UPDATE original,
+# primero se actualiza la fila existente de esa fecha sea cual sea su fuente, y las fechas
+# sin fila se insertan con ON CONFLICT para que dos crons simultáneos no choquen.
+# (xmax = 0) distingue las filas realmente insertadas de las que resolvió el ON CONFLICT.
+UPSERT_DAILY_AVERAGES_SQL = """
+WITH datos (fecha, parametro, valor, estado) AS (VALUES %s),
+actualizados AS (
+    UPDATE promedios_diarios p
+    SET valor = d.valor, estado = d.estado, source = 'mediciones_api', updated_at = CURRENT_TIMESTAMP
+    FROM datos d
+    WHERE p.fecha = d.fecha AND p.parametro = d.parametro
+    RETURNING p.fecha, p.parametro
+),
+insertados AS (
+    INSERT INTO promedios_diarios (fecha, parametro, valor, estado, source, detalles)
+    SELECT d.fecha, d.parametro, d.valor, d.estado, 'mediciones_api', 'Promedio calculado desde datos horarios'
+    FROM datos d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM actualizados a WHERE a.fecha = d.fecha AND a.parametro = d.parametro
+    )
+    ON CONFLICT (fecha, parametro, source) DO UPDATE
+    SET valor = EXCLUDED.valor, estado = EXCLUDED.estado, updated_at = CURRENT_TIMESTAMP
+    RETURNING (xmax = 0) AS nuevo
+)
+SELECT
+    (SELECT COUNT(*) FILTER (WHERE nuevo) FROM insertados) AS insertados,
+    (SELECT COUNT(*) FROM actualizados) + (SELECT COUNT(*) FILTER (WHERE NOT nuevo) FROM insertados) AS actualizados
+"""
+
+def write_daily_averages(rows, conn=None, parametro=DEFAULT_PARAMETER, page_size=1000):
+    """
+    Inserta o actualiza muchos promedios diarios en promedios_diarios de una vez
+
+    Args:
+        rows (iterable): Tuplas (fecha, valor, estado)
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        parametro (str): Contaminante de los promedios
+        page_size (int): Filas por sentencia
 
-def update_daily_average_in_db(date, average_value):
+    Returns:
+        dict: {'insertados': n, 'actualizados': m}
+    """
+    # Una fecha solo puede aparecer una vez por sentencia (ON CONFLICT no toca dos veces la misma fila)
+    unique_rows = {str(fecha): (str(fecha), parametro, valor, estado) for fecha, valor, estado in rows}
+    counts = {'insertados': 0, 'actualizados': 0}
+    if not unique_rows:
+        return counts
+
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        results = execute_values(
+            cursor, UPSERT_DAILY_AVERAGES_SQL, list(unique_rows.values()),
+            template="(%s::date, %s::varchar, %s::real, %s::text)",
+            page_size=page_size, fetch=True
+        )
+        cursor.close()
+
+    for insertados, actualizados in results:
+        counts['insertados'] += insertados
+        counts['actualizados'] += actualizados
+    return counts
+
+def update_daily_average_in_db(date, average_value, conn=None, parametro=DEFAULT_PARAMETER):
     """
     Actualiza o inserta el promedio diario en promedios_diarios
     
     Args:
         date (str): Fecha en formato YYYY-MM-DD
         average_value (float): Valor promedio de PM2.5
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        parametro (str): Contaminante
     """
-    conn = get_db_connection()
-    try:
-        print(f"💾 Actualizando promedio diario en BD: {date} = {average_value} µg/m³")
-        
-        # Función para determinar estado según OMS
-        def get_pm25_state(value):
-            if value <= 12: return 'Buena'
-            if value <= 35: return 'Regular'
-            if value <= 55: return 'Insalubre para grupos sensibles'
-            if value <= 150: return 'Insalubre'
-            if value <= 250: return 'Muy insalubre'
-            return 'Peligrosa'
-        
-        estado = get_pm25_state(average_value)
-        
-        # Verificar si ya existe
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id FROM promedios_diarios WHERE fecha = %s AND parametro = 'pm25'",
-            (date,)
+    print(f"💾 Actualizando promedio diario en BD: {date} = {average_value} µg/m³")
+
+    # Estado según OMS
+    estado = get_air_quality_state(parametro, average_value)
+
+    counts = write_daily_averages([(date, average_value, estado)], conn=conn, parametro=parametro)
+    if counts['actualizados']:
+        print("✅ Registro actualizado")
+    else:
+        print("✅ Nuevo registro insertado")
+
+def rebuild_daily_averages(date_from, date_to, conn=None, parametro=DEFAULT_PARAMETER):
+    """
+    Recalcula promedios_diarios desde mediciones_api para un rango de fechas:
+    una consulta de agregación y una escritura en bloque
+
+    Args:
+        date_from (str): Primera fecha (YYYY-MM-DD)
+        date_to (str): Última fecha (YYYY-MM-DD), incluida
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        parametro (str): Contaminante (de la estación DEFAULT_STATION)
+
+    Returns:
+        dict: {'insertados': n, 'actualizados': m, 'sin_datos': k}
+    """
+    dates = [str(day) for day in np.arange(np.datetime64(date_from, 'D'), np.datetime64(date_to, 'D') + 1)]
+    with connection_scope(conn) as conn:
+        daily = aggregate_daily_averages(dates, conn=conn, parametro=parametro)
+        counts = write_daily_averages(
+            [(fecha, d['valor'], d['estado']) for fecha, d in daily.items()], conn=conn, parametro=parametro
         )
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Actualizar existente
-            cursor.execute("""
-                UPDATE promedios_diarios 
-                SET valor = %s, estado = %s, source = 'mediciones_api', updated_at = CURRENT_TIMESTAMP
-                WHERE fecha = %s AND parametro = 'pm25'
-            """, (average_value, estado, date))
-            print("✅ Registro actualizado")
-        else:
-            # Insertar nuevo
-            cursor.execute("""
-                INSERT INTO promedios_diarios (fecha, parametro, valor, estado, source, detalles)
-                VALUES (%s, 'pm25', %s, %s, 'mediciones_api', 'Promedio calculado desde datos horarios')
-            """, (date, average_value, estado))
-            print("✅ Nuevo registro insertado")
-        
-        conn.commit()
-        cursor.close()
-        
-    finally:
-        conn.close()
+    counts['sin_datos'] = len(dates) - len(daily)
+    print(f"💾 Promedios {date_from} → {date_to}: {counts['insertados']} insertados, "
+          f"{counts['actualizados']} actualizados, {counts['sin_datos']} días sin datos horarios")
+    return counts
 
-def ensure_daily_data_updated(target_date):
+def ensure_daily_data_updated(target_date, conn=None, parametro=DEFAULT_PARAMETER):
     """
     Asegura que los datos diarios estén actualizados hasta el día anterior al target_date
     
     Args:
         target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        parametro (str): Contaminante (de la estación DEFAULT_STATION)
     """
-    target_dt = pd.to_datetime(target_date)
-    yesterday = (target_dt - timedelta(days=1)).strftime('%Y-%m-%d')
+    yesterday = str(np.datetime64(target_date, 'D') - 1)
     
     print(f"🔍 Verificando datos diarios hasta {yesterday}...")
     
     # Verificar si el día anterior está en promedios_diarios
-    conn = get_db_connection()
-    try:
+    with connection_scope(conn) as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT valor FROM promedios_diarios WHERE fecha = %s AND parametro = 'pm25'",
-            (yesterday,)
+            "SELECT valor FROM promedios_diarios WHERE fecha = %s AND parametro = %s",
+            (yesterday, parametro)
         )
         existing = cursor.fetchone()
         cursor.close()
@@ -227,217 +680,1469 @@ def ensure_daily_data_updated(target_date):
             print(f"❌ Faltan datos para {yesterday}, calculando desde mediciones_api...")
             
             # Calcular promedio del día anterior
-            daily_avg = calculate_daily_average_from_hourly(yesterday)
+            daily_avg = calculate_daily_average_from_hourly(yesterday, conn=conn, parametro=parametro)
             
             if daily_avg is not None:
                 # Insertar en promedios_diarios
-                update_daily_average_in_db(yesterday, daily_avg)
+                update_daily_average_in_db(yesterday, daily_avg, conn=conn, parametro=parametro)
                 print(f"✅ Datos para {yesterday} calculados e insertados: {daily_avg} µg/m³")
             else:
                 print(f"⚠️ No se pudieron calcular datos para {yesterday}")
-                
-    finally:
-        conn.close()
 
-def load_historical_data(target_date):
+# Histórico mínimo para las variables: los MIN_REQUIRED_DAYS días naturales anteriores a la
+# fecha (lag28) más la última fila previa, que ancla la interpolación si faltan los primeros
+# días de la ventana; 'trend' se cuenta desde features.TREND_ORIGIN. Coste constante
+# aunque la estación envejezca.
+BOUNDED_HISTORY_SQL = """
+SELECT fecha, valor FROM promedios_diarios
+WHERE parametro = %(parametro)s AND fecha >= %(desde)s AND fecha < %(target)s
+UNION ALL
+(SELECT fecha, valor FROM promedios_diarios
+ WHERE parametro = %(parametro)s AND fecha < %(desde)s
+ ORDER BY fecha DESC LIMIT 1)
+ORDER BY fecha ASC
+"""
+
+# Modo de carga del histórico: 'acotado' (últimos 28 días), 'cache' (serie completa con
+# caché local incremental) o 'completo' (consulta original sin límite inferior)
+HISTORY_MODE = os.getenv('HISTORY_MODE', 'acotado')
+HISTORY_CACHE_DIR = Path(os.getenv('HISTORY_CACHE_DIR', Path(__file__).parent / '.cache'))
+# updated_at = CURRENT_TIMESTAMP es el inicio de la transacción, no su commit: una escritura
+# que empezó antes de sincronizar y confirmó después queda por debajo de la marca de agua.
+# Cada sincronización vuelve a pedir las filas de este margen anterior a la marca
+HISTORY_CACHE_MARGIN = timedelta(minutes=10)
+
+def _history_cache_paths(parametro=DEFAULT_PARAMETER):
+    base = HISTORY_CACHE_DIR / f"historico_{parametro}"
+    return {
+        'fechas': base.with_name(base.name + "_fechas.npy"),
+        'valores': base.with_name(base.name + "_valores.npy"),
+        'meta': base.with_name(base.name + "_meta.json")
+    }
+
+def _save_npy_atomic(path, array):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def _history_rows(cursor, parametro, high_water_mark=None):
+    """
+    Filas (fecha, valor, updated_at) de promedios_diarios, todas o las escritas desde la
+    marca de agua, en arrays con una fila por fecha: si una fecha está repetida vale la
+    última escrita
+
+    Returns:
+        tuple: (fechas datetime64[D], valores float64, último updated_at o None, filas recibidas)
+    """
+    # updated_at dentro de cada fecha: la última fila de cada fecha es la más reciente
+    # (mismo orden que HISTORY_CHECKSUM_SQL)
+    order = "ORDER BY fecha, updated_at NULLS FIRST, id"
+    if high_water_mark is None:
+        cursor.execute(f"SELECT fecha, valor, updated_at FROM promedios_diarios WHERE parametro = %s {order}",
+                       (parametro,))
+    else:
+        # Desde la marca menos HISTORY_CACHE_MARGIN: ver HISTORY_CACHE_MARGIN
+        since = datetime.fromisoformat(high_water_mark) - HISTORY_CACHE_MARGIN
+        cursor.execute("SELECT fecha, valor, updated_at FROM promedios_diarios "
+                       f"WHERE parametro = %s AND updated_at >= %s {order}", (parametro, since))
+    rows = cursor.fetchall()
+    fechas = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    valores = np.array([np.nan if row[1] is None else row[1] for row in rows], dtype=float)
+    last = np.append(fechas[1:] != fechas[:-1], True) if len(rows) else np.zeros(0, dtype=bool)
+    timestamps = [row[2] for row in rows if row[2] is not None]
+    return fechas[last], valores[last], max(timestamps) if timestamps else None, len(rows)
+
+# Número de días y suma de sus valores (la fila vigente de cada fecha, como _history_rows),
+# para comprobar la caché sin traer la serie
+HISTORY_CHECKSUM_SQL = """
+SELECT COUNT(*), COALESCE(SUM(valor::float8), 0)
+FROM (
+    SELECT DISTINCT ON (fecha) valor
+    FROM promedios_diarios
+    WHERE parametro = %s
+    ORDER BY fecha, updated_at DESC NULLS LAST, id DESC
+) vigentes
+"""
+
+def sync_history_cache(conn, parametro=DEFAULT_PARAMETER):
     """
-    Carga datos históricos de promedios_diarios hasta la fecha objetivo
+    Sincroniza la caché local de promedios_diarios (un .npy de fechas y otro de valores,
+    uno por día) trayendo solo las filas con updated_at >= la marca de agua guardada menos
+    HISTORY_CACHE_MARGIN. Si después el número de días o la suma de los valores no
+    coinciden con los de la tabla (días borrados, filas sin updated_at o confirmadas por
+    debajo de la marca), la caché se rehace entera
+
+    Args:
+        conn: Conexión a BD abierta
+        parametro (str): Contaminante de la serie
+
+    Returns:
+        tuple: (fechas datetime64[D], valores float64) ordenados por fecha
+    """
+    paths = _history_cache_paths(parametro)
+    fechas = np.array([], dtype='datetime64[D]')
+    valores = np.array([], dtype=float)
+    high_water_mark = None
+
+    if all(path.exists() for path in paths.values()):
+        with open(paths['meta']) as f:
+            high_water_mark = json.load(f).get('updated_at')
+        fechas = np.load(paths['fechas'], mmap_mode='r')
+        valores = np.load(paths['valores'], mmap_mode='r')
+
+    cursor = conn.cursor()
+    new_fechas, new_valores, last_update, n_rows = _history_rows(cursor, parametro, high_water_mark)
+    if high_water_mark is None:
+        fechas, valores = new_fechas, new_valores
+    elif n_rows:
+        # Fusionar: las filas recibidas sustituyen a las de la caché con la misma fecha
+        keep = ~np.isin(fechas, new_fechas)
+        fechas = np.concatenate([fechas[keep], new_fechas])
+        valores = np.concatenate([valores[keep], new_valores])
+        order = np.argsort(fechas, kind='stable')
+        fechas, valores = fechas[order], valores[order]
+
+    cursor.execute(HISTORY_CHECKSUM_SQL, (parametro,))
+    n_dates, total = cursor.fetchone()
+    # Los valores son REAL: se suman como float4 ampliado a float8, igual que en la BD
+    cached_total = float(np.nansum(np.asarray(valores, dtype=np.float32).astype(np.float64)))
+    resynced = high_water_mark is not None and (n_dates != len(fechas)
+                                                or not np.isclose(cached_total, total, rtol=1e-9, atol=0))
+    if resynced:
+        print(f"🔁 Caché de histórico desalineada ({len(fechas)} días y suma {cached_total:.3f} frente a "
+              f"{n_dates} y {total:.3f} en la BD): se rehace")
+        fechas, valores, last_update, n_rows = _history_rows(cursor, parametro)
+    cursor.close()
+    print(f"🗄️ Caché de histórico: {len(fechas)} días, {n_rows} filas nuevas o actualizadas")
+
+    if not n_rows and not resynced:
+        return fechas, valores
+
+    HISTORY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    _save_npy_atomic(paths['fechas'], fechas)
+    _save_npy_atomic(paths['valores'], valores)
+    with open(paths['meta'], 'w') as f:
+        json.dump({'updated_at': last_update.isoformat() if last_update else high_water_mark,
+                   'dias': int(len(fechas))}, f)
+
+    return fechas, valores
+
+def load_history_arrays(target_date, conn=None, mode=None,
+                        estacion_id=DEFAULT_STATION, parametro=DEFAULT_PARAMETER, ensure_daily=True):
+    """
+    Carga datos históricos de promedios_diarios hasta la fecha objetivo como arrays NumPy,
+    sin pasar por pandas: es la ruta del modo de una fecha.
     Primero asegura que los datos diarios estén actualizados
-    
+
     Args:
         target_date (str): Fecha objetivo en formato YYYY-MM-DD
-        
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        mode (str): 'acotado', 'cache' o 'completo'; por defecto HISTORY_MODE
+        estacion_id (str): Estación; las distintas de DEFAULT_STATION no están en
+                           promedios_diarios y se agregan al vuelo (load_series_histories)
+        parametro (str): Contaminante
+        ensure_daily (bool): Comprobar antes el promedio del día anterior (el modo
+                             asíncrono lo busca en el propio histórico)
+
     Returns:
-        pd.DataFrame: DataFrame con columnas ['fecha', 'valor'] ordenado por fecha
+        tuple: (fechas datetime64[D], valores float64) ordenados por fecha. Puede tener
+               huecos: history_windows los rellena. En modo 'acotado' solo contiene los
+               28 días anteriores y la última fila previa.
     """
+    mode = mode or HISTORY_MODE
+    if str(estacion_id) != DEFAULT_STATION:
+        df = load_historical_data(target_date, conn=conn, estacion_id=estacion_id, parametro=parametro)
+        return df.index.values.astype('datetime64[D]'), df.iloc[:, 0].to_numpy(dtype=float)
+
     # PASO 1: Asegurar que los datos diarios estén actualizados
-    ensure_daily_data_updated(target_date)
+    if ensure_daily:
+        with stage('ensure_daily'):
+            ensure_daily_data_updated(target_date, conn=conn, parametro=parametro)
     
     # PASO 2: Cargar datos históricos
-    conn = get_db_connection()
-    try:
-        query = """
-        SELECT fecha, valor
-        FROM promedios_diarios 
-        WHERE parametro = 'pm25' 
-          AND fecha < %s
-        ORDER BY fecha ASC
-        """
-        
-        df = pd.read_sql_query(query, conn, params=[target_date])
-        
-        if len(df) < MIN_REQUIRED_DAYS:
-            raise ValueError(f"Insuficientes datos históricos: {len(df)} días (mínimo: {MIN_REQUIRED_DAYS})")
-        
-        # Convertir fecha a datetime y establecer como índice
-        df['fecha'] = pd.to_datetime(df['fecha'])
-        df = df.set_index('fecha').sort_index()
-        
-        # Renombrar columna para consistencia con el código de entrenamiento
-        df = df.rename(columns={'valor': 'pm25'})
-        
-        print(f"✅ Cargados {len(df)} días de datos históricos hasta {target_date}")
-        return df
+    with connection_scope(conn) as conn, stage('load_history'):
+        if mode in ('completo', 'acotado'):
+            cursor = conn.cursor()
+            if mode == 'completo':
+                cursor.execute("""
+                SELECT fecha, valor
+                FROM promedios_diarios 
+                WHERE parametro = %s 
+                  AND fecha < %s
+                ORDER BY fecha ASC
+                """, (parametro, target_date))
+            else:
+                cursor.execute(BOUNDED_HISTORY_SQL, {'target': target_date, 'desde': window_start(target_date),
+                                                     'parametro': parametro})
+            rows = cursor.fetchall()
+            cursor.close()
+            fechas = np.array([row[0] for row in rows], dtype='datetime64[D]')
+            valores = np.array([np.nan if row[1] is None else row[1] for row in rows], dtype=float)
+            fetched_rows = len(rows)
+        elif mode == 'cache':
+            fechas, valores = sync_history_cache(conn, parametro)
+            n_rows = np.searchsorted(fechas, np.datetime64(target_date, 'D'), side='left')
+            fechas, valores = fechas[:n_rows], valores[:n_rows]
+            fetched_rows = None
+        else:
+            raise ValueError(f"Modo de histórico desconocido: {mode}")
+
+    if len(fechas) == 0:
+        raise ValueError(f"Sin datos históricos anteriores a {target_date}")
+    order = np.argsort(fechas, kind='stable')
+    
+    transfer = f", {fetched_rows} filas transferidas" if fetched_rows is not None else ""
+    print(f"✅ Cargados {len(fechas)} días de datos históricos hasta {target_date} (modo {mode}{transfer})")
+    return fechas[order], valores[order]
+
+def load_historical_data(target_date, conn=None, mode=None,
+                         estacion_id=DEFAULT_STATION, parametro=DEFAULT_PARAMETER, ensure_daily=True):
+    """
+    load_history_arrays como DataFrame, para los llamadores que trabajan con pandas
+    
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        mode (str): 'acotado', 'cache' o 'completo'; por defecto HISTORY_MODE
+        estacion_id (str): Estación; las distintas de DEFAULT_STATION no están en
+                           promedios_diarios y se agregan al vuelo (load_series_histories)
+        parametro (str): Contaminante
+        ensure_daily (bool): Comprobar antes el promedio del día anterior
         
-    finally:
-        conn.close()
+    Returns:
+        pd.DataFrame: DataFrame con índice fecha y una columna con el nombre del
+                      contaminante ('pm25', ...) ordenado por fecha
+    """
+    import pandas as pd  # Solo los llamadores que trabajan con DataFrames lo necesitan
+
+    if str(estacion_id) != DEFAULT_STATION:
+        series = (str(estacion_id), str(parametro))
+        with stage('load_history'):
+            return load_series_histories(target_date, [series], conn=conn)[series]
+
+    fechas, valores = load_history_arrays(target_date, conn=conn, mode=mode, parametro=parametro,
+                                          ensure_daily=ensure_daily)
+    # Mismo nombre de columna que el código de entrenamiento
+    return pd.DataFrame({parametro: valores}, index=pd.DatetimeIndex(fechas, name='fecha'))
 
 def generate_features(df, target_date):
     """
-    Genera las 33 variables del modelo LightGBM solo para la fecha más reciente
-    Optimizado para calcular únicamente las variables necesarias
+    Genera las 33 variables del modelo LightGBM solo para la fecha objetivo
+    (features.features_from_windows sobre los 28 días anteriores, huecos rellenados)
     
     Args:
-        df (pd.DataFrame): DataFrame con datos históricos
-        target_date (str): Fecha objetivo para calcular variables exógenas
+        df (pd.DataFrame): DataFrame con datos históricos anteriores a target_date
+        target_date (str): Fecha objetivo para calcular trend y variables exógenas
         
     Returns:
         dict: Diccionario con las 33 variables generadas
     """
     print("🔄 Generando 33 variables del modelo (optimizado)...")
     
-    if len(df) < 28:
-        raise ValueError(f"Insuficientes datos para lag28: {len(df)} días disponibles")
-    
-    # Usar los valores más recientes para calcular lags
-    pm25_values = df["pm25"].values
-    latest_date = df.index[-1]
-    
-    features = {}
-    
-    # 1. LAGS (16 variables): lag1-lag14, lag21, lag28
-    lag_list = list(range(1, 15)) + [21, 28]
-    for k in lag_list:
-        if len(pm25_values) >= k:
-            features[f"lag{k}"] = pm25_values[-k]  # Valor de k días atrás
-        else:
-            raise ValueError(f"Insuficientes datos para lag{k}")
-    print(f"✅ Generados {len(lag_list)} lags")
-    
-    # 2. DIFERENCIAS ABSOLUTAS (13 variables): diff_abs1-diff_abs13
-    for k in range(1, 14):
-        features[f"diff_abs{k}"] = features[f"lag{k}"] - features[f"lag{k+1}"]
-    print("✅ Generadas 13 diferencias absolutas")
-    
-    # 3. TENDENCIAS (2 variables)
-    # trend: días transcurridos desde el primer dato
-    features["trend"] = (latest_date - df.index[0]).days
-    # trend7: pendiente últimos 7 días
-    features["trend7"] = (features["lag1"] - features["lag7"]) / 6
-    print("✅ Generadas 2 variables de tendencia")
-    
-    # 4. VARIABLES EXÓGENAS (2 variables)
-    target_dt = pd.to_datetime(target_date)
-    features["wd"] = target_dt.dayofweek  # día de la semana (0=Monday, 6=Sunday)
-    features["month"] = target_dt.month   # mes (1-12)
-    print("✅ Generadas 2 variables exógenas")
+    # Ventana de los 28 días anteriores, del más antiguo al más reciente, sin huecos
+    window, _ = lag_windows(df, as_days([target_date]))
+    row = features_from_windows(window, [target_date])[0]
+    features = dict(zip(FEATURE_NAMES, row.tolist()))
     
     print(f"✅ Features generadas: {len(features)} variables para fecha {target_date}")
-    
-    # Verificar que tenemos exactamente 33 variables
-    expected_vars = 16 + 13 + 2 + 2  # lags + diffs + trends + exogenous
-    if len(features) != expected_vars:
-        print(f"⚠️ Advertencia: Se esperaban {expected_vars} variables, obtenidas {len(features)}")
-    
     return features
 
-def load_model():
-    """Carga el modelo LightGBM entrenado"""
-    if not MODEL_PATH.exists():
-        raise FileNotFoundError(f"Modelo no encontrado en: {MODEL_PATH}")
+def load_model(engine=None, path=None):
+    """
+    Carga el modelo LightGBM entrenado desde el almacén de artefactos (model_store)
+
+    Args:
+        engine (str): 'arboles' (evaluador NumPy, sin importar lightgbm) o 'booster'
+                      (texto nativo de LightGBM); por defecto MODEL_ENGINE
+        path (Path): .joblib del modelo; por defecto MODEL_PATH (PM2.5)
+
+    Returns:
+        Modelo con predict(X) y feature_name(), listo para FastPredictor; con
+        QUANTILE_MODELS y modelos de cuantiles junto al .joblib, apilado con ellos
+    """
+    path = Path(path or MODEL_PATH)
+    if not path.exists():
+        raise FileNotFoundError(f"Modelo no encontrado en: {path}")
     
-    model = joblib.load(MODEL_PATH)
-    print(f"✅ Modelo LightGBM cargado desde: {MODEL_PATH}")
+    engine = engine or MODEL_ENGINE
+    with stage('model_load'):
+        model = model_store.load_model_stack(path, engine=engine, quantiles=QUANTILE_MODELS)
+    levels = getattr(model, 'quantile_levels', ())
+    quantile_info = f", cuantiles {', '.join(f'p{round(q * 100):02d}' for q in levels)}" if levels else ""
+    print(f"✅ Modelo LightGBM cargado desde: {path} (motor {engine}{quantile_info})")
     return model
 
-def make_predictions(features_dict, model, target_date):
+class FastPredictor:
+    """
+    Inferencia directa sobre el booster de LightGBM (o el TreeEnsemble de model_store),
+    sin pasar por pandas ni por el wrapper de sklearn. El orden de las variables se fija
+    una sola vez a partir del modelo y cada fila se escribe en un array float64 reservado.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.booster = model.booster_ if hasattr(model, 'booster_') else model
+        # sha256 del .joblib si el modelo viene del almacén (clave de la caché de predicciones)
+        self.content_hash = getattr(self.booster, 'content_hash', None)
+        # Niveles de los modelos de cuantiles apilados (model_store.load_model_stack)
+        self.quantile_levels = tuple(getattr(self.booster, 'quantile_levels', ()))
+        self.feature_names = list(self.booster.feature_name())
+        if sorted(self.feature_names) != sorted(FEATURE_NAMES):
+            raise ValueError(f"El modelo espera variables distintas a FEATURE_NAMES: {self.feature_names}")
+
+        # Columnas de FEATURE_NAMES en el orden del modelo (identidad con el modelo actual)
+        self._column_order = np.array([FEATURE_NAMES.index(name) for name in self.feature_names])
+        self._same_order = bool(np.array_equal(self._column_order, np.arange(len(FEATURE_NAMES))))
+        self._row = np.empty((1, len(self.feature_names)), dtype=np.float64)
+
+    def predict_features(self, features_dict):
+        """
+        Predice una fila a partir del diccionario de generate_features
+
+        Args:
+            features_dict (dict): Las 33 variables por nombre
+
+        Returns:
+            float: Predicción sin redondear
+        """
+        row = self._row[0]
+        for i, name in enumerate(self.feature_names):
+            row[i] = features_dict[name]
+        return float(self.booster.predict(self._row)[0])
+
+    def predict_matrix(self, matrix):
+        """
+        Predice una matriz (n, 33) con las columnas en el orden de FEATURE_NAMES
+
+        Returns:
+            np.ndarray: Predicciones (n,) sin redondear
+        """
+        if not self._same_order:
+            matrix = matrix[:, self._column_order]
+        return self.booster.predict(np.ascontiguousarray(matrix, dtype=np.float64))
+
+    def predict_matrix_stacked(self, matrix):
+        """
+        predict_matrix del modelo puntual y de los de cuantiles en una sola llamada
+
+        Returns:
+            np.ndarray: (n, 1 + cuantiles): la predicción puntual y después cada cuantil
+        """
+        if not self.quantile_levels:
+            return self.predict_matrix(matrix)[:, None]
+        if not self._same_order:
+            matrix = matrix[:, self._column_order]
+        return self.booster.predict_stacked(np.ascontiguousarray(matrix, dtype=np.float64))
+
+def as_predictor(model):
+    """Devuelve model si ya es un FastPredictor o lo envuelve en uno"""
+    return model if isinstance(model, FastPredictor) else FastPredictor(model)
+
+def make_predictions(historical_data, model, target_date, horizon=DEFAULT_HORIZON):
     """
-    Realiza las dos predicciones: día actual y día siguiente
+    Realiza las predicciones recursivas de `horizon` días a partir de la fecha objetivo
+    (horizonte 0 = día actual, 1 = día siguiente, ...)
     
     Args:
-        features_dict (dict): Diccionario con features generadas
-        model: Modelo LightGBM cargado
+        historical_data (pd.DataFrame): Histórico anterior a la fecha objetivo
+        model: Modelo LightGBM cargado o FastPredictor
         target_date (str): Fecha objetivo
+        horizon (int): Número de días a predecir (mínimo 2)
         
     Returns:
         dict: Diccionario con las predicciones
     """
-    print("🔮 Realizando predicciones...")
-    
-    target_dt = pd.to_datetime(target_date)
-    
-    # Convertir diccionario a DataFrame para el modelo
-    features_df = pd.DataFrame([features_dict])
-    
-    # PREDICCIÓN 1: Día actual (horizonte_dias = 0)
-    pred_day_0 = model.predict(features_df)[0]
-    pred_day_0 = round(float(pred_day_0), 2)
-    
-    print(f"✅ Predicción día actual ({target_date}): {pred_day_0} µg/m³")
-    
-    # PREDICCIÓN 2: Día siguiente (horizonte_dias = 1)
-    # Crear nuevas features para el día siguiente
-    next_day_features = features_dict.copy()
-    
-    # Actualizar lags: desplazar todo y usar predicción como lag1
-    for k in range(28, 1, -1):  # Empezar desde lag28 hacia lag2
-        if f"lag{k}" in next_day_features and f"lag{k-1}" in next_day_features:
-            next_day_features[f"lag{k}"] = next_day_features[f"lag{k-1}"]
-    
-    # La predicción del día actual se convierte en lag1 para el día siguiente
-    next_day_features["lag1"] = pred_day_0
-    
-    # Actualizar diferencias absolutas con los nuevos lags
-    for k in range(1, 14):
-        if f"lag{k}" in next_day_features and f"lag{k+1}" in next_day_features:
-            next_day_features[f"diff_abs{k}"] = next_day_features[f"lag{k}"] - next_day_features[f"lag{k+1}"]
-    
-    # Actualizar trend7 con el nuevo lag1
-    if "lag7" in next_day_features:
-        next_day_features["trend7"] = (next_day_features["lag1"] - next_day_features["lag7"]) / 6
-    
-    # Actualizar trend (agregar 1 día)
-    next_day_features["trend"] = next_day_features["trend"] + 1
-    
-    # Actualizar variables exógenas para el día siguiente
-    next_day_dt = target_dt + timedelta(days=1)
-    next_day_features["wd"] = next_day_dt.dayofweek
-    next_day_features["month"] = next_day_dt.month
+    window, filled = lag_windows(historical_data, as_days([target_date]))
+    return predict_window(window, int(filled[0]), model, target_date, horizon)
+
+def predict_window(window, filled_days, model, target_date, horizon=DEFAULT_HORIZON, parametro=DEFAULT_PARAMETER):
+    """
+    Predicciones recursivas a partir de la ventana de lags ya construida (lag_windows)
+
+    Args:
+        window (np.ndarray): Ventana (1, 28) de la fecha objetivo
+        filled_days (int): Días de la ventana rellenados por interpolación
+        model: Modelo LightGBM cargado o FastPredictor
+        target_date (str): Fecha objetivo
+        horizon (int): Número de días a predecir (mínimo 2)
+        parametro (str): Contaminante (bandas OMS de los intervalos)
+
+    Returns:
+        dict: Diccionario con las predicciones
+    """
+    print(f"🔮 Realizando predicciones a {horizon} días...")
     
-    # Convertir a DataFrame y hacer predicción para día siguiente
-    next_day_df = pd.DataFrame([next_day_features])
-    pred_day_1 = model.predict(next_day_df)[0]
-    pred_day_1 = round(float(pred_day_1), 2)
+    target_dates = as_days([target_date])
+    predictor = as_predictor(model)
+    trajectories, quantiles = forecast_horizon(window, target_dates, predictor, horizon, intervals=True)
+    intervals = interval_fields(quantiles, predictor.quantile_levels, parametro)[0] if quantiles is not None else None
     
-    next_day_str = next_day_dt.strftime('%Y-%m-%d')
-    print(f"✅ Predicción día siguiente ({next_day_str}): {pred_day_1} µg/m³")
+    for step, value in enumerate(trajectories[0]):
+        print(f"✅ Predicción {target_dates[0] + step} (horizonte {step}): {value} µg/m³")
     
-    return {
-        "fecha_generacion": datetime.now().isoformat(),
-        "prediccion_dia_actual": {
-            "fecha": target_date,
-            "valor": pred_day_0,
-            "horizonte_dias": 0
-        },
-        "prediccion_dia_siguiente": {
-            "fecha": next_day_str,
-            "valor": pred_day_1,
-            "horizonte_dias": 1
-        },
-        "modelo_info": {
-            "tipo": "LightGBM",
-            "variables_utilizadas": len(features_dict),
-            "dias_historicos": "N/A (optimizado)"
+    return build_prediction_result(target_date, trajectories[0], len(FEATURE_NAMES), filled_days=filled_days,
+                                   intervals=intervals)
+
+def build_prediction_result(target_date, trajectory, n_variables, fecha_generacion=None, filled_days=0,
+                            intervals=None):
+    """
+    Construye el JSON de salida que consume Node para una fecha objetivo
+
+    Args:
+        target_date (str): Fecha objetivo (horizonte 0)
+        trajectory (sequence): Predicciones redondeadas, una por horizonte
+        n_variables (int): Variables del modelo
+        fecha_generacion (str): Marca de tiempo común (backfill) o None para ahora
+        filled_days (int): Días de la ventana de lags rellenados por interpolación
+        intervals (list): Campos de interval_fields por horizonte, o None sin modelos de cuantiles
+    """
+    if len(trajectory) < 2:
+        raise ValueError(f"Se necesitan al menos 2 horizontes, recibidos {len(trajectory)}")
+
+    target_day = np.datetime64(target_date, 'D')
+    days = [
+        {
+            "fecha": str(target_day + step),
+            "valor": float(value),
+            "horizonte_dias": step,
+            **(intervals[step] if intervals else {})
         }
+        for step, value in enumerate(trajectory)
+    ]
+    model_info = {
+        "tipo": "LightGBM",
+        "variables_utilizadas": n_variables,
+        "dias_historicos": "N/A (optimizado)",
+        "dias_rellenados": filled_days
     }
+    if intervals:
+        model_info["cuantiles"] = list(intervals[0]["intervalo"])
+    return {
+        "fecha_generacion": fecha_generacion or datetime.now().isoformat(),
+        "prediccion_dia_actual": days[0],
+        "prediccion_dia_siguiente": days[1],
+        "trayectoria": days,
+        "modelo_info": model_info
+    }
+
+# Caché de resultados de predict_for_date: Node pide la misma fecha varias veces al día
+# (cron, panel de administración, reintentos). La clave incluye el hash del modelo y el de
+# la ventana de 28 días que entra al modelo, así que cambiar un promedio de la ventana o
+# el modelo da otra clave y la entrada antigua deja de usarse
+PREDICTION_CACHE = os.getenv('PREDICTION_CACHE', '1') != '0'
+PREDICTION_CACHE_DIR = Path(os.getenv('PREDICTION_CACHE_DIR', HISTORY_CACHE_DIR / 'predicciones'))
+PREDICTION_CACHE_MAX = int(os.getenv('PREDICTION_CACHE_MAX', 500))  # Entradas; se borran las más antiguas
+PREDICTION_CACHE_VERSION = 1
+# Aciertos y fallos de este proceso; los acumulados de todos viven en contadores.json
+PREDICTION_CACHE_STATS = {"aciertos": 0, "fallos": 0}
+
+def prediction_cache_key(target_date, horizon, estacion_id, parametro, model_hash, window, filled_days):
+    """Clave sha256 de una predicción: fecha, horizonte, serie, modelo y ventana de lags"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([PREDICTION_CACHE_VERSION, target_date, int(horizon), str(estacion_id),
+                              str(parametro), model_hash, int(filled_days)]).encode('utf-8'))
+    digest.update(np.ascontiguousarray(window, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+def _record_cache_event(hit):
+    """Suma un acierto o un fallo al proceso y a los contadores acumulados en disco"""
+    field = "aciertos" if hit else "fallos"
+    PREDICTION_CACHE_STATS[field] += 1
+    path = PREDICTION_CACHE_DIR / "contadores.json"
+    # Cron y servidor pueden sumar a la vez: leer-sumar-escribir bajo un cerrojo exclusivo
+    with open(PREDICTION_CACHE_DIR / "contadores.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as f:
+                totals = json.load(f)
+        except (OSError, ValueError):
+            totals = {"aciertos": 0, "fallos": 0}
+        totals[field] = totals.get(field, 0) + 1
+        tmp_path = path.with_name(f"contadores.json.tmp{os.getpid()}")
+        with open(tmp_path, 'w') as f:
+            json.dump(totals, f)
+        os.replace(tmp_path, path)
+
+def read_cached_prediction(key):
+    """Resultado guardado para una clave o None; cuenta el acierto o el fallo"""
+    PREDICTION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(PREDICTION_CACHE_DIR / f"{key}.json") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        result = None
+    _record_cache_event(result is not None)
+    return result
+
+def store_cached_prediction(key, result):
+    """Guarda un resultado (escritura atómica) y poda las entradas más antiguas"""
+    path = PREDICTION_CACHE_DIR / f"{key}.json"
+    tmp_path = path.with_name(f"{key}.tmp{os.getpid()}")
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+    entries = [p for p in PREDICTION_CACHE_DIR.glob("*.json") if p.name != "contadores.json"]
+    if len(entries) > PREDICTION_CACHE_MAX:
+        entries.sort(key=lambda p: p.stat().st_mtime)
+        for old in entries[:len(entries) - PREDICTION_CACHE_MAX]:
+            old.unlink(missing_ok=True)
+
+def prediction_cache_stats():
+    """Contadores de la caché de predicciones: de este proceso y acumulados"""
+    try:
+        with open(PREDICTION_CACHE_DIR / "contadores.json") as f:
+            totals = json.load(f)
+    except (OSError, ValueError):
+        totals = {"aciertos": 0, "fallos": 0}
+    n_entries = sum(1 for p in PREDICTION_CACHE_DIR.glob("*.json") if p.name != "contadores.json") \
+        if PREDICTION_CACHE_DIR.exists() else 0
+    return {"proceso": dict(PREDICTION_CACHE_STATS), "acumulado": totals, "entradas": n_entries}
+
+def prediction_cache_summary():
+    """Línea de resumen de la caché de predicciones para los logs"""
+    stats = prediction_cache_stats()
+    return (f"🗃️ Caché de predicciones: {stats['proceso']['aciertos']} aciertos, {stats['proceso']['fallos']} fallos "
+            f"(acumulado {stats['acumulado']['aciertos']}/{stats['acumulado']['fallos']}, "
+            f"{stats['entradas']} entradas)")
+
+def predict_for_date(target_date, model=None, conn=None, horizon=DEFAULT_HORIZON,
+                     estacion_id=DEFAULT_STATION, parametro=DEFAULT_PARAMETER, use_cache=None):
+    """
+    Ejecuta el pipeline completo (datos → features → modelo) para una fecha
+
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        model: Modelo ya cargado (modo servidor) o None para cargar el del registro
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        horizon (int): Días a predecir desde la fecha objetivo
+        estacion_id (str): Estación
+        parametro (str): Contaminante
+        use_cache (bool): Usar la caché de predicciones; por defecto PREDICTION_CACHE
+
+    Returns:
+        dict: Predicciones en el formato de make_predictions
+    """
+    # Validar formato de fecha
+    datetime.strptime(target_date, '%Y-%m-%d')
+    use_cache = PREDICTION_CACHE if use_cache is None else use_cache
+
+    # Serie sin modelo registrado: fallar antes de tocar la BD
+    model_path = registry_model_path(estacion_id, parametro) if model is None else None
+
+    # 1. Cargar datos históricos y construir la ventana de lags
+    fechas, valores = load_history_arrays(target_date, conn=conn, estacion_id=estacion_id, parametro=parametro)
+    with stage('features'):
+        window, filled = history_windows(fechas, valores, as_days([target_date]))
+
+    # 2. Misma fecha, mismo modelo y misma ventana: devolver el resultado guardado
+    model_hash = (model_store.model_set_hash(model_path, QUANTILE_MODELS) if model is None
+                  else getattr(model, 'content_hash', None))
+    cache_key, cached = lookup_cached_prediction(target_date, horizon, estacion_id, parametro, model_hash,
+                                                 window, int(filled[0]), use_cache)
+    if cached is not None:
+        return cached
+
+    # 3. Cargar modelo
+    if model is None:
+        model = load_model(path=model_path)
+
+    # 4. Generar variables y hacer predicciones (recursivas, un paso por horizonte)
+    return predict_and_store(window, int(filled[0]), model, target_date, horizon, cache_key, parametro)
+
+def lookup_cached_prediction(target_date, horizon, estacion_id, parametro, model_hash, window, filled_days,
+                             use_cache=True):
+    """
+    Busca la predicción en la caché (prediction_cache_key)
+
+    Returns:
+        tuple: (clave o None si no se usa la caché, resultado guardado o None)
+    """
+    if not use_cache or model_hash is None:
+        return None, None
+    with stage('cache'):
+        cache_key = prediction_cache_key(target_date, horizon, estacion_id, parametro, model_hash,
+                                         window, filled_days)
+        cached = read_cached_prediction(cache_key)
+    if cached is not None:
+        print(f"⚡ Predicción de {target_date} servida desde la caché ({cache_key[:12]})")
+    return cache_key, cached
+
+def predict_and_store(window, filled_days, model, target_date, horizon, cache_key=None, parametro=DEFAULT_PARAMETER):
+    """predict_window y, si hay clave, guarda el resultado en la caché"""
+    with stage('predict'):
+        result = predict_window(window, filled_days, model, target_date, horizon, parametro)
+        if cache_key is not None:
+            store_cached_prediction(cache_key, result)
+    return result
+
+async def load_history_async(target_date, estacion_id=DEFAULT_STATION, parametro=DEFAULT_PARAMETER):
+    """
+    Histórico del modo asíncrono. En lugar de comprobar antes el día anterior
+    (ensure_daily_data_updated) lo busca en el propio histórico; si falta, lo calcula desde
+    mediciones_api, lo añade en memoria y lanza su escritura en segundo plano
+
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        estacion_id (str): Estación
+        parametro (str): Contaminante
+
+    Returns:
+        tuple: (fechas, valores como los de load_history_arrays, tarea de escritura o None)
+    """
+    import asyncio
+
+    fechas, valores = await asyncio.to_thread(load_history_arrays, target_date, estacion_id=estacion_id,
+                                              parametro=parametro, ensure_daily=False)
+    yesterday = np.datetime64(target_date, 'D') - 1
+    if str(estacion_id) != DEFAULT_STATION or yesterday in fechas:
+        return fechas, valores, None
+
+    day = str(yesterday)
+    print(f"❌ Faltan datos para {day}, calculando desde mediciones_api...")
+    with stage('ensure_daily'):
+        daily_avg = await asyncio.to_thread(calculate_daily_average_from_hourly, day, parametro=parametro)
+    if daily_avg is None:
+        print(f"⚠️ No se pudieron calcular datos para {day}")
+        return fechas, valores, None
+
+    def write():
+        with stage('write_daily'):
+            update_daily_average_in_db(day, daily_avg, parametro=parametro)
+
+    # Mismo valor que se leería de la columna REAL: float4 con su representación más corta.
+    # Todas las fechas cargadas son anteriores a ayer: añadirlo al final mantiene el orden
+    fechas = np.append(fechas, yesterday)
+    valores = np.append(valores, float(str(np.float32(daily_avg))))
+    return fechas, valores, asyncio.create_task(asyncio.to_thread(write))
+
+def load_model_in_background(path):
+    """
+    Lanza load_model en un hilo daemon y devuelve un futuro del bucle en curso. A diferencia
+    de asyncio.to_thread, asyncio.run no espera a este hilo al cerrar el ejecutor por defecto,
+    así que si el futuro nunca se espera la carga se abandona en vez de pagarse
+
+    Args:
+        path (Path): .joblib del modelo
+
+    Returns:
+        asyncio.Future: Se resuelve con el modelo (o con la excepción de load_model)
+    """
+    import asyncio
+    import threading
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def run():
+        try:
+            outcome = (future.set_result, load_model(path=path))
+        except Exception as e:
+            outcome = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(settle, *outcome)
+        except RuntimeError:
+            pass  # El bucle ya se cerró: nadie espera el modelo
+
+    threading.Thread(target=run, name="load_model", daemon=True).start()
+    return future
+
+async def predict_for_date_async(target_date, horizon=DEFAULT_HORIZON, estacion_id=DEFAULT_STATION,
+                                 parametro=DEFAULT_PARAMETER, use_cache=None):
+    """
+    predict_for_date con E/S solapada (--asincrono): el modelo se carga en un hilo mientras
+    se lee el histórico, y el promedio del día anterior que faltaba se escribe en su propia
+    transacción mientras se predice con el valor en memoria. Cada hilo usa una conexión del
+    pool. Mismo resultado que predict_for_date.
+
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        horizon (int): Días a predecir desde la fecha objetivo
+        estacion_id (str): Estación
+        parametro (str): Contaminante
+        use_cache (bool): Usar la caché de predicciones; por defecto PREDICTION_CACHE
+
+    Returns:
+        dict: Predicciones en el formato de make_predictions
+    """
+    datetime.strptime(target_date, '%Y-%m-%d')
+    use_cache = PREDICTION_CACHE if use_cache is None else use_cache
+    model_path = registry_model_path(estacion_id, parametro)
+
+    # La carga del modelo empieza ya en un hilo daemon; si la caché acierta no se espera
+    # ni se une al salir de asyncio.run
+    model_task = load_model_in_background(model_path)
+    write_task = None
+    try:
+        fechas, valores, write_task = await load_history_async(target_date, estacion_id, parametro)
+        with stage('features'):
+            window, filled = history_windows(fechas, valores, as_days([target_date]))
+
+        cache_key, result = lookup_cached_prediction(target_date, horizon, estacion_id, parametro,
+                                                     model_store.model_set_hash(model_path, QUANTILE_MODELS),
+                                                     window,
+                                                     int(filled[0]), use_cache)
+        if result is None:
+            result = predict_and_store(window, int(filled[0]), await model_task, target_date, horizon, cache_key,
+                                       parametro)
+    finally:
+        # La escritura del promedio debe terminar (o fallar) antes de devolver nada
+        if write_task is not None:
+            await write_task
+    return result
+
+def ensure_daily_range_updated(date_from, date_to, conn=None, parametro=DEFAULT_PARAMETER):
+    """
+    Versión por rango de ensure_daily_data_updated: completa los promedios diarios
+    que falten entre el día anterior a date_from y el día anterior a date_to
+
+    Args:
+        date_from (str): Primera fecha objetivo (YYYY-MM-DD)
+        date_to (str): Última fecha objetivo (YYYY-MM-DD)
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        parametro (str): Contaminante (de la estación DEFAULT_STATION)
+    """
+    first_day = np.datetime64(date_from, 'D') - 1
+    last_day = np.datetime64(date_to, 'D') - 1
+
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT fecha FROM promedios_diarios WHERE parametro = %s AND fecha BETWEEN %s AND %s",
+            (parametro, str(first_day), str(last_day))
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+
+        missing = [str(d) for d in np.arange(first_day, last_day + 1) if d.astype(object) not in existing]
+        print(f"🔍 Rango {first_day} → {last_day}: faltan {len(missing)} promedios diarios")
+
+        # Todos los días que faltan se agregan con una consulta y se guardan en bloque
+        daily = aggregate_daily_averages(missing, conn=conn, parametro=parametro)
+        counts = write_daily_averages(
+            [(fecha, d['valor'], d['estado']) for fecha, d in daily.items()], conn=conn, parametro=parametro
+        )
+        if missing:
+            print(f"💾 {counts['insertados']} promedios insertados, {counts['actualizados']} actualizados, "
+                  f"{len(missing) - len(daily)} días sin datos horarios")
+
+def window_start(target_date):
+    """Primer día (YYYY-MM-DD) de la ventana de lags de una fecha objetivo"""
+    return str(np.datetime64(target_date, 'D') - WINDOW_DAYS)
+
+def lag_windows(df, target_dates):
+    """
+    Estado inicial del pronóstico para muchas fechas objetivo: los 28 días naturales
+    anteriores a cada fecha (del más antiguo al más reciente). Los días que faltan en el
+    histórico se rellenan con la interpolación del entrenamiento (features.daily_windows).
+
+    Args:
+        df (pd.DataFrame): Histórico con índice de fechas y la columna del contaminante
+        target_dates (array-like): Fechas objetivo (DatetimeIndex, datetime64...)
+
+    Returns:
+        tuple: (ventanas (n_fechas, 28), días rellenados de cada ventana (n_fechas,))
+    """
+    return history_windows(df.index.values, df.iloc[:, 0].to_numpy(dtype=float), target_dates)
+
+def history_windows(fechas, valores, target_dates):
+    """
+    lag_windows sobre los arrays de load_history_arrays, sin pandas
+
+    Args:
+        fechas (np.ndarray): Fechas ordenadas y únicas del histórico
+        valores (np.ndarray): Valores de esas fechas (NaN = sin dato)
+        target_dates (array-like): Fechas objetivo
+
+    Returns:
+        tuple: (ventanas (n_fechas, 28), días rellenados de cada ventana (n_fechas,))
+    """
+    target_dates = as_days(target_dates)
+    windows, filled = daily_windows(fechas, valores, target_dates)
+
+    too_sparse = filled > MAX_FILLED_DAYS
+    if too_sparse.any():
+        first_bad = target_dates[too_sparse][0]
+        raise ValueError(f"Insuficientes datos históricos para {first_bad}: faltan {filled[too_sparse][0]} "
+                         f"de {WINDOW_DAYS} días (máximo: {MAX_FILLED_DAYS})")
+    if filled.any():
+        print(f"🧩 Huecos rellenados: {int(filled.sum())} días de lags en {np.count_nonzero(filled)} "
+              f"de {len(filled)} ventanas (máximo {int(filled.max())} por ventana)")
+    return windows, filled
+
+def features_at_step(series, step, step_dates):
+    """
+    Matriz de 33 variables para un paso del pronóstico recursivo
+
+    Args:
+        series (np.ndarray): (n, 28 + horizonte): ventana inicial seguida de las
+            predicciones ya hechas; el día del paso `step` es la columna 28 + step
+        step (int): Horizonte (0 = día objetivo)
+        step_dates (np.ndarray): Fechas del paso (datetime64[D])
+
+    Returns:
+        np.ndarray: Matriz (n, 33) con las columnas en el orden de FEATURE_NAMES
+    """
+    # La ventana del paso son las 28 columnas anteriores: una vista, sin desplazar nada
+    return features_from_windows(series[:, step:step + WINDOW_DAYS], step_dates)
+
+def build_feature_matrix(df, target_dates):
+    """
+    Genera las 33 variables para muchas fechas objetivo en una sola pasada
+    (el paso 0 del pronóstico)
+
+    Returns:
+        np.ndarray: Matriz (n_fechas, 33) con las columnas en el orden de FEATURE_NAMES
+    """
+    return features_at_step(lag_windows(df, target_dates)[0], 0, target_dates)
+
+def forecast_horizon(window, target_dates, predictor, horizon=DEFAULT_HORIZON, intervals=False):
+    """
+    Pronóstico recursivo de `horizon` días para muchas fechas a la vez: una predicción
+    en bloque por paso, y la predicción (redondeada a 2 decimales, como se publica)
+    pasa a ser el lag1 del paso siguiente. Los modelos de cuantiles, si el predictor los
+    tiene, se evalúan en la misma llamada y sobre las mismas variables que el puntual
+
+    Args:
+        window (np.ndarray): Estado de lags (n, 28) de lag_windows
+        target_dates (array-like): Fechas objetivo (horizonte 0)
+        predictor (FastPredictor): Modelo
+        horizon (int): Número de días a predecir
+        intervals (bool): Devolver también los cuantiles
+
+    Returns:
+        np.ndarray: Trayectorias (n, horizon); con intervals=True, tupla (trayectorias,
+        cuantiles (n, horizon, k) o None si el predictor no tiene modelos de cuantiles)
+    """
+    if horizon < 1:
+        raise ValueError(f"Horizonte inválido: {horizon}")
+    target_dates = as_days(target_dates)
+
+    # Array fijo: cada paso escribe una columna y los lags se leen por desplazamiento
+    series = np.empty((len(window), WINDOW_DAYS + horizon))
+    series[:, :WINDOW_DAYS] = window
+    with_quantiles = intervals and bool(predictor.quantile_levels)
+    quantiles = np.empty((len(window), horizon, len(predictor.quantile_levels))) if with_quantiles else None
+
+    for step in range(horizon):
+        step_dates = target_dates + step
+        features = features_at_step(series, step, step_dates)
+        if with_quantiles:
+            stacked = predictor.predict_matrix_stacked(features)
+            predictions, quantiles[:, step] = stacked[:, 0], stacked[:, 1:]
+        else:
+            predictions = predictor.predict_matrix(features)
+        series[:, WINDOW_DAYS + step] = [round(float(p), 2) for p in predictions]
+
+    trajectories = series[:, WINDOW_DAYS:]
+    return (trajectories, quantiles) if intervals else trajectories
+
+def predict_range(date_from, date_to, model=None, conn=None, horizon=DEFAULT_HORIZON):
+    """
+    Modo backfill: predicciones para todas las fechas de un rango con una sola carga
+    del histórico y una llamada al booster por horizonte
+
+    Args:
+        date_from (str): Primera fecha objetivo (YYYY-MM-DD)
+        date_to (str): Última fecha objetivo (YYYY-MM-DD), incluida
+        model: Modelo ya cargado o None para cargarlo
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        horizon (int): Días a predecir desde cada fecha objetivo
+
+    Returns:
+        list: Un dict por fecha con el mismo formato que make_predictions
+    """
+    target_dates = np.arange(np.datetime64(date_from, 'D'), np.datetime64(date_to, 'D') + 1)
+    if len(target_dates) == 0:
+        raise ValueError(f"Rango vacío: {date_from} > {date_to}")
+
+    with connection_scope(conn) as conn:
+        # Completar promedios que falten (el último día lo revisa load_historical_data)
+        if len(target_dates) > 1:
+            ensure_daily_range_updated(date_from, str(target_dates[-2]), conn=conn)
+        # El backfill necesita la serie completa: caché incremental en lugar de la ventana acotada
+        fechas, valores = load_history_arrays(date_to, conn=conn, mode='cache')
+
+    predictor = as_predictor(model if model is not None else load_model('booster'))
+
+    print(f"🔄 Pronóstico a {horizon} días para {len(target_dates)} fechas...")
+    window, filled = history_windows(fechas, valores, target_dates)
+    trajectories, quantiles = forecast_horizon(window, target_dates, predictor, horizon, intervals=True)
+    print(f"✅ {trajectories.size} predicciones en {horizon} pasadas del modelo")
+    intervals = (interval_fields(quantiles, predictor.quantile_levels) if quantiles is not None
+                 else [None] * len(target_dates))
+
+    fecha_generacion = datetime.now().isoformat()
+    return [
+        build_prediction_result(str(target), trajectory,
+                                len(FEATURE_NAMES), fecha_generacion, int(n_filled), fields)
+        for target, trajectory, n_filled, fields in zip(target_dates, trajectories, filled, intervals)
+    ]
+
+def write_predictions_to_db(results, conn=None, estacion_id=DEFAULT_STATION, parametro=DEFAULT_PARAMETER):
+    """
+    Inserta en bloque las predicciones en la tabla predicciones (modelo activo),
+    con el mismo ON CONFLICT que usa cron_predictions.js
+
+    Args:
+        results (list): Salida de predict_range o predict_all_series (estas llevan
+                        su propia estación y contaminante, que tienen prioridad)
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        estacion_id (str): Estación por defecto
+        parametro (str): Contaminante por defecto
+
+    Returns:
+        int: Número de filas insertadas o actualizadas
+    """
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM modelos_prediccion WHERE activo = true ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError("No hay modelo activo configurado")
+        modelo_id = row[0]
+
+        # Todos los horizontes de cada trayectoria (la web lee 0 y 1)
+        rows = [
+            (pred["fecha"], result.get("estacion_id", estacion_id), modelo_id,
+             result.get("parametro", parametro), pred["valor"], pred["horizonte_dias"])
+            for result in results
+            for pred in result["trayectoria"]
+        ]
+
+        execute_values(cursor, """
+            INSERT INTO predicciones (fecha, estacion_id, modelo_id, parametro, valor, horizonte_dias, fecha_generacion)
+            VALUES %s
+            ON CONFLICT (fecha, estacion_id, modelo_id, parametro, horizonte_dias)
+            DO UPDATE SET valor = EXCLUDED.valor, fecha_generacion = CURRENT_TIMESTAMP
+        """, rows, template="(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)", page_size=1000)
+        cursor.close()
+
+    print(f"💾 {len(rows)} predicciones guardadas (modelo_id={modelo_id})")
+    return len(rows)
+
+# Histórico de muchas series (estación, contaminante) en una sola consulta:
+#  - DEFAULT_STATION: ventana acotada de promedios_diarios por contaminante (como BOUNDED_HISTORY_SQL)
+#  - resto de estaciones: promedios agregados al vuelo desde mediciones_api en los últimos
+#    SERIES_LOOKBACK_DAYS días
+SERIES_HISTORY_SQL = f"""
+SELECT estacion_id, parametro, fecha, valor FROM (
+    SELECT %(estacion_principal)s::varchar AS estacion_id, p.parametro, h.fecha, h.valor::text::float8 AS valor
+    FROM unnest(%(parametros_principales)s::varchar[]) AS p(parametro)
+    CROSS JOIN LATERAL (
+        SELECT fecha, valor FROM promedios_diarios
+        WHERE parametro = p.parametro AND fecha >= %(desde)s AND fecha < %(target)s
+        UNION ALL
+        (SELECT fecha, valor FROM promedios_diarios
+         WHERE parametro = p.parametro AND fecha < %(desde)s
+         ORDER BY fecha DESC LIMIT 1)
+    ) h
+    UNION ALL
+    SELECT estacion_id, parametro, dia, promedio
+    FROM ({DAILY_AGGREGATION_SQL}) agregadas
+) historico
+ORDER BY estacion_id, parametro, fecha
+"""
+
+# Días de mediciones_api que se agregan para las estaciones sin promedios_diarios
+SERIES_LOOKBACK_DAYS = int(os.getenv('SERIES_LOOKBACK_DAYS', 42))
+
+def load_series_histories(target_date, series, conn=None):
+    """
+    Carga con una sola consulta la ventana de histórico (28 días naturales más la fila
+    previa; SERIES_LOOKBACK_DAYS días para las estaciones agregadas al vuelo) de muchas
+    series. No completa promedios_diarios: eso lo hace ensure_series_daily_updated.
+
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        series (iterable): Tuplas (estacion_id, parametro)
+        conn: Conexión a BD reutilizable o None para abrir una propia
+
+    Returns:
+        dict: {(estacion_id, parametro): pd.DataFrame} con el formato de load_historical_data
+    """
+    series = list(dict.fromkeys((str(e), str(p)) for e, p in series))
+    principales = [parametro for estacion_id, parametro in series if estacion_id == DEFAULT_STATION]
+    derivadas = [key for key in series if key[0] != DEFAULT_STATION]
+    import pandas as pd  # Devuelve DataFrames: solo para --todas y las estaciones agregadas al vuelo
+
+    target_day = np.datetime64(target_date, 'D')
+    lookback = [str(target_day - k) for k in range(SERIES_LOOKBACK_DAYS, 0, -1)]
+
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute(SERIES_HISTORY_SQL, {
+            'target': target_date,
+            'desde': window_start(target_date),
+            'estacion_principal': DEFAULT_STATION,
+            'parametros_principales': principales,
+            **_date_params(lookback if derivadas else []),
+            'valor_defecto': DEFAULT_HOURLY_VALUE,
+            **_series_params(derivadas)
+        })
+        rows = cursor.fetchall()
+        cursor.close()
+
+    grouped = {key: [] for key in series}
+    for estacion_id, parametro, fecha, valor in rows:
+        # Promedios agregados redondeados como en aggregate_daily_series
+        grouped[(estacion_id, parametro)].append(
+            (fecha, valor if estacion_id == DEFAULT_STATION else round(valor, 2)))
+
+    histories = {}
+    for (estacion_id, parametro), days in grouped.items():
+        df = pd.DataFrame(days, columns=['fecha', parametro])
+        df['fecha'] = pd.to_datetime(df['fecha'])
+        histories[(estacion_id, parametro)] = df.set_index('fecha').astype(float)
+
+    print(f"✅ Histórico de {len(series)} series hasta {target_date}: {len(rows)} filas en una consulta")
+    return histories
+
+def ensure_series_daily_updated(target_date, parametros, conn=None):
+    """
+    ensure_daily_data_updated para varios contaminantes de DEFAULT_STATION a la vez:
+    una consulta para ver qué promedios de ayer faltan y una agregación para todos
+
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        parametros (iterable): Contaminantes guardados en promedios_diarios
+        conn: Conexión a BD reutilizable o None para abrir una propia
+    """
+    parametros = list(dict.fromkeys(parametros))
+    if not parametros:
+        return
+    yesterday = str(np.datetime64(target_date, 'D') - 1)
+
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT DISTINCT parametro FROM promedios_diarios WHERE fecha = %s AND parametro = ANY(%s)",
+            (yesterday, parametros)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+
+        missing = [parametro for parametro in parametros if parametro not in existing]
+        print(f"🔍 Promedios de {yesterday}: {len(parametros) - len(missing)} de {len(parametros)} contaminantes al día")
+        if not missing:
+            return
+
+        daily = aggregate_daily_series([(DEFAULT_STATION, parametro) for parametro in missing], [yesterday], conn=conn)
+        for (_, parametro), days in daily.items():
+            if not days:
+                print(f"⚠️ No se pudieron calcular datos de {parametro} para {yesterday}")
+                continue
+            write_daily_averages([(fecha, d['valor'], d['estado']) for fecha, d in days.items()],
+                                 conn=conn, parametro=parametro)
+            print(f"✅ {parametro} {yesterday} calculado e insertado: {days[yesterday]['valor']}")
+
+def load_model_registry(path=None):
+    """
+    Lee el registro de modelos: qué modelo predice cada serie (estación, contaminante)
+
+    Formato: {"series": [{"estacion_id": "6699", "parametro": "pm25",
+                          "modelo": "modelo_lgbm_pm25.joblib", "activo": true}, ...]}
+    Las rutas relativas se resuelven desde la carpeta del registro.
+
+    Args:
+        path (Path): Fichero JSON; por defecto MODEL_REGISTRY_PATH
+
+    Returns:
+        list: Entradas activas {'estacion_id', 'parametro', 'modelo' (Path)}
+    """
+    path = Path(path or MODEL_REGISTRY_PATH)
+    if not path.exists():
+        # Sin registro: la única serie histórica (PM2.5 en Avenida Constitución)
+        return [{'estacion_id': DEFAULT_STATION, 'parametro': DEFAULT_PARAMETER, 'modelo': MODEL_PATH}]
+
+    with open(path) as f:
+        entries = json.load(f).get('series', [])
+
+    registry = []
+    for entry in entries:
+        if not entry.get('activo', True):
+            continue
+        modelo = Path(entry['modelo'])
+        registry.append({
+            'estacion_id': str(entry['estacion_id']),
+            'parametro': str(entry['parametro']),
+            'modelo': modelo if modelo.is_absolute() else path.parent / modelo
+        })
+    if not registry:
+        raise ValueError(f"El registro de modelos {path} no tiene series activas")
+    return registry
+
+def registry_model_path(estacion_id, parametro, registry=None):
+    """Modelo registrado para una serie (ValueError si no hay ninguno)"""
+    for entry in registry if registry is not None else load_model_registry():
+        if entry['estacion_id'] == str(estacion_id) and entry['parametro'] == str(parametro):
+            return entry['modelo']
+    raise ValueError(f"No hay modelo registrado para la estación {estacion_id} y el parámetro {parametro}")
+
+def predict_all_series(target_date, conn=None, horizon=DEFAULT_HORIZON, registry=None, engine=None):
+    """
+    Planificador: pronósticos de todas las series del registro para una fecha con una
+    conexión, una consulta de histórico y una pasada del modelo por horizonte y modelo
+    (las series que comparten modelo se predicen en bloque)
+
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        conn: Conexión a BD reutilizable o None para abrir una propia
+        horizon (int): Días a predecir desde la fecha objetivo
+        registry (list): Entradas de load_model_registry o None para leer el registro
+        engine (str): Motor del almacén de modelos; por defecto MODEL_ENGINE
+
+    Returns:
+        list: Un dict por serie (formato de make_predictions más 'estacion_id' y
+              'parametro'), en el orden del registro. Las series sin histórico
+              suficiente se omiten con un aviso.
+    """
+    datetime.strptime(target_date, '%Y-%m-%d')
+    registry = registry if registry is not None else load_model_registry()
+    series = [(entry['estacion_id'], entry['parametro']) for entry in registry]
+
+    with connection_scope(conn) as conn:
+        ensure_series_daily_updated(
+            target_date, [parametro for estacion_id, parametro in series if estacion_id == DEFAULT_STATION],
+            conn=conn
+        )
+        histories = load_series_histories(target_date, series, conn=conn)
+
+    groups = {}
+    for entry, key in zip(registry, series):
+        groups.setdefault(Path(entry['modelo']).resolve(), []).append(key)
+
+    target_dates = as_days([target_date])
+    fecha_generacion = datetime.now().isoformat()
+    results = {}
+    for model_path, keys in groups.items():
+        windows, filled, ready = [], [], []
+        for key in keys:
+            try:
+                if histories[key].empty:
+                    raise ValueError(f"Sin datos históricos anteriores a {target_date}")
+                window, n_filled = lag_windows(histories[key], target_dates)
+            except ValueError as e:
+                print(f"⚠️ Serie {key[0]}/{key[1]} omitida: {e}")
+                continue
+            windows.append(window)
+            filled.append(int(n_filled[0]))
+            ready.append(key)
+        if not ready:
+            continue
+
+        predictor = FastPredictor(load_model(engine, path=model_path))
+        trajectories, quantiles = forecast_horizon(np.vstack(windows), np.repeat(target_dates, len(ready)),
+                                                   predictor, horizon, intervals=True)
+        for i, ((estacion_id, parametro), trajectory, n_filled) in enumerate(zip(ready, trajectories, filled)):
+            fields = (interval_fields(quantiles[i:i + 1], predictor.quantile_levels, parametro)[0]
+                      if quantiles is not None else None)
+            results[(estacion_id, parametro)] = {
+                "estacion_id": estacion_id,
+                "parametro": parametro,
+                **build_prediction_result(target_date, trajectory, len(FEATURE_NAMES), fecha_generacion, n_filled,
+                                          fields)
+            }
+
+    print(f"✅ {len(results)} de {len(series)} series pronosticadas con {len(groups)} modelos")
+    return [results[key] for key in series if key in results]
+
+def error_response(exc):
+    """Convierte una excepción en el JSON de error que espera Node"""
+    if isinstance(exc, ValueError):
+        error_type = "ValueError"
+    elif isinstance(exc, FileNotFoundError):
+        error_type = "FileNotFoundError"
+    else:
+        error_type = "UnexpectedError"
+    return {"error": error_type, "message": str(exc)}
+
+class PredictionServer:
+    """
+    Servidor de larga duración: carga el modelo una sola vez y atiende peticiones
+    {"target_date": "YYYY-MM-DD"} con conexiones calientes del pool
+    """
+
+    def __init__(self):
+        self.model = FastPredictor(load_model('booster'))
+        self.requests_served = 0
+        # Abrir ya la conexión del pool para que la primera petición no pague el handshake
+        get_connection_pool()
+        print(db_stats_summary())
+
+    def close(self):
+        close_connection_pool()
+
+    def predict(self, target_date, horizon=DEFAULT_HORIZON):
+        """
+        Predicción en una transacción propia, reintentando una vez si la conexión cayó.
+        Con PREDICTION_TIMINGS=1 la respuesta lleva además el bloque 'timings' de la petición
+        """
+        instrumentation.reset()
+        try:
+            with connection_scope() as conn:
+                result = predict_for_date(target_date, model=self.model, conn=conn, horizon=horizon)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            print(f"⚠️ Conexión perdida ({e}), reconectando...")
+            with connection_scope() as conn:
+                result = predict_for_date(target_date, model=self.model, conn=conn, horizon=horizon)
+        if instrumentation.ENABLED:
+            result = {**result, "timings": instrumentation.timings()}
+        return result
+
+    def handle_line(self, line):
+        """
+        Atiende una línea JSON y devuelve el dict de respuesta
+
+        Args:
+            line (str): Petición en formato JSON, p.ej. {"target_date": "2025-06-15"},
+                        {"target_date": "2025-06-15", "horizonte": 7} o {"estadisticas": true}
+
+        Returns:
+            dict: Predicciones, contadores o {"error": ..., "message": ...}
+        """
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict) and request.get("estadisticas"):
+                return {"peticiones": self.requests_served, "cache": prediction_cache_stats()}
+            if not isinstance(request, dict) or "target_date" not in request:
+                raise ValueError('Petición inválida: se esperaba {"target_date": "YYYY-MM-DD"}')
+            horizon = int(request.get("horizonte", DEFAULT_HORIZON))
+            return self.predict(str(request["target_date"]), horizon)
+        except json.JSONDecodeError as e:
+            return error_response(ValueError(f"JSON inválido: {e}"))
+        except Exception as e:
+            return error_response(e)
+        finally:
+            self.requests_served += 1
+
+def serve_stdio(server):
+    """
+    Bucle JSON-lines sobre stdin/stdout: una petición por línea, una respuesta por línea.
+    Los mensajes de progreso se envían a stderr para no mezclarse con las respuestas.
+    """
+    print("🚀 Servidor de predicciones escuchando en stdin (JSON-lines)", file=sys.stderr)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        with redirect_stdout(sys.stderr):
+            response = server.handle_line(line)
+        sys.stdout.write(json.dumps(response) + "\n")
+        sys.stdout.flush()
+
+class _PredictionRequestHandler(socketserver.StreamRequestHandler):
+    """Atiende peticiones JSON-lines recibidas por el socket Unix"""
+
+    def handle(self):
+        for raw_line in self.rfile:
+            line = raw_line.decode('utf-8')
+            if not line.strip():
+                continue
+            response = self.server.prediction_server.handle_line(line)
+            self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+
+def serve_socket(server, socket_path):
+    """
+    Sirve peticiones por un socket Unix. Las peticiones se atienden de una en una,
+    de modo que la conexión a BD caliente nunca se comparte entre hilos.
+    """
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # Render/systemd paran el proceso con SIGTERM: salir limpiando el socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    with socketserver.UnixStreamServer(socket_path, _PredictionRequestHandler) as unix_server:
+        unix_server.prediction_server = server
+        print(f"🚀 Servidor de predicciones escuchando en {socket_path}")
+        try:
+            unix_server.serve_forever()
+        except KeyboardInterrupt:
+            print("🛑 Servidor detenido")
+        finally:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+def request_from_server(target_date, socket_path=SOCKET_PATH, horizon=DEFAULT_HORIZON):
+    """
+    Cliente ligero: pide la predicción al servidor si está escuchando
+
+    Args:
+        target_date (str): Fecha objetivo en formato YYYY-MM-DD
+        socket_path (str): Ruta del socket Unix del servidor
+        horizon (int): Días a predecir
+
+    Returns:
+        dict: Respuesta del servidor o None si no hay servidor disponible
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CLIENT_TIMEOUT)
+            sock.connect(socket_path)
+            request = {"target_date": target_date, "horizonte": horizon}
+            sock.sendall((json.dumps(request) + "\n").encode('utf-8'))
+            with sock.makefile('rb') as stream:
+                line = stream.readline()
+    except OSError as e:
+        print(f"⚠️ Servidor de predicciones no disponible ({e}), ejecutando en local")
+        return None
+
+    if not line:
+        return None
+    return json.loads(line)
+
+def run_backfill(args):
+    """
+    Modo --from/--to: emite una línea JSON por fecha objetivo en stdout
+    (el progreso va a stderr) y opcionalmente guarda en BD. Con --rebuild-daily
+    recalcula promedios_diarios del rango y emite los contadores.
+    """
+    if not (args.date_from and args.date_to):
+        print("Uso: python daily_predictions.py --from YYYY-MM-DD --to YYYY-MM-DD [--write | --rebuild-daily]",
+              file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        for date_str in (args.date_from, args.date_to):
+            datetime.strptime(date_str, '%Y-%m-%d')
+
+        if args.rebuild_daily:
+            with redirect_stdout(sys.stderr):
+                print(f"🚀 RECÁLCULO PROMEDIOS DIARIOS {args.date_from} → {args.date_to}")
+                print("=" * 50)
+                counts = rebuild_daily_averages(args.date_from, args.date_to)
+                print(db_stats_summary())
+            print(json.dumps(counts))
+            return
+
+        with redirect_stdout(sys.stderr):
+            print(f"🚀 BACKFILL PREDICCIONES {args.date_from} → {args.date_to}")
+            print("=" * 50)
+            with connection_scope() as conn:
+                results = predict_range(args.date_from, args.date_to, conn=conn, horizon=args.horizonte)
+                if args.write:
+                    write_predictions_to_db(results, conn=conn)
+            print(db_stats_summary())
+
+        for result in results:
+            print(json.dumps(result))
+
+    except Exception as e:
+        print(json.dumps(error_response(e)), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        close_connection_pool()
+
+def run_all_series(args):
+    """
+    Modo --todas: pronósticos de todas las series del registro para la fecha objetivo,
+    emitidos como una lista JSON en stdout (el progreso va a stderr); con --write se
+    guardan en la tabla predicciones
+    """
+    try:
+        with redirect_stdout(sys.stderr):
+            print(f"🚀 PREDICCIONES TODAS LAS SERIES - {args.target_date}")
+            print("=" * 50)
+            with connection_scope() as conn:
+                results = predict_all_series(args.target_date, conn=conn, horizon=args.horizonte)
+                if args.write:
+                    write_predictions_to_db(results, conn=conn)
+            print(db_stats_summary())
+
+        print(json.dumps(results, indent=2))
+
+    except Exception as e:
+        print(json.dumps(error_response(e)), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        close_connection_pool()
 
 def main():
     """Función principal del script"""
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(
+        description="Predicciones diarias de PM2.5 con LightGBM",
+        usage=("python daily_predictions.py YYYY-MM-DD [--horizonte N] [--estacion ID --parametro P] [--sin-cache]"
+               " [--asincrono] [--tiempos] [--profile [cprofile|tracemalloc]]"
+               " | YYYY-MM-DD --todas [--write] | --serve [--stdio] [--socket RUTA]"
+               " | --from YYYY-MM-DD --to YYYY-MM-DD [--horizonte N] [--write | --rebuild-daily]"
+               " | --estadisticas-cache")
+    )
+    parser.add_argument("target_date", nargs="?", help="Fecha objetivo (YYYY-MM-DD)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Modo servidor: modelo y conexión a BD cargados una sola vez")
+    parser.add_argument("--stdio", action="store_true",
+                        help="Con --serve, atender JSON-lines por stdin/stdout en lugar de socket")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Ruta del socket Unix del servidor")
+    parser.add_argument("--local", action="store_true",
+                        help="Ejecutar siempre en este proceso aunque haya servidor")
+    parser.add_argument("--from", dest="date_from", help="Backfill: primera fecha objetivo")
+    parser.add_argument("--to", dest="date_to", help="Backfill: última fecha objetivo (incluida)")
+    parser.add_argument("--write", action="store_true",
+                        help="Con --from/--to o --todas, guardar las predicciones en la tabla predicciones")
+    parser.add_argument("--todas", action="store_true",
+                        help="Predecir todas las series (estación, contaminante) del registro de modelos")
+    parser.add_argument("--estacion", default=DEFAULT_STATION, help=f"Estación (por defecto {DEFAULT_STATION})")
+    parser.add_argument("--parametro", default=DEFAULT_PARAMETER,
+                        help=f"Contaminante (por defecto {DEFAULT_PARAMETER})")
+    parser.add_argument("--rebuild-daily", action="store_true",
+                        help="Con --from/--to, recalcular promedios_diarios desde mediciones_api")
+    parser.add_argument("--sin-cache", action="store_true",
+                        help="No leer ni guardar la caché de predicciones")
+    parser.add_argument("--estadisticas-cache", action="store_true",
+                        help="Mostrar aciertos y fallos de la caché de predicciones y salir")
+    parser.add_argument("--asincrono", action="store_true",
+                        help="Solapar la carga del modelo con la lectura del histórico (mismo resultado)")
+    parser.add_argument("--tiempos", action="store_true",
+                        help="Emitir en stderr una línea JSON por etapa (tiempo, consultas, filas, bytes, memoria)")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=["cprofile", "tracemalloc"],
+                        help="Perfilar la predicción (implica --tiempos); informe en stderr")
+    parser.add_argument("--horizonte", type=int, default=DEFAULT_HORIZON,
+                        help=f"Días a predecir desde la fecha objetivo (mínimo 2, por defecto {DEFAULT_HORIZON})")
+    args = parser.parse_args()
+    if args.horizonte < 2:
+        parser.error("--horizonte debe ser al menos 2 (día actual y siguiente)")
+
+    if args.estadisticas_cache:
+        print(json.dumps(prediction_cache_stats(), indent=2))
+        return
+
+    if args.date_from or args.date_to:
+        run_backfill(args)
+        return
+
+    if args.todas:
+        if args.target_date is None:
+            parser.error("--todas necesita la fecha objetivo")
+        run_all_series(args)
+        return
+
+    if args.serve:
+        if args.stdio:
+            with redirect_stdout(sys.stderr):
+                server = PredictionServer()
+            serve_stdio(server)
+        else:
+            server = PredictionServer()
+            serve_socket(server, args.socket)
+        server.close()
+        return
+
+    if args.target_date is None:
         print("Uso: python daily_predictions.py YYYY-MM-DD", file=sys.stderr)
         sys.exit(1)
     
-    target_date = sys.argv[1]
+    target_date = args.target_date
+    if args.tiempos or args.profile:
+        instrumentation.enable()
     
     try:
         # Validar formato de fecha
@@ -446,17 +2151,38 @@ def main():
         print(f"🚀 INICIO PREDICCIONES DIARIAS - {target_date}")
         print("=" * 50)
         
-        # 1. Cargar datos históricos
-        historical_data = load_historical_data(target_date)
-        
-        # 2. Generar features
-        features = generate_features(historical_data, target_date)
-        
-        # 3. Cargar modelo
-        model = load_model()
-        
-        # 4. Hacer predicciones
-        predictions = make_predictions(features, model, target_date)
+        # Si hay un servidor escuchando, delegar en él (modelo y conexión ya calientes);
+        # el servidor solo atiende la serie por defecto y no recibe las opciones locales
+        default_series = (args.estacion, args.parametro) == (DEFAULT_STATION, DEFAULT_PARAMETER)
+        local_flags = [flag for flag, value in (("--sin-cache", args.sin_cache), ("--asincrono", args.asincrono),
+                                                ("--tiempos", args.tiempos), ("--profile", args.profile)) if value]
+        if local_flags and default_series and not args.local and os.path.exists(args.socket):
+            print(f"ℹ️ {', '.join(local_flags)} no se envían al servidor ({args.socket}): ejecutando en local",
+                  file=sys.stderr)
+        predictions = None if args.local or local_flags or not default_series else request_from_server(
+            target_date, args.socket, args.horizonte)
+
+        if predictions is not None:
+            if "error" in predictions:
+                print(json.dumps(predictions), file=sys.stderr)
+                sys.exit(1)
+            print(f"⚡ Predicción servida por {args.socket}")
+        else:
+            profiler = instrumentation.profiled(args.profile) if args.profile else nullcontext()
+            with profiler:
+                if args.asincrono:
+                    import asyncio  # Solo el modo asíncrono lo necesita
+                    predictions = asyncio.run(predict_for_date_async(
+                        target_date, horizon=args.horizonte, estacion_id=args.estacion,
+                        parametro=args.parametro, use_cache=not args.sin_cache))
+                else:
+                    # Una sola conexión y una sola transacción para todo el pipeline
+                    with connection_scope() as conn:
+                        predictions = predict_for_date(target_date, conn=conn, horizon=args.horizonte,
+                                                       estacion_id=args.estacion, parametro=args.parametro,
+                                                       use_cache=not args.sin_cache)
+            print(db_stats_summary())
+            print(prediction_cache_summary())
         
         print("\n✅ PREDICCIONES COMPLETADAS")
         print("=" * 50)
@@ -464,18 +2190,14 @@ def main():
         # 5. Devolver resultado en JSON
         print(json.dumps(predictions, indent=2))
         
-    except ValueError as e:
-        error = {"error": "ValueError", "message": str(e)}
-        print(json.dumps(error), file=sys.stderr)
-        sys.exit(1)
-    except FileNotFoundError as e:
-        error = {"error": "FileNotFoundError", "message": str(e)}
-        print(json.dumps(error), file=sys.stderr)
-        sys.exit(1)
     except Exception as e:
-        error = {"error": "UnexpectedError", "message": str(e)}
-        print(json.dumps(error), file=sys.stderr)
+        print(json.dumps(error_response(e)), file=sys.stderr)
         sys.exit(1)
+    finally:
+        close_connection_pool()
+        if instrumentation.ENABLED:
+            instrumentation.emit_timings(fecha=target_date, conexiones=DB_STATS['conexiones'],
+                                         historico=HISTORY_MODE, motor=MODEL_ENGINE)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Variables del modelo LightGBM de PM2.5, compartidas por el entrenamiento
+(desarrollo_modelos.py) y la producción (daily_predictions.py)
+
+Las 33 variables de un día salen de la ventana de los 28 días anteriores (lags 1-14, 21
+y 28, diferencias absolutas y trend7) y de la propia fecha (trend, día de la semana y
+mes). La ventana es de días naturales: los huecos se rellenan con la misma interpolación
+lineal que el entrenamiento (asfreq("D") + interpolate), usando solo días anteriores a
+la fecha objetivo (daily_windows). Se escriben directamente en una matriz NumPy (n, 33)
+reservada una sola vez; en entrenamiento las ventanas son vistas sliding_window_view
+sobre la serie, sin copiarla.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Orden de las 33 variables tal y como se entrenó el modelo
+LAG_LIST = list(range(1, 15)) + [21, 28]
+FEATURE_NAMES = ([f"lag{k}" for k in LAG_LIST]
+                 + [f"diff_abs{k}" for k in range(1, 14)]
+                 + ["trend", "trend7", "wd", "month"])
+N_FEATURES = len(FEATURE_NAMES)
+WINDOW_DAYS = max(LAG_LIST)  # Días anteriores necesarios (lag28)
+
+# Origen común de 'trend' (días transcurridos desde esta fecha hasta la fecha objetivo).
+# Es el primer día del entrenamiento (MIN_DATE); antes producción lo contaba desde la
+# primera fila de promedios_diarios y hasta el día anterior, un día por detrás
+TREND_ORIGIN = np.datetime64('2019-01-01', 'D')
+
+# Posición de cada lag dentro de la ventana (la última columna es el día anterior)
+_LAG_COLUMNS = WINDOW_DAYS - np.array(LAG_LIST)
+_N_LAGS = len(LAG_LIST)
+_N_DIFFS = 13
+_TREND = FEATURE_NAMES.index("trend")
+
+def as_days(dates):
+    """Fechas (DatetimeIndex, strings, datetime64...) como array datetime64[D]"""
+    return np.asarray(dates, dtype='datetime64[D]')
+
+def calendar_features(dates):
+    """
+    trend, día de la semana (0 = lunes) y mes (1-12) de cada fecha, sin pandas
+
+    Returns:
+        tuple: Tres arrays int64 (n,)
+    """
+    days = as_days(dates)
+    trend = (days - TREND_ORIGIN).astype(np.int64)
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 fue jueves
+    month = days.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    return trend, weekday, month
+
+def features_from_windows(windows, dates, out=None):
+    """
+    Matriz de variables a partir de la ventana de los 28 días anteriores a cada fecha
+
+    Args:
+        windows (np.ndarray): (n, 28) del día más antiguo al anterior a la fecha;
+                              admite vistas (sliding_window_view, columnas de un array mayor)
+        dates (array-like): Fecha de cada fila (n,)
+        out (np.ndarray): Matriz (n, 33) reservada para reutilizar, o None
+
+    Returns:
+        np.ndarray: (n, 33) float64 con las columnas en el orden de FEATURE_NAMES
+    """
+    n_rows = len(windows)
+    if out is None:
+        out = np.empty((n_rows, N_FEATURES))
+
+    lags = out[:, :_N_LAGS]
+    lags[:] = windows[:, _LAG_COLUMNS]
+    np.subtract(lags[:, 0:_N_DIFFS], lags[:, 1:_N_DIFFS + 1], out=out[:, _N_LAGS:_N_LAGS + _N_DIFFS])
+
+    trend, weekday, month = calendar_features(dates)
+    out[:, _TREND] = trend
+    out[:, _TREND + 1] = (lags[:, 0] - lags[:, 6]) / 6  # trend7: pendiente ~últimos 7 días
+    out[:, _TREND + 2] = weekday
+    out[:, _TREND + 3] = month
+    return out
+
+def training_matrix(values, dates):
+    """
+    Variables y objetivo de una serie diaria continua (un valor por día, sin huecos):
+    una fila por cada día que tiene 28 días anteriores
+
+    Args:
+        values (array-like): Valores diarios (n,)
+        dates (array-like): Fechas consecutivas de esos valores (n,)
+
+    Returns:
+        tuple: (X (n - 28, 33), y (n - 28,), fechas de las filas)
+    """
+    values = np.asarray(values, dtype=float)
+    dates = as_days(dates)
+    if len(values) <= WINDOW_DAYS:
+        raise ValueError(f"Insuficientes datos para lag{WINDOW_DAYS}: {len(values)} días")
+
+    # Ventana de la fila i: values[i : i + 28], los 28 días anteriores a values[i + 28]
+    windows = sliding_window_view(values[:-1], WINDOW_DAYS)
+    return features_from_windows(windows, dates[WINDOW_DAYS:]), values[WINDOW_DAYS:], dates[WINDOW_DAYS:]
+
+def daily_windows(dates, values, target_dates):
+    """
+    Ventanas de los 28 días naturales anteriores a cada fecha objetivo sobre una serie
+    con huecos (días sin fila o con NaN). Los huecos entre dos días observados se
+    interpolan linealmente y los del principio toman el primer valor, como en el
+    entrenamiento; los días posteriores al último observado antes de cada fecha repiten
+    ese valor, sin mirar días iguales o posteriores a la fecha objetivo.
+
+    Args:
+        dates (array-like): Fechas ordenadas y únicas de la serie
+        values (array-like): Valores de esas fechas (NaN = sin dato)
+        target_dates (array-like): Fechas objetivo (n,)
+
+    Returns:
+        tuple: (ventanas (n, 28) float64, días rellenados de cada ventana (n,) int64)
+    """
+    dates = as_days(dates)
+    values = np.asarray(values, dtype=float)
+    targets = as_days(target_dates)
+    if len(targets) == 0:
+        return np.empty((0, WINDOW_DAYS)), np.zeros(0, dtype=np.int64)
+
+    # Calendario denso desde el primer día necesario hasta el día anterior a la última fecha
+    observed = ~np.isnan(values) & (dates < targets.max())
+    dates, values = dates[observed], values[observed]
+    start = min(dates[0], targets.min() - WINDOW_DAYS) if len(dates) else targets.min() - WINDOW_DAYS
+    n_days = int((targets.max() - start).astype(np.int64))
+    positions = (dates - start).astype(np.int64)
+
+    is_observed = np.zeros(n_days, dtype=bool)
+    is_observed[positions] = True
+    dense = np.interp(np.arange(n_days), positions, values) if len(dates) else np.full(n_days, np.nan)
+    # Último día observado en cada posición del calendario (-1 si ninguno)
+    last_seen = np.maximum.accumulate(np.where(is_observed, np.arange(n_days), -1))
+
+    ends = (targets - start).astype(np.int64)
+    slots = ends[:, None] - WINDOW_DAYS + np.arange(WINDOW_DAYS)[None, :]
+    last = last_seen[ends - 1]
+    if (last < 0).any():
+        first_bad = targets[last < 0][0]
+        raise ValueError(f"Sin datos anteriores a {first_bad}")
+
+    windows = dense[slots]
+    # Cola sin datos antes de la fecha objetivo: se repite el último valor observado
+    tail = slots > last[:, None]
+    windows = np.where(tail, dense[last][:, None], windows)
+    return windows, np.count_nonzero(~is_observed[slots], axis=1)
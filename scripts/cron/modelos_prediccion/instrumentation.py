@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Instrumentación por etapas del pipeline de predicción (daily_predictions.py)
+
+Cada etapa (connect, ensure_daily, load_history, features, cache, model_load, predict)
+se envuelve en stage(nombre) y registra su tiempo de reloj, las consultas a la BD (viajes
+de ida y vuelta), las filas recibidas, los bytes transferidos y el pico de memoria
+residente del proceso al terminarla. Las consultas se cuentan con InstrumentedCursor,
+el cursor_factory de todas las conexiones del módulo.
+
+Los registros solo se guardan con la instrumentación activada (enable() o la variable
+PREDICTION_TIMINGS=1); desactivada, stage() no hace nada y el cursor solo suma dos
+enteros por consulta. emit_timings() escribe una línea JSON por etapa en stderr y una
+última con el total, sin tocar el JSON de stdout que lee cron_predictions.js:
+
+    {"etapa": "load_history", "ms": 2.41, "consultas": 1, "filas": 29, "bytes": 402, "rss_pico_mb": 88.3}
+
+Los bytes son aproximados: texto de las consultas enviadas más el tamaño en texto de los
+valores recibidos (protocolo de texto de PostgreSQL, sin cabeceras).
+"""
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import psycopg2.extensions
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENABLED = os.getenv('PREDICTION_TIMINGS', '0') == '1'
+
+# Acumulados del proceso: consultas ejecutadas, filas recibidas y bytes (solo con ENABLED)
+DB_COUNTERS = {"consultas": 0, "filas": 0, "bytes": 0}
+STAGES = []
+_started = time.perf_counter()
+
+def enable():
+    """Activa el registro de etapas y reinicia los contadores"""
+    global ENABLED
+    ENABLED = True
+    reset()
+
+def reset():
+    """Vacía las etapas registradas y reinicia el reloj del total"""
+    global _started
+    STAGES.clear()
+    DB_COUNTERS.update(consultas=0, filas=0, bytes=0)
+    _started = time.perf_counter()
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si la plataforma no lo da)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB, macOS en bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _text_bytes(rows):
+    return sum(len(str(value)) for row in rows for value in row if value is not None)
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor de psycopg2 que cuenta consultas, filas recibidas y bytes transferidos"""
+
+    def execute(self, query, vars=None):
+        try:
+            return super().execute(query, vars)
+        finally:
+            DB_COUNTERS["consultas"] += 1
+            if ENABLED and self.query is not None:
+                DB_COUNTERS["bytes"] += len(self.query)
+
+    def executemany(self, query, vars_list):
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            # executemany envía una sentencia por elemento
+            DB_COUNTERS["consultas"] += max(self.rowcount, 1)
+            if ENABLED and self.query is not None:
+                DB_COUNTERS["bytes"] += len(self.query)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count_rows((row,))
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count_rows(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count_rows(rows)
+        return rows
+
+    def _count_rows(self, rows):
+        DB_COUNTERS["filas"] += len(rows)
+        if ENABLED:
+            DB_COUNTERS["bytes"] += _text_bytes(rows)
+
+@contextmanager
+def stage(name):
+    """
+    Registra una etapa del pipeline (no hace nada con la instrumentación desactivada)
+
+    Args:
+        name (str): Nombre de la etapa ('connect', 'load_history', ...)
+    """
+    if not ENABLED:
+        yield
+        return
+
+    before = dict(DB_COUNTERS)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = {
+            "etapa": name,
+            "ms": round((time.perf_counter() - started) * 1000, 3),
+            **{key: DB_COUNTERS[key] - before[key] for key in DB_COUNTERS},
+            "rss_pico_mb": peak_rss_mb()
+        }
+        if tracing:
+            record["python_pico_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        STAGES.append(record)
+
+def timings():
+    """Etapas registradas más una entrada 'total' (tiempo desde reset y acumulados)"""
+    total = {"etapa": "total", "ms": round((time.perf_counter() - _started) * 1000, 3),
+             **DB_COUNTERS, "rss_pico_mb": peak_rss_mb()}
+    return STAGES + [total]
+
+def emit_timings(stream=None, **extra):
+    """
+    Escribe las etapas como JSON-lines (una por etapa y una final 'total')
+
+    Args:
+        stream: Fichero de salida; por defecto sys.stderr
+        **extra: Campos añadidos a la línea 'total' (conexiones, caché...)
+    """
+    stream = stream or sys.stderr
+    records = timings()
+    records[-1].update(extra)
+    for record in records:
+        stream.write(json.dumps(record) + "\n")
+    stream.flush()
+
+@contextmanager
+def profiled(mode, stream=None, limit=25):
+    """
+    Perfila el bloque y escribe el informe en stream (stderr por defecto)
+
+    Args:
+        mode (str): 'cprofile' (funciones por tiempo acumulado) o 'tracemalloc'
+                    (líneas que más memoria reservan; añade python_pico_kb a cada etapa)
+        stream: Fichero de salida; por defecto sys.stderr
+        limit (int): Entradas del informe
+    """
+    stream = stream or sys.stderr
+    if mode == 'cprofile':
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    elif mode == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stream.write(f"tracemalloc: actual {current / 1024:.1f} KB, pico {peak / 1024:.1f} KB\n")
+            for stat in snapshot.statistics('lineno')[:limit]:
+                stream.write(f"{stat}\n")
+    else:
+        raise ValueError(f"Modo de perfilado desconocido: {mode}")
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+Almacén de artefactos del modelo LightGBM de PM2.5
+
+Exporta el booster del .joblib a dos formatos que se cargan sin sklearn:
+- modelo.txt: formato de texto nativo de LightGBM (lightgbm.Booster(model_file=...))
+- arboles/*.npy: los árboles aplanados en arrays, que se abren con np.load(mmap_mode='r')
+  y se evalúan con NumPy sin importar lightgbm
+
+Cada artefacto vive en <MODEL_STORE_DIR>/<sha256 del .joblib>/ junto a un meta.json con
+los hashes de cada fichero y el esquema de variables. Los modelos ya cargados se guardan
+en un LRU en memoria indexado por ese hash.
+
+Los modelos de cuantiles de un modelo puntual (<nombre>_pNN.joblib junto a él, p. ej.
+modelo_lgbm_pm25_p10.joblib) se cargan apilados con load_model_stack: con el motor
+'arboles' todos los árboles se evalúan en una sola pasada.
+
+Uso:
+    python3 model_store.py --verificar   # compara las copias del cron con las de entrenamiento
+    python3 model_store.py --exportar    # exporta (o revalida) el artefacto del cron
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+MODEL_PATH = Path(__file__).parent / "modelo_lgbm_pm25.joblib"
+TRAINING_MODEL_PATH = Path(__file__).resolve().parents[3] / "desarrollo_modelos_prediccion" / "modelo_lgbm_pm25.joblib"
+MODEL_STORE_DIR = Path(os.getenv('MODEL_STORE_DIR', Path(__file__).parent / '.cache' / 'modelos'))
+MODEL_CACHE_SIZE = int(os.getenv('MODEL_CACHE_SIZE', '4'))
+ARTIFACT_VERSION = 1
+
+# Arrays de un artefacto aplanado (uno por nodo, hoja o árbol)
+TREE_ARRAYS = ("feature", "threshold", "left", "right", "missing", "leaf_value", "roots")
+MISSING_TYPES = {"None": 0, "Zero": 1, "NaN": 2}
+ZERO_THRESHOLD = float(np.float32(1e-35))  # kZeroThreshold de LightGBM (float de C++)
+# Objetivos cuya predicción es directamente la suma de hojas (sin exp ni sigmoide)
+IDENTITY_OBJECTIVES = {"regression", "regression_l1", "huber", "fair", "quantile", "mape"}
+# Modelo de cuantiles de un modelo puntual: mismo nombre con _pNN (nivel NN / 100)
+QUANTILE_SUFFIX = re.compile(r"_p(\d{2})$")
+
+_loaded_models = OrderedDict()
+
+def file_sha256(path):
+    """Hash sha256 del contenido de un fichero"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TreeEnsemble:
+    """
+    Evaluador NumPy de un ensemble de árboles de LightGBM aplanado.
+
+    Los nodos internos de todos los árboles van primero y las hojas detrás, de modo
+    que un índice >= n_internos es una hoja. Para cada fila se decide de una vez hacia
+    qué hijo va cada nodo interno (una comparación vectorizada) y después los árboles
+    se recorren en max_depth pasos de un único gather.
+
+    Puede contener varios modelos apilados (stack_tree_ensembles): `segments` da los
+    árboles de cada uno y predict_stacked devuelve una columna por modelo.
+    """
+
+    ROW_CHUNK = 128  # Filas por bloque: acota la matriz (filas, nodos) de decisiones
+
+    def __init__(self, arrays, feature_names, max_depth, content_hash=None, segments=None):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.missing = arrays["missing"]
+        self.leaf_value = arrays["leaf_value"]
+        self.roots = arrays["roots"]
+        self.feature_names = list(feature_names)
+        self.max_depth = int(max_depth)
+        self.content_hash = content_hash
+        self.n_internal = len(self.feature)
+        self._missing_type = self.missing & 3
+        self._default_left = (self.missing & 4) > 0
+        # Con missing_type None (el caso del modelo actual) LightGBM solo convierte NaN en 0
+        self._only_none_missing = not np.any(self._missing_type)
+        # Primer árbol de cada modelo (y el final): un único modelo por defecto
+        self.segments = np.cumsum([0, *(segments or [len(self.roots)])])
+
+    def feature_name(self):
+        """Mismo nombre que Booster.feature_name() para poder sustituir al booster"""
+        return self.feature_names
+
+    def predict(self, X):
+        """
+        Predicción bruta (suma de hojas) igual a Booster.predict para objetivos de regresión
+
+        Args:
+            X (np.ndarray): Matriz (n, n_variables) en el orden de feature_names
+
+        Returns:
+            np.ndarray: Predicciones (n,) del primer modelo
+        """
+        return self.predict_stacked(X)[:, 0]
+
+    def predict_stacked(self, X):
+        """
+        Predicción de todos los modelos apilados en una sola pasada por los árboles
+
+        Returns:
+            np.ndarray: Predicciones (n, n_modelos)
+        """
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        # LightGBM descarta como cero disperso todo valor con |x| <= kZeroThreshold
+        X[np.abs(X) <= ZERO_THRESHOLD] = 0.0
+        if self._only_none_missing:
+            X[np.isnan(X)] = 0.0
+        return np.concatenate([self._predict_chunk(X[i:i + self.ROW_CHUNK])
+                               for i in range(0, len(X), self.ROW_CHUNK)])
+
+    def _predict_chunk(self, X):
+        n_rows = X.shape[0]
+        go_left = self._go_left(X[:, self.feature])
+        next_node = np.where(go_left, self.left, self.right).ravel()
+
+        offsets = (np.arange(n_rows) * self.n_internal)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots)))
+        last_internal = self.n_internal - 1
+        for _ in range(self.max_depth):
+            # Las filas que ya están en una hoja se quedan donde están
+            stepped = next_node[np.minimum(node, last_internal) + offsets]
+            node = np.where(node < self.n_internal, stepped, node)
+
+        # Suma secuencial árbol a árbol de cada modelo, en el mismo orden que LightGBM
+        leaves = self.leaf_value[node - self.n_internal]
+        return np.column_stack([np.cumsum(leaves[:, start:end], axis=1)[:, -1]
+                                for start, end in zip(self.segments[:-1], self.segments[1:])])
+
+    def _go_left(self, values):
+        """Decisión de cada nodo interno con las reglas de valores ausentes de LightGBM"""
+        if self._only_none_missing:
+            return values <= self.threshold
+
+        is_nan = np.isnan(values)
+        nan_type = self._missing_type == MISSING_TYPES["NaN"]
+        zero_type = self._missing_type == MISSING_TYPES["Zero"]
+        values = np.where(is_nan & ~nan_type, 0.0, values)
+        use_default = (nan_type & is_nan) | (zero_type & (values == 0.0))
+        return np.where(use_default, self._default_left, values <= self.threshold)
+
+def _parse_model_text(model_text):
+    """Cabecera y bloques Tree=N del formato de texto nativo de LightGBM"""
+    header, trees, current = {}, [], None
+    for line in model_text.splitlines():
+        if line.startswith("Tree="):
+            current = {}
+            trees.append(current)
+            continue
+        if line.startswith("end of trees"):
+            break
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        (current if current is not None else header)[key] = value
+    return header, trees
+
+def flatten_model_text(model_text):
+    """
+    Aplana los árboles del formato de texto de LightGBM en arrays NumPy.
+    Se parte del texto (umbrales con 17 cifras) y no de dump_model(), que los redondea.
+
+    Returns:
+        tuple: (dict de arrays, max_depth, objetivo, nombres de variables)
+    """
+    header, trees = _parse_model_text(model_text)
+    objective = header.get("objective", "").split()[0]
+    if int(header.get("num_tree_per_iteration", 1)) != 1 or "average_output" in header:
+        raise ValueError("Solo se soportan modelos de regresión con un árbol por iteración")
+    if objective not in IDENTITY_OBJECTIVES:
+        raise ValueError(f"Objetivo con transformación de salida no soportado: {objective}")
+
+    feature, threshold, left, right, missing, leaf_value, roots = [], [], [], [], [], [], []
+    max_depth, internal_offset, leaf_offset = 0, 0, 0
+
+    def global_index(child):
+        # Internos >= 0 con su desplazamiento; hojas ~j, que se resuelven al final
+        return np.where(child >= 0, internal_offset + child, ~(leaf_offset + ~child))
+
+    for tree in trees:
+        leaves = np.array(tree["leaf_value"].split(), dtype=np.float64)
+        n_internal = int(tree["num_leaves"]) - 1
+        leaf_value.append(leaves)
+        if n_internal == 0:
+            roots.append(~leaf_offset)
+            leaf_offset += len(leaves)
+            continue
+
+        decision = np.array(tree["decision_type"].split(), dtype=np.int64)
+        if np.any(decision & 1):
+            raise ValueError("Divisiones categóricas no soportadas por el evaluador NumPy")
+
+        child_left = np.array(tree["left_child"].split(), dtype=np.int64)
+        child_right = np.array(tree["right_child"].split(), dtype=np.int64)
+        max_depth = max(max_depth, _tree_depth(child_left, child_right))
+
+        feature.append(np.array(tree["split_feature"].split(), dtype=np.int64))
+        threshold.append(np.array(tree["threshold"].split(), dtype=np.float64))
+        left.append(global_index(child_left))
+        right.append(global_index(child_right))
+        # bits 2-3 del decision_type = tipo de ausente, bit 1 = default_left
+        missing.append(((decision >> 2) & 3) | np.where(decision & 2, 4, 0))
+        roots.append(internal_offset)
+        internal_offset += n_internal
+        leaf_offset += len(leaves)
+
+    def resolve(children):
+        # Hojas detrás de todos los nodos internos
+        children = np.concatenate(children) if len(children) else np.zeros(0, dtype=np.int64)
+        return np.where(children >= 0, children, internal_offset + ~children).astype(np.int32)
+
+    def concat(parts, dtype):
+        return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+    arrays = {
+        "feature": concat(feature, np.int32),
+        "threshold": concat(threshold, np.float64),
+        "left": resolve(left),
+        "right": resolve(right),
+        "missing": concat(missing, np.int8),
+        "leaf_value": concat(leaf_value, np.float64),
+        "roots": resolve([np.array(roots, dtype=np.int64)]),
+    }
+    return arrays, max_depth, objective, header["feature_names"].split()
+
+def _tree_depth(left, right):
+    """Profundidad máxima de un árbol en formato LightGBM (hijos negativos = hojas)"""
+    depth, stack = 0, [(0, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        for child in (left[node], right[node]):
+            if child >= 0:
+                stack.append((int(child), level + 1))
+    return depth
+
+def _artifact_dir(content_hash):
+    return MODEL_STORE_DIR / content_hash
+
+def export_model(joblib_path=MODEL_PATH, content_hash=None):
+    """
+    Exporta un .joblib al almacén: texto nativo de LightGBM, árboles aplanados y meta.json
+
+    Args:
+        joblib_path (Path): Modelo sklearn serializado con joblib
+        content_hash (str): sha256 del .joblib si ya se ha calculado
+
+    Returns:
+        dict: Metadatos del artefacto
+    """
+    import joblib  # Solo al exportar: cargar el .joblib importa sklearn y lightgbm
+
+    content_hash = content_hash or file_sha256(joblib_path)
+    model = joblib.load(joblib_path)
+    booster = model.booster_ if hasattr(model, "booster_") else model
+    model_text = booster.model_to_string()
+    arrays, max_depth, objective, feature_names = flatten_model_text(model_text)
+
+    target_dir = _artifact_dir(content_hash)
+    tmp_dir = target_dir.with_name(f"{content_hash}.tmp{os.getpid()}")
+    (tmp_dir / "arboles").mkdir(parents=True, exist_ok=True)
+
+    with open(tmp_dir / "modelo.txt", "w") as f:
+        f.write(model_text)
+    files = {"modelo.txt": file_sha256(tmp_dir / "modelo.txt")}
+    for name, array in arrays.items():
+        path = tmp_dir / "arboles" / f"{name}.npy"
+        np.save(path, array)
+        files[f"arboles/{name}.npy"] = file_sha256(path)
+
+    meta = {
+        "version": ARTIFACT_VERSION,
+        "sha256_joblib": content_hash,
+        "origen": str(joblib_path),
+        "creado": datetime.now().isoformat(),
+        "feature_names": feature_names,
+        "objetivo": objective,
+        "n_arboles": int(len(arrays["roots"])),
+        "max_depth": int(max_depth),
+        "ficheros": files,
+    }
+    with open(tmp_dir / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    # Publicar el directorio completo de una vez: un lector nunca ve un artefacto a medias
+    if target_dir.exists():
+        _remove_tree(target_dir)
+    try:
+        os.replace(tmp_dir, target_dir)
+    except OSError:
+        # Otro proceso ha publicado el mismo artefacto mientras exportábamos
+        _remove_tree(tmp_dir)
+    print(f"📦 Artefacto del modelo exportado: {target_dir} ({meta['n_arboles']} árboles)")
+    return meta
+
+def _remove_tree(path):
+    for child in sorted(path.rglob("*"), reverse=True):
+        child.rmdir() if child.is_dir() else child.unlink()
+    path.rmdir()
+
+def read_artifact_meta(content_hash, verify=True):
+    """
+    Lee el meta.json de un artefacto y comprueba los hashes de sus ficheros
+
+    Returns:
+        dict: Metadatos, o None si el artefacto no existe o no es íntegro
+    """
+    meta_path = _artifact_dir(content_hash) / "meta.json"
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != ARTIFACT_VERSION or meta.get("sha256_joblib") != content_hash:
+        return None
+    if verify:
+        for name, expected in meta["ficheros"].items():
+            path = _artifact_dir(content_hash) / name
+            if not path.exists() or file_sha256(path) != expected:
+                print(f"⚠️ Artefacto corrupto ({name}), se volverá a exportar")
+                return None
+    return meta
+
+def _ensure_artifact(joblib_path, content_hash):
+    """Metadatos del artefacto íntegro de un .joblib, exportándolo si hace falta"""
+    return read_artifact_meta(content_hash) or export_model(joblib_path, content_hash)
+
+def _read_tree_ensemble(joblib_path, content_hash):
+    meta = _ensure_artifact(joblib_path, content_hash)
+    tree_dir = _artifact_dir(content_hash) / "arboles"
+    arrays = {name: np.load(tree_dir / f"{name}.npy", mmap_mode='r') for name in TREE_ARRAYS}
+    return TreeEnsemble(arrays, meta["feature_names"], meta["max_depth"], content_hash)
+
+def _read_native_booster(joblib_path, content_hash):
+    import lightgbm  # Solo este motor necesita la librería nativa
+
+    _ensure_artifact(joblib_path, content_hash)
+    booster = lightgbm.Booster(model_file=str(_artifact_dir(content_hash) / "modelo.txt"))
+    booster.content_hash = content_hash  # Igual que TreeEnsemble: identifica el artefacto
+    return booster
+
+MODEL_ENGINES = {
+    "arboles": _read_tree_ensemble,   # Evaluador NumPy: arranque en frío sin lightgbm
+    "booster": _read_native_booster,  # lightgbm.Booster: más rápido por fila, import más caro
+}
+
+def load_model_artifact(joblib_path=MODEL_PATH, engine="arboles"):
+    """
+    Devuelve el modelo de un .joblib listo para predecir, usando el LRU en memoria
+    (clave: sha256 del .joblib y motor) y el almacén en disco
+
+    Args:
+        joblib_path (Path): Modelo sklearn serializado con joblib
+        engine (str): 'arboles' (TreeEnsemble) o 'booster' (lightgbm.Booster nativo)
+
+    Returns:
+        Objeto con predict(X) y feature_name(), sin sklearn deserializado
+    """
+    if engine not in MODEL_ENGINES:
+        raise ValueError(f"Motor de modelo desconocido: {engine} (opciones: {', '.join(MODEL_ENGINES)})")
+
+    content_hash = file_sha256(joblib_path)
+    key = (content_hash, engine)
+    if key in _loaded_models:
+        _loaded_models.move_to_end(key)
+        return _loaded_models[key]
+
+    model = MODEL_ENGINES[engine](joblib_path, content_hash)
+    _remember(key, model)
+    return model
+
+def _remember(key, model):
+    _loaded_models[key] = model
+    while len(_loaded_models) > MODEL_CACHE_SIZE:
+        _loaded_models.popitem(last=False)
+
+def quantile_model_paths(joblib_path):
+    """
+    Modelos de cuantiles de un modelo puntual: <nombre>_pNN.joblib en su mismo directorio
+
+    Returns:
+        dict: {nivel (0.1 para p10): ruta}, ordenado por nivel; vacío si no hay ninguno
+    """
+    joblib_path = Path(joblib_path)
+    levels = {}
+    for path in joblib_path.parent.glob(f"{joblib_path.stem}_p[0-9][0-9].joblib"):
+        levels[int(QUANTILE_SUFFIX.search(path.stem).group(1)) / 100] = path
+    return dict(sorted(levels.items()))
+
+def _combined_hash(content_hashes):
+    """Hash de un conjunto de modelos; el del propio .joblib si es uno solo"""
+    if len(content_hashes) == 1:
+        return content_hashes[0]
+    return hashlib.sha256("|".join(content_hashes).encode("utf-8")).hexdigest()
+
+def model_set_hash(joblib_path, quantiles=True):
+    """content_hash del modelo que devolvería load_model_stack, sin cargarlo"""
+    paths = [joblib_path, *(quantile_model_paths(joblib_path).values() if quantiles else ())]
+    return _combined_hash([file_sha256(path) for path in paths])
+
+def stack_tree_ensembles(ensembles):
+    """
+    Une varios TreeEnsemble con las mismas variables en uno solo: internos de todos los
+    modelos primero y hojas detrás, como en un modelo suelto
+
+    Returns:
+        TreeEnsemble: con un segmento por modelo, en el orden recibido
+    """
+    internal_offsets = np.cumsum([0] + [e.n_internal for e in ensembles])
+    leaf_offsets = np.cumsum([0] + [len(e.leaf_value) for e in ensembles])
+    n_internal = internal_offsets[-1]
+
+    def remap(children, k):
+        children = np.asarray(children, dtype=np.int64)
+        own_internal = ensembles[k].n_internal
+        return np.where(children < own_internal, children + internal_offsets[k],
+                        children - own_internal + n_internal + leaf_offsets[k])
+
+    arrays = {name: np.concatenate([getattr(e, name) for e in ensembles])
+              for name in ("feature", "threshold", "missing", "leaf_value")}
+    for name in ("left", "right", "roots"):
+        arrays[name] = np.concatenate([remap(getattr(e, name), k) for k, e in enumerate(ensembles)]).astype(np.int32)
+    return TreeEnsemble(arrays, ensembles[0].feature_names, max(e.max_depth for e in ensembles),
+                        segments=[len(e.roots) for e in ensembles])
+
+class BoosterStack:
+    """Varios lightgbm.Booster con la interfaz de un TreeEnsemble apilado (un predict por modelo)"""
+
+    def __init__(self, boosters):
+        self.boosters = list(boosters)
+
+    def feature_name(self):
+        return self.boosters[0].feature_name()
+
+    def predict(self, X):
+        return self.boosters[0].predict(X)
+
+    def predict_stacked(self, X):
+        return np.column_stack([booster.predict(X) for booster in self.boosters])
+
+def load_model_stack(joblib_path=MODEL_PATH, engine="arboles", quantiles=True):
+    """
+    Modelo puntual con sus modelos de cuantiles (quantile_model_paths) listos para
+    evaluarse juntos. Sin modelos de cuantiles, o con quantiles=False, es load_model_artifact
+
+    Args:
+        joblib_path (Path): Modelo puntual serializado con joblib
+        engine (str): 'arboles' (un solo TreeEnsemble apilado) o 'booster' (BoosterStack)
+        quantiles (bool): Buscar los modelos de cuantiles
+
+    Returns:
+        Objeto con predict(X) (modelo puntual) y feature_name(); si hay cuantiles, además
+        predict_stacked(X) -> (n, 1 + cuantiles) y quantile_levels. content_hash identifica
+        el conjunto (model_set_hash)
+    """
+    levels = quantile_model_paths(joblib_path) if quantiles else {}
+    point_model = load_model_artifact(joblib_path, engine)
+    if not levels:
+        return point_model
+
+    models = [point_model] + [load_model_artifact(path, engine) for path in levels.values()]
+    for path, model in zip(levels.values(), models[1:]):
+        if list(model.feature_name()) != list(point_model.feature_name()):
+            raise ValueError(f"El modelo de cuantiles {path} usa variables distintas a {joblib_path}")
+
+    content_hash = _combined_hash([model.content_hash for model in models])
+    key = (content_hash, engine)
+    if key in _loaded_models:
+        _loaded_models.move_to_end(key)
+        return _loaded_models[key]
+
+    stack = stack_tree_ensembles(models) if engine == "arboles" else BoosterStack(models)
+    stack.content_hash = content_hash
+    stack.quantile_levels = tuple(levels)
+    _remember(key, stack)
+    return stack
+
+def model_fingerprint(joblib_path):
+    """
+    Hash del modelo en sí (texto nativo de LightGBM), independiente de la serialización
+    del .joblib: dos pickles distintos del mismo modelo tienen la misma huella
+    """
+    meta = _ensure_artifact(joblib_path, file_sha256(joblib_path))
+    return meta["ficheros"]["modelo.txt"], meta
+
+def verify_copies(paths=(MODEL_PATH, TRAINING_MODEL_PATH)):
+    """
+    Comprueba que las copias del modelo (cron y entrenamiento) son el mismo modelo
+
+    Returns:
+        bool: True si todas coinciden
+    """
+    fingerprints = {}
+    for path in paths:
+        if not Path(path).exists():
+            print(f"❌ No existe: {path}")
+            return False
+        fingerprint, meta = model_fingerprint(path)
+        fingerprints[str(path)] = fingerprint
+        print(f"🔍 {path}")
+        print(f"   sha256 .joblib: {meta['sha256_joblib']}")
+        print(f"   sha256 modelo:  {fingerprint} ({meta['n_arboles']} árboles, {len(meta['feature_names'])} variables)")
+
+    same = len(set(fingerprints.values())) == 1
+    if same:
+        print("✅ Las copias del modelo son idénticas")
+    else:
+        print("❌ Las copias del modelo son DISTINTAS: vuelve a copiar el modelo entrenado al cron")
+    return same
+
+def verify_quantile_copies(model_path=MODEL_PATH, training_path=TRAINING_MODEL_PATH):
+    """
+    Comprueba que el cron tiene los mismos modelos de cuantiles que entrenamiento
+
+    Returns:
+        bool: True si coinciden o si no hay modelos de cuantiles en ninguno de los dos
+    """
+    cron, training = quantile_model_paths(model_path), quantile_model_paths(training_path)
+    if set(cron) != set(training):
+        print(f"❌ Modelos de cuantiles distintos: cron {[path.name for path in cron.values()]}, "
+              f"entrenamiento {[path.name for path in training.values()]}")
+        return False
+    return all([verify_copies((cron[level], training[level])) for level in cron])
+
+def main():
+    parser = argparse.ArgumentParser(description="Almacén de artefactos del modelo LightGBM PM2.5")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Comprobar que la copia del cron y la de entrenamiento son el mismo modelo "
+                             "(y sus modelos de cuantiles)")
+    parser.add_argument("--exportar", action="store_true", help="Exportar el modelo del cron al almacén")
+    parser.add_argument("--modelo", default=str(MODEL_PATH), help="Ruta del .joblib a exportar")
+    args = parser.parse_args()
+
+    if args.exportar:
+        started = time.perf_counter()
+        export_model(Path(args.modelo))
+        print(f"⏱️ Exportado en {time.perf_counter() - started:.2f}s")
+    if args.verificar or not args.exportar:
+        same = verify_copies()
+        sys.exit(0 if verify_quantile_copies() and same else 1)
+
+if __name__ == "__main__":
+    main()
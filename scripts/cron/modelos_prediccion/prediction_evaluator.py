@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Evaluación de las predicciones guardadas frente a los promedios diarios reales
+
+Une en una sola consulta la tabla predicciones con promedios_diarios (la estación
+DEFAULT_STATION; las demás se agregan al vuelo desde mediciones_api con otra consulta)
+para cualquier rango de fechas, y calcula con pandas/NumPy, por versión de modelo, serie
+y horizonte (y opcionalmente por mes, para seguir la deriva):
+- n, MAE, sesgo (media de predicho - real) y RMSE
+- acierto de banda OMS: fracción de días en los que la predicción cae en la misma banda
+  OMS (AQG, IT-4... de OMS_BANDS) que el valor real; vacío para los contaminantes sin
+  bandas OMS
+
+Con --write los resúmenes se guardan en bloque en metricas_predicciones (tabla de db.js).
+
+Uso:
+    python prediction_evaluator.py                          # últimos 30 días
+    python prediction_evaluator.py --desde 2025-01-01 --por-mes --write
+    python prediction_evaluator.py --desde 2025-06-01 --json
+"""
+
+import sys
+import json
+import argparse
+from contextlib import nullcontext, redirect_stdout
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from daily_predictions import (
+    DEFAULT_STATION, OMS_BANDS, aggregate_daily_series, air_quality_bands, close_connection_pool,
+    connection_scope, db_stats_summary
+)
+
+EVALUATION_DAYS = 30  # Rango por defecto: los últimos 30 días cerrados
+SUMMARY_KEYS = ["modelo_id", "nombre_modelo", "estacion_id", "parametro", "horizonte_dias"]
+
+# Predicciones del rango con su valor real. promedios_diarios no tiene estación (solo
+# guarda DEFAULT_STATION) y puede tener una fila por fuente: se toma la última escrita.
+# valor::text::float8 reproduce el float que recibe Python al leer la columna REAL
+EVALUATION_SQL = """
+WITH reales AS (
+    SELECT DISTINCT ON (fecha, parametro) fecha, parametro, valor::text::float8 AS real
+    FROM promedios_diarios
+    WHERE fecha BETWEEN %(desde)s AND %(hasta)s AND valor IS NOT NULL
+    ORDER BY fecha, parametro, updated_at DESC
+)
+SELECT p.fecha, p.estacion_id, p.parametro, p.modelo_id, m.nombre_modelo, p.horizonte_dias,
+       p.valor::float8 AS predicho, r.real
+FROM predicciones p
+JOIN modelos_prediccion m ON m.id = p.modelo_id
+LEFT JOIN reales r ON r.fecha = p.fecha AND r.parametro = p.parametro AND p.estacion_id = %(estacion)s
+WHERE p.fecha BETWEEN %(desde)s AND %(hasta)s
+"""
+
+UPSERT_SUMMARY_SQL = """
+INSERT INTO metricas_predicciones (periodo_inicio, periodo_fin, modelo_id, estacion_id, parametro,
+                                   horizonte_dias, n, mae, sesgo, rmse, acierto_banda, calculado_en)
+VALUES %s
+ON CONFLICT (periodo_inicio, periodo_fin, modelo_id, estacion_id, parametro, horizonte_dias)
+DO UPDATE SET n = EXCLUDED.n, mae = EXCLUDED.mae, sesgo = EXCLUDED.sesgo, rmse = EXCLUDED.rmse,
+              acierto_banda = EXCLUDED.acierto_banda, calculado_en = CURRENT_TIMESTAMP
+"""
+
+def load_evaluation_frame(date_from, date_to, conn=None):
+    """
+    Predicciones del rango con su valor real
+
+    Args:
+        date_from (str): Primer día (YYYY-MM-DD)
+        date_to (str): Último día, incluido
+        conn: Conexión a BD reutilizable o None para abrir una propia
+
+    Returns:
+        pd.DataFrame: Una fila por predicción (fecha, estacion_id, parametro, modelo_id,
+                      nombre_modelo, horizonte_dias, predicho, real); solo las que ya
+                      tienen valor real
+    """
+    columns = ["fecha", "estacion_id", "parametro", "modelo_id", "nombre_modelo", "horizonte_dias",
+               "predicho", "real"]
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        cursor.execute(EVALUATION_SQL, {'desde': date_from, 'hasta': date_to, 'estacion': DEFAULT_STATION})
+        frame = pd.DataFrame(cursor.fetchall(), columns=columns)
+        cursor.close()
+
+        # Resto de estaciones: sus promedios no están en promedios_diarios
+        others = frame[frame["estacion_id"] != DEFAULT_STATION]
+        if not others.empty:
+            series = list(others[["estacion_id", "parametro"]].drop_duplicates().itertuples(index=False, name=None))
+            averages = aggregate_daily_series(series, others["fecha"].unique(), conn=conn)
+            lookup = {(estacion, parametro, day): daily['valor']
+                      for (estacion, parametro), days in averages.items()
+                      for day, daily in days.items()}
+            keys = zip(others["estacion_id"], others["parametro"], pd.to_datetime(others["fecha"]).dt.strftime('%Y-%m-%d'))
+            frame.loc[others.index, "real"] = [lookup.get(key, np.nan) for key in keys]
+
+    frame["real"] = frame["real"].astype(float)
+    frame["predicho"] = frame["predicho"].astype(float)
+    frame["fecha"] = pd.to_datetime(frame["fecha"])
+    return frame.dropna(subset=["real"]).reset_index(drop=True)
+
+def evaluation_summary(frame, date_from, date_to, by_month=False):
+    """
+    MAE, sesgo, RMSE y acierto de banda OMS por modelo, serie y horizonte
+
+    Args:
+        frame (pd.DataFrame): Salida de load_evaluation_frame
+        date_from (str), date_to (str): Rango evaluado (periodo de las filas sin --por-mes)
+        by_month (bool): Una fila por mes natural (recortado al rango) para ver la deriva
+
+    Returns:
+        pd.DataFrame: periodo_inicio, periodo_fin, SUMMARY_KEYS, n, mae, sesgo, rmse, acierto_banda
+    """
+    columns = ["periodo_inicio", "periodo_fin", *SUMMARY_KEYS, "n", "mae", "sesgo", "rmse", "acierto_banda"]
+    if frame.empty:  # periodos datetime para que el --json formatee igual un rango vacío
+        return pd.DataFrame(columns=columns).astype({"periodo_inicio": "datetime64[ns]",
+                                                     "periodo_fin": "datetime64[ns]"})
+
+    error = frame["predicho"].to_numpy() - frame["real"].to_numpy()
+    hit = np.full(len(frame), np.nan)  # NaN (NULL en BD) si el contaminante no tiene bandas OMS
+    for parametro, rows in frame.groupby("parametro").indices.items():
+        if parametro not in OMS_BANDS:
+            continue
+        hit[rows] = (air_quality_bands(parametro, frame["predicho"].to_numpy()[rows])
+                     == air_quality_bands(parametro, frame["real"].to_numpy()[rows]))
+    metrics = frame[SUMMARY_KEYS].assign(error=error, error_abs=np.abs(error), error_cuad=error ** 2,
+                                         acierto=hit)
+
+    start, end = pd.Timestamp(date_from), pd.Timestamp(date_to)
+    if by_month:
+        metrics["periodo_inicio"] = frame["fecha"].dt.to_period("M").dt.start_time.clip(lower=start)
+        metrics["periodo_fin"] = frame["fecha"].dt.to_period("M").dt.end_time.dt.normalize().clip(upper=end)
+    else:
+        metrics["periodo_inicio"], metrics["periodo_fin"] = start, end
+
+    summary = (metrics.groupby(["periodo_inicio", "periodo_fin", *SUMMARY_KEYS])
+                      .agg(n=("error", "size"), mae=("error_abs", "mean"), sesgo=("error", "mean"),
+                           rmse=("error_cuad", "mean"), acierto_banda=("acierto", "mean"))
+                      .reset_index())
+    summary["rmse"] = np.sqrt(summary["rmse"])
+    return summary[columns].sort_values(["modelo_id", "estacion_id", "parametro", "horizonte_dias",
+                                         "periodo_inicio"]).reset_index(drop=True)
+
+def write_evaluation_summary(summary, conn=None, page_size=1000):
+    """
+    Guarda los resúmenes en metricas_predicciones con un upsert por lote
+
+    Returns:
+        int: Filas insertadas o actualizadas
+    """
+    rows = [
+        (row.periodo_inicio.date(), row.periodo_fin.date(), int(row.modelo_id), row.estacion_id, row.parametro,
+         int(row.horizonte_dias), int(row.n), round(float(row.mae), 4), round(float(row.sesgo), 4),
+         round(float(row.rmse), 4), None if pd.isna(row.acierto_banda) else round(float(row.acierto_banda), 4))
+        for row in summary.itertuples(index=False)
+    ]
+    if not rows:
+        return 0
+    with connection_scope(conn) as conn:
+        cursor = conn.cursor()
+        execute_values(cursor, UPSERT_SUMMARY_SQL, rows,
+                       template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+                       page_size=page_size)
+        cursor.close()
+    print(f"💾 {len(rows)} resúmenes guardados en metricas_predicciones")
+    return len(rows)
+
+def evaluate(date_from, date_to, conn=None, by_month=False, write=False):
+    """Carga, resume y opcionalmente guarda la evaluación del rango en una transacción"""
+    with connection_scope(conn) as conn:
+        frame = load_evaluation_frame(date_from, date_to, conn=conn)
+        print(f"📊 {len(frame)} predicciones con valor real entre {date_from} y {date_to}")
+        summary = evaluation_summary(frame, date_from, date_to, by_month=by_month)
+        if write:
+            write_evaluation_summary(summary, conn=conn)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluación de predicciones frente a los promedios reales")
+    parser.add_argument("--desde", help=f"Primer día (por defecto hace {EVALUATION_DAYS} días)")
+    parser.add_argument("--hasta", help="Último día, incluido (por defecto ayer)")
+    parser.add_argument("--por-mes", action="store_true", help="Una fila por mes natural (deriva)")
+    parser.add_argument("--write", action="store_true", help="Guardar los resúmenes en metricas_predicciones")
+    parser.add_argument("--json", action="store_true", help="Emitir los resúmenes como JSON en stdout")
+    args = parser.parse_args()
+
+    yesterday = datetime.now().date() - timedelta(days=1)
+    date_to = args.hasta or yesterday.strftime('%Y-%m-%d')
+    date_from = args.desde or (datetime.strptime(date_to, '%Y-%m-%d').date()
+                               - timedelta(days=EVALUATION_DAYS - 1)).strftime('%Y-%m-%d')
+    for date_str in (date_from, date_to):
+        datetime.strptime(date_str, '%Y-%m-%d')
+
+    # Con --json, el progreso va a stderr y stdout queda para el JSON
+    try:
+        with redirect_stdout(sys.stderr) if args.json else nullcontext():
+            print(f"🚀 EVALUACIÓN DE PREDICCIONES {date_from} → {date_to}")
+            summary = evaluate(date_from, date_to, by_month=args.por_mes, write=args.write)
+            print(db_stats_summary())
+    except Exception as e:
+        print(f"❌ Error evaluando predicciones: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        close_connection_pool()
+
+    if args.json:
+        records = summary.assign(periodo_inicio=summary["periodo_inicio"].dt.strftime('%Y-%m-%d'),
+                                 periodo_fin=summary["periodo_fin"].dt.strftime('%Y-%m-%d'))
+        records = records.round(4).astype(object).where(records.notna(), None)  # NaN → null
+        print(json.dumps(records.to_dict(orient="records"), indent=2))
+    elif summary.empty:
+        print("⚠️ No hay predicciones con valor real en el rango")
+    else:
+        print(summary.round(3).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
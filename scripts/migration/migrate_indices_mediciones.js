@@ -0,0 +1,83 @@
+#!/usr/bin/env node
+
+// Script de migración: índice (estacion_id, parametro, fecha) INCLUDE (valor) en mediciones_api
+// La agregación diaria de Python (daily_predictions.py, daily_aggregator.py) filtra por serie
+// y por rango [día, día + 1); con este índice solo lee las filas de ese día, sin recorrer la
+// tabla entera. Se crea CONCURRENTLY para no bloquear las inserciones del cron, así que no
+// puede ir en una transacción; si una ejecución anterior se interrumpió, el índice queda
+// inválido y se vuelve a crear.
+const { pool } = require('../../src/database/db');
+
+const INDEX_NAME = 'idx_mediciones_api_estacion_parametro_fecha';
+
+async function indexState(client) {
+  const result = await client.query(
+    'SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)',
+    [INDEX_NAME]
+  );
+  if (result.rows.length === 0) return 'ausente';
+  return result.rows[0].indisvalid ? 'valido' : 'invalido';
+}
+
+async function migrateMedicionesIndexes() {
+  const client = await pool.connect();
+
+  try {
+    console.log('🚀 Iniciando migración de índices de mediciones_api...');
+
+    // INCLUDE necesita PostgreSQL 11
+    const version = await client.query('SHOW server_version_num');
+    if (parseInt(version.rows[0].server_version_num, 10) < 110000) {
+      throw new Error('El índice con INCLUDE necesita PostgreSQL 11 o superior');
+    }
+
+    // 1. Crear el índice (o rehacerlo si quedó inválido)
+    const state = await indexState(client);
+    if (state === 'valido') {
+      console.log(`✅ El índice ${INDEX_NAME} ya existe`);
+    } else {
+      if (state === 'invalido') {
+        console.log(`🗑️ Eliminando ${INDEX_NAME} inválido de una ejecución interrumpida...`);
+        await client.query(`DROP INDEX CONCURRENTLY IF EXISTS ${INDEX_NAME}`);
+      }
+      console.log(`📊 Creando ${INDEX_NAME} (CONCURRENTLY)...`);
+      const started = Date.now();
+      await client.query(`
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ${INDEX_NAME}
+        ON mediciones_api (estacion_id, parametro, fecha) INCLUDE (valor)
+      `);
+      console.log(`✅ Índice creado en ${((Date.now() - started) / 1000).toFixed(1)} s`);
+    }
+
+    // 2. Estadísticas y mapa de visibilidad al día: el planificador elige el índice y puede
+    // leer valor sin visitar la tabla (Index Only Scan)
+    console.log('🔍 Actualizando estadísticas de mediciones_api...');
+    await client.query('VACUUM (ANALYZE) mediciones_api');
+
+    // 3. Verificación final
+    const size = await client.query('SELECT pg_size_pretty(pg_relation_size(to_regclass($1))) AS tamano', [INDEX_NAME]);
+    console.log(`📏 Tamaño de ${INDEX_NAME}: ${size.rows[0].tamano} (${await indexState(client)})`);
+    console.log('\n✅ Migración de índices de mediciones_api completada exitosamente');
+
+  } catch (error) {
+    console.error('❌ Error durante la migración:', error);
+    throw error;
+  } finally {
+    client.release();
+  }
+}
+
+// Ejecutar si es llamado directamente
+if (require.main === module) {
+  migrateMedicionesIndexes()
+    .then(() => {
+      console.log('🏁 Script de migración de índices finalizado.');
+      process.exit(0);
+    })
+    .catch(err => {
+      console.error('💥 Fallo crítico en la migración:', err);
+      process.exit(1);
+    });
+}
+
+module.exports = { migrateMedicionesIndexes };
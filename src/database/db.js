@@ -106,6 +106,8 @@ async function createTables() {
         FOR EACH ROW EXECUTE FUNCTION update_updated_at_column()
     `);
 
+    await createPredictionEvaluationTable();
+
     isInitialized = true;
   } catch (error) {
     console.error('❌ Error creando tablas:', error);
@@ -230,7 +232,9 @@ async function createHistoricalIndexes() {
     'CREATE INDEX IF NOT EXISTS idx_mediciones_api_fecha ON mediciones_api(fecha DESC);',
     'CREATE INDEX IF NOT EXISTS idx_mediciones_api_estacion_fecha ON mediciones_api(estacion_id, fecha DESC);',
     'CREATE INDEX IF NOT EXISTS idx_mediciones_api_parametro_fecha ON mediciones_api(parametro, fecha DESC);',
-    'CREATE INDEX IF NOT EXISTS idx_mediciones_api_created_at ON mediciones_api(created_at);'
+    'CREATE INDEX IF NOT EXISTS idx_mediciones_api_created_at ON mediciones_api(created_at);',
+    // Agregación diaria de Python: serie + rango [día, día + 1); con valor incluido basta el índice
+    'CREATE INDEX IF NOT EXISTS idx_mediciones_api_estacion_parametro_fecha ON mediciones_api(estacion_id, parametro, fecha) INCLUDE (valor);'
   ];
   
   for (const indexSQL of indexes) {
@@ -539,6 +543,34 @@ async function createPredictionMetricsTable() {
   console.log('✅ Tabla prediction_metrics creada/actualizada correctamente');
 }
 
+// Crear tabla de resúmenes de evaluación de predicciones (prediction_evaluator.py):
+// una fila por periodo, modelo, serie y horizonte con MAE, sesgo, RMSE y acierto de banda OMS
+async function createPredictionEvaluationTable() {
+  const createTableSQL = `
+    CREATE TABLE IF NOT EXISTS metricas_predicciones (
+      id SERIAL PRIMARY KEY,
+      periodo_inicio DATE NOT NULL,
+      periodo_fin DATE NOT NULL,
+      modelo_id INTEGER NOT NULL REFERENCES modelos_prediccion(id),
+      estacion_id VARCHAR(20) NOT NULL,
+      parametro VARCHAR(20) NOT NULL,
+      horizonte_dias INTEGER NOT NULL,
+      n INTEGER NOT NULL,
+      mae DECIMAL(10,4),
+      sesgo DECIMAL(10,4),
+      rmse DECIMAL(10,4),
+      acierto_banda DECIMAL(5,4),
+      calculado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+      UNIQUE(periodo_inicio, periodo_fin, modelo_id, estacion_id, parametro, horizonte_dias)
+    );
+    CREATE INDEX IF NOT EXISTS idx_metricas_predicciones_modelo_periodo
+      ON metricas_predicciones(modelo_id, horizonte_dias, periodo_inicio DESC);
+  `;
+
+  await pool.query(createTableSQL);
+  console.log('✅ Tabla metricas_predicciones creada/actualizada correctamente');
+}
+
 // Crear tabla de notificaciones enviadas
 async function createNotificationsTable() {
   // 1. Asegurarse de que la nueva tabla 'notificaciones_enviadas' exista.